@@ -0,0 +1,58 @@
+"""
+Benchmark for stam_manager.combine_stams.
+
+Times the merge of layer stores with a growing number of annotations, the
+time per annotation should stay flat if the merge is linear in annotations.
+
+    PYTHONPATH=src python benchmarks/bench_combine.py
+"""
+import time
+
+from stam import AnnotationStore, Offset, Selector
+
+from stam_annotator.stam_manager import combine_stams
+
+LAYERS = 5
+DATASETS_PER_LAYER = 4
+KEYS_PER_DATASET = 10
+
+
+def make_layer_store(layer: int, annotations_count: int) -> AnnotationStore:
+    store = AnnotationStore(id=f"layer{layer}")
+    resource = store.add_resource(id="v001", text="ཀ" * (annotations_count + 1))
+    datasets = []
+    for index in range(DATASETS_PER_LAYER):
+        dataset = store.add_dataset(id=f"layer{layer}_set{index}")
+        for key in range(KEYS_PER_DATASET):
+            dataset.add_key(f"layer{layer}_set{index}_key{key}")
+        datasets.append(dataset)
+    dataset = datasets[-1]
+    dataset.add_key("Structure Type")
+    for index in range(annotations_count):
+        store.annotate(
+            id=f"layer{layer}_annotation{index}",
+            target=Selector.textselector(resource, Offset.simple(index, index + 1)),
+            data=[
+                {"key": "Structure Type", "value": "Segment", "set": dataset.id()},
+                {"key": "confidence", "value": index % 10, "set": dataset.id()},
+            ],
+        )
+    return store
+
+
+def bench_combine(annotations_count: int) -> float:
+    stams = [make_layer_store(layer, annotations_count) for layer in range(LAYERS)]
+    start_time = time.perf_counter()
+    combine_stams(stams)
+    return time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+    for annotations_count in [1000, 2000, 4000, 8000]:
+        elapsed_time = bench_combine(annotations_count)
+        merged_count = annotations_count * (LAYERS - 1)
+        print(
+            f"annotations per layer: {annotations_count:>6}, "
+            f"combine: {elapsed_time:.3f} s, "
+            f"per merged annotation: {elapsed_time / merged_count * 1e6:.1f} us"
+        )
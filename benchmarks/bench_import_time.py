@@ -0,0 +1,63 @@
+"""
+Benchmark of the import time of the stam_annotator modules.
+
+Every module is imported in a fresh interpreter with -X importtime, the best
+cumulative time of a few runs is reported, along with the heavy dependencies
+(github, pydantic, yaml) the import pulled in. The exit code is 1 if one of
+the modules imports a heavy dependency, as none of them should at import time.
+
+    PYTHONPATH=src python benchmarks/bench_import_time.py
+"""
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+
+MODULES = [
+    "stam_annotator.config",
+    "stam_annotator.utility",
+    "stam_annotator.opf_to_stam",
+    "stam_annotator.volume_converter",
+    "stam_annotator.convert_to_stam",
+    "stam_annotator.batch_converter",
+    "stam_annotator.stam_fetcher.pecha",
+    "stam_annotator.stam_fetcher.alignment",
+]
+HEAVY_MODULES = ["github", "pydantic", "yaml"]
+REPEATS = 5
+
+
+def bench_import(module: str) -> Tuple[float, List[str]]:
+    """best cumulative import time in seconds and the heavy modules imported"""
+    elapsed_times = []
+    for _ in range(REPEATS):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=os.environ,
+        )
+        imported_modules = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                imported_modules[name.strip()] = int(cumulative)
+        elapsed_times.append(imported_modules[module] / 1e6)
+    heavy_modules = [name for name in HEAVY_MODULES if name in imported_modules]
+    return min(elapsed_times), heavy_modules
+
+
+if __name__ == "__main__":
+    exit_code = 0
+    for module in MODULES:
+        elapsed_time, heavy_modules = bench_import(module)
+        if heavy_modules:
+            exit_code = 1
+        print(
+            f"{module:<40} {elapsed_time * 1000:7.1f} ms"
+            f"{'  imports ' + ', '.join(heavy_modules) if heavy_modules else ''}"
+        )
+    sys.exit(exit_code)
@@ -0,0 +1,202 @@
+"""
+Benchmark suite of the conversion and query pipeline on synthetic pechas.
+
+Writes a bo and an en pecha and an alignment between them with
+synthetic_pecha, then times every stage on its own: yaml load, pydantic
+validation, pre-stam build, stam build (strict and streaming), combine, save,
+whole repo conversion, Pecha load, filtered query and alignment iteration.
+The results are written as json, to compare runs between releases.
+
+    PYTHONPATH=src python benchmarks/bench_pipeline.py --annotations 5000 \
+        --output results.json
+"""
+import argparse
+import json
+import platform
+import tempfile
+import time
+from contextlib import contextmanager
+from importlib.metadata import version
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from synthetic_pecha import (
+    PechaConfig,
+    write_synthetic_alignment,
+    write_synthetic_pecha,
+)
+
+from stam_annotator.annotation_store import convert_opf_for_pre_stam_format
+from stam_annotator.config import AnnotationEnum, AnnotationGroupEnum
+from stam_annotator.convert_to_stam import AlignmentRepo, PechaRepo
+from stam_annotator.opf_loader import create_opf_annotation_instance
+from stam_annotator.opf_to_stam import opf_annotation_store_to_stam, opf_data_to_stam
+from stam_annotator.repo_manifest import RepoManifest
+from stam_annotator.stam_fetcher.alignment import Alignment
+from stam_annotator.stam_fetcher.pecha import Pecha
+from stam_annotator.stam_manager import combine_stams
+from stam_annotator.utility import load_opf_annotations_from_yaml, save_annotation_store
+
+SOURCE_PECHA_ID = "P0000BO1"
+TARGET_PECHA_ID = "P0000EN1"
+ALIGNMENT_ID = "A0000001"
+KEY = AnnotationGroupEnum.structure_type
+
+
+@contextmanager
+def stage(results: Dict, name: str) -> Iterator[Dict]:
+    """time the block, the block sets the number of items it handled"""
+    result = {"count": 0}
+    start_time = time.perf_counter()
+    yield result
+    result["seconds"] = time.perf_counter() - start_time
+    results[name] = result
+
+
+def bench_layers(results: Dict, opf_path: Path, output_path: Path):
+    """the stages of the conversion of every layer file, one stage at a time"""
+    manifest = RepoManifest.from_path(opf_path.parent)
+    layers = [
+        (volume_name, layer_file_path, manifest.get_base_file(volume_name))
+        for volume_name, layer_file_paths in manifest.layer_files.items()
+        for layer_file_path in layer_file_paths
+    ]
+
+    with stage(results, "yaml_load") as result:
+        layer_data = [
+            load_opf_annotations_from_yaml(layer_file_path)
+            for _, layer_file_path, _ in layers
+        ]
+        annotations_count = sum(len(data["annotations"]) for data in layer_data)
+        result["count"] = annotations_count
+
+    with stage(results, "pydantic_validation") as result:
+        opf_objs = [create_opf_annotation_instance(data) for data in layer_data]
+        result["count"] = annotations_count
+
+    with stage(results, "pre_stam_build") as result:
+        pre_stams = [
+            convert_opf_for_pre_stam_format(opf_obj, KEY, base_file_path)
+            for opf_obj, (_, _, base_file_path) in zip(opf_objs, layers)
+        ]
+        result["count"] = annotations_count
+
+    with stage(results, "stam_build_strict") as result:
+        for pre_stam in pre_stams:
+            opf_annotation_store_to_stam(pre_stam)
+        result["count"] = annotations_count
+
+    volume_stams: Dict[str, List] = {}
+    with stage(results, "stam_build_streaming") as result:
+        for data, (volume_name, _, base_file_path) in zip(layer_data, layers):
+            store = opf_data_to_stam(data, KEY, base_file_path)
+            volume_stams.setdefault(volume_name, []).append(store)
+        result["count"] = annotations_count
+
+    combined_stams = {}
+    with stage(results, "combine") as result:
+        for volume_name, stams in volume_stams.items():
+            combined_stams[volume_name] = (
+                combine_stams(stams) if len(stams) > 1 else stams[0]
+            )
+        result["count"] = len(combined_stams)
+
+    with stage(results, "save") as result:
+        for volume_name, store in combined_stams.items():
+            save_annotation_store(store, output_path / f"{volume_name}.opf.json")
+        result["count"] = len(combined_stams)
+
+
+def run_benchmarks(config: PechaConfig, root: Path) -> Dict:
+    results: Dict = {}
+    with stage(results, "generate"):
+        opf_paths = {
+            pecha_id: write_synthetic_pecha(root / pecha_id, pecha_id, config)
+            for pecha_id in [SOURCE_PECHA_ID, TARGET_PECHA_ID]
+        }
+        write_synthetic_alignment(
+            root / ALIGNMENT_ID,
+            ALIGNMENT_ID,
+            opf_paths[SOURCE_PECHA_ID],
+            opf_paths[TARGET_PECHA_ID],
+        )
+
+    stages_path = root / "stages"
+    stages_path.mkdir()
+    bench_layers(results, opf_paths[SOURCE_PECHA_ID], stages_path)
+
+    with stage(results, "convert_pecha_repo") as result:
+        for pecha_id in opf_paths:
+            volume_results = PechaRepo(
+                pecha_id, root / pecha_id
+            ).convert_pecha_repo_to_stam()
+            result["count"] += sum(r.annotations_count for r in volume_results)
+    with stage(results, "convert_alignment_repo"):
+        AlignmentRepo(
+            ALIGNMENT_ID, root / ALIGNMENT_ID
+        ).convert_alignment_repo_to_json()
+
+    """Pecha.from_id looks the pechas up in <pechas path>/<pecha id>"""
+    pechas_path = root / "pechas"
+    pechas_path.mkdir()
+    for pecha_id in opf_paths:
+        (pechas_path / pecha_id).symlink_to(root / pecha_id / "PechaData")
+
+    with stage(results, "pecha_load") as result:
+        pecha = Pecha(SOURCE_PECHA_ID, pechas_path / SOURCE_PECHA_ID)
+        for volume_name in pecha.get_pecha_volume_names():
+            result["count"] += pecha.pecha_volumes[volume_name].annotations_len()
+
+    with stage(results, "filtered_query") as result:
+        annotations = pecha.get_filtered_annotations(KEY, AnnotationEnum.segment)
+        result["count"] = sum(len(volume) for volume in annotations.values())
+
+    with stage(results, "alignment_iteration") as result:
+        alignment = Alignment(
+            ALIGNMENT_ID,
+            "",
+            root / ALIGNMENT_ID / "PechaData",
+            pechas_path=pechas_path,
+        )
+        result["count"] = sum(1 for _ in alignment.get_segment_pairs())
+    return results
+
+
+if __name__ == "__main__":
+    defaults = PechaConfig()
+    parser = argparse.ArgumentParser(description="benchmark the stam pipeline")
+    parser.add_argument("--volumes", type=int, default=defaults.volumes)
+    parser.add_argument("--layers", type=int, default=defaults.layers)
+    parser.add_argument("--annotations", type=int, default=defaults.annotations)
+    parser.add_argument("--text-size", type=int, default=defaults.text_size)
+    parser.add_argument(
+        "--payload-density", type=float, default=defaults.payload_density
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--output", type=Path, default=None, help="json result file")
+    args = parser.parse_args()
+
+    config = PechaConfig(
+        volumes=args.volumes,
+        layers=args.layers,
+        annotations=args.annotations,
+        text_size=args.text_size,
+        payload_density=args.payload_density,
+        seed=args.seed,
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        stages = run_benchmarks(config, Path(temp_dir))
+
+    report = {
+        "config": config._asdict(),
+        "python": platform.python_version(),
+        "stam": version("stam"),
+        "stages": stages,
+    }
+    report_json = json.dumps(report, indent=2)
+    if args.output is None:
+        print(report_json)
+    else:
+        args.output.write_text(report_json, encoding="utf-8")
+        for name, result in stages.items():
+            print(f"{name:<24} {result['seconds']:8.3f} s  {result['count']:>8}")
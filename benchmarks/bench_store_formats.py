@@ -0,0 +1,49 @@
+"""
+Benchmark of the stam json and cbor serializations of a volume.
+
+Saves layer stores of a growing number of annotations in both formats and
+compares the file sizes and the time to load them back with AnnotationStore,
+as Pecha does for every volume.
+
+    PYTHONPATH=src python benchmarks/bench_store_formats.py
+"""
+import tempfile
+import time
+from pathlib import Path
+
+from bench_combine import make_layer_store
+from stam import AnnotationStore
+
+from stam_annotator.utility import get_binary_stam_file_path, save_annotation_store
+
+REPEATS = 3
+
+
+def bench_load(file_path: Path) -> float:
+    """best of REPEATS load times"""
+    elapsed_times = []
+    for _ in range(REPEATS):
+        start_time = time.perf_counter()
+        AnnotationStore(file=str(file_path))
+        elapsed_times.append(time.perf_counter() - start_time)
+    return min(elapsed_times)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for annotations_count in [1000, 10000, 50000]:
+            json_file_path = Path(temp_dir) / f"v{annotations_count}.opf.json"
+            store = make_layer_store(0, annotations_count)
+            save_annotation_store(store, json_file_path, binary=True)
+            binary_file_path = get_binary_stam_file_path(json_file_path)
+
+            json_size = json_file_path.stat().st_size
+            binary_size = binary_file_path.stat().st_size
+            json_time = bench_load(json_file_path)
+            binary_time = bench_load(binary_file_path)
+            print(
+                f"annotations: {annotations_count:>6}, "
+                f"json: {json_size / 1024:8.1f} KiB {json_time:.3f} s, "
+                f"cbor: {binary_size / 1024:8.1f} KiB {binary_time:.3f} s, "
+                f"load speedup: {json_time / binary_time:.1f}x"
+            )
@@ -0,0 +1,183 @@
+"""
+Generator of synthetic OPF pechas and OPA alignments in the on-disk layout of
+the source repos, for the benchmarks:
+
+    <output>/OpenPecha-Data/<pecha id>.opf/meta.yml
+                                          /base/<volume>.txt
+                                          /layers/<volume>/<Type>-<index>.yml
+    <output>/OpenPecha-Data/<alignment id>.opa/meta.yml
+                                              /<alignment id>.yml
+
+With <output> = <root>/<id>, the repos can be converted with PechaRepo and
+AlignmentRepo (base path <root>/<id>) like cloned repos. Everything is
+derived from the seed, so the same knobs always give the same files.
+"""
+import random
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+import yaml
+
+from stam_annotator.config import AnnotationEnum
+
+SOURCE_ORG = "OpenPecha-Data"
+SEGMENT_LAYER = AnnotationEnum.segment.value
+"""layer types besides Segment, every volume has a Segment layer"""
+LAYER_TYPES = [
+    AnnotationEnum.chapter.value,
+    AnnotationEnum.quotation.value,
+    AnnotationEnum.citation.value,
+    AnnotationEnum.pagination.value,
+    AnnotationEnum.footnote.value,
+    AnnotationEnum.sabche.value,
+    AnnotationEnum.tsawa.value,
+    AnnotationEnum.yigchung.value,
+]
+LETTERS = "ཀཁགངཅཆཇཉཏཐདནཔཕབམཙཚཛཝཞཟའཡརལཤསཧཨ"
+
+Dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+class PechaConfig(NamedTuple):
+    volumes: int = 2
+    layers: int = 3
+    annotations: int = 1000
+    text_size: int = 100000
+    """fraction of the annotations that have payloads"""
+    payload_density: float = 0.1
+    seed: int = 0
+
+
+def get_hex_id(rng: random.Random) -> str:
+    return f"{rng.getrandbits(128):032x}"
+
+
+def write_yaml(data: Dict, file_path: Path):
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as file:
+        yaml.dump(data, file, Dumper=Dumper, allow_unicode=True, sort_keys=False)
+
+
+def get_volume_names(config: PechaConfig) -> List[str]:
+    return [f"v{index + 1:03d}" for index in range(config.volumes)]
+
+
+def make_segment_spans(config: PechaConfig) -> List[Dict[str, int]]:
+    """contiguous spans cutting the text in config.annotations segments"""
+    count = max(1, min(config.annotations, config.text_size))
+    bounds = [index * config.text_size // count for index in range(count + 1)]
+    return [{"start": start, "end": end} for start, end in zip(bounds, bounds[1:])]
+
+
+def make_layer(
+    rng: random.Random, config: PechaConfig, annotation_type: str, spans: List[Dict]
+) -> Dict:
+    annotations = {}
+    for span in spans:
+        annotation: Dict = {"span": span}
+        """payloads are the keys of an annotation besides its span"""
+        if rng.random() < config.payload_density:
+            annotation["confidence"] = rng.randint(0, 100)
+            annotation["note"] = f"note {rng.randint(0, 1000)}"
+        annotations[get_hex_id(rng)] = annotation
+    return {
+        "id": get_hex_id(rng),
+        "annotation_type": annotation_type,
+        "revision": "00001",
+        "annotations": annotations,
+    }
+
+
+def make_random_spans(rng: random.Random, config: PechaConfig) -> List[Dict]:
+    spans = []
+    for _ in range(config.annotations):
+        start = rng.randrange(config.text_size)
+        end = min(config.text_size, start + rng.randint(0, 50))
+        spans.append({"start": start, "end": end})
+    return sorted(spans, key=lambda span: (span["start"], span["end"]))
+
+
+def write_synthetic_pecha(
+    output_path: Path, pecha_id: str, config: PechaConfig = PechaConfig()
+) -> Path:
+    """write a pecha repo, returns its .opf folder"""
+    rng = random.Random(f"{config.seed}-{pecha_id}")
+    opf_path = Path(output_path) / SOURCE_ORG / f"{pecha_id}.opf"
+    write_yaml(
+        {"id": pecha_id, "source_metadata": {"title": pecha_id}}, opf_path / "meta.yml"
+    )
+
+    for volume_name in get_volume_names(config):
+        text = "".join(rng.choice(LETTERS) for _ in range(config.text_size))
+        base_file_path = opf_path / "base" / f"{volume_name}.txt"
+        base_file_path.parent.mkdir(parents=True, exist_ok=True)
+        base_file_path.write_text(text, encoding="utf-8")
+
+        layer_types = [SEGMENT_LAYER] + [
+            LAYER_TYPES[index % len(LAYER_TYPES)] for index in range(config.layers - 1)
+        ]
+        for layer_index, layer_type in enumerate(layer_types):
+            if layer_type == SEGMENT_LAYER:
+                spans = make_segment_spans(config)
+            else:
+                spans = make_random_spans(rng, config)
+            layer = make_layer(rng, config, layer_type, spans)
+            layer_file_name = f"{layer_type}-{layer_index:04d}.yml"
+            write_yaml(layer, opf_path / "layers" / volume_name / layer_file_name)
+    return opf_path
+
+
+def get_segment_ids(opf_path: Path, volume_name: str) -> List[str]:
+    segment_file_path = (
+        opf_path / "layers" / volume_name / f"{SEGMENT_LAYER}-{0:04d}.yml"
+    )
+    with open(segment_file_path, encoding="utf-8") as file:
+        return list(yaml.load(file, Loader=yaml.SafeLoader)["annotations"])
+
+
+def write_synthetic_alignment(
+    output_path: Path,
+    alignment_id: str,
+    source_opf_path: Path,
+    target_opf_path: Path,
+    volume_name: str = "v001",
+) -> Path:
+    """
+    write an alignment repo pairing the segments of a volume of a bo pecha
+    with the segments of the same volume of an en pecha, returns its .opa folder
+    """
+    source_pecha_id = source_opf_path.name[: -len(".opf")]
+    target_pecha_id = target_opf_path.name[: -len(".opf")]
+    source_segment_ids = get_segment_ids(source_opf_path, volume_name)
+    target_segment_ids = get_segment_ids(target_opf_path, volume_name)
+
+    opa_path = Path(output_path) / SOURCE_ORG / f"{alignment_id}.opa"
+    write_yaml(
+        {"id": alignment_id, "pechas": [source_pecha_id, target_pecha_id]},
+        opa_path / "meta.yml",
+    )
+    segment_sources = {
+        source_pecha_id: {
+            "type": "origin_type",
+            "relation": "source",
+            "lang": "bo",
+            "base": volume_name,
+        },
+        target_pecha_id: {
+            "type": "translation",
+            "relation": "target",
+            "lang": "en",
+            "base": volume_name,
+        },
+    }
+    segment_pairs = {
+        f"{index:032x}": {source_pecha_id: source_id, target_pecha_id: target_id}
+        for index, (source_id, target_id) in enumerate(
+            zip(source_segment_ids, target_segment_ids)
+        )
+    }
+    write_yaml(
+        {"segment_sources": segment_sources, "segment_pairs": segment_pairs},
+        opa_path / f"{alignment_id}.yml",
+    )
+    return opa_path
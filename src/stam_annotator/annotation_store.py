@@ -1,11 +1,16 @@
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Sequence, Union
 
 from pydantic import BaseModel, Field, field_validator
 
 from stam_annotator.config import AnnotationEnum, AnnotationGroupEnum
 from stam_annotator.opf_loader import OpfAnnotation, Span
-from stam_annotator.utility import get_filename_without_extension, get_uuid
+from stam_annotator.utility import (
+    get_annotation_data_id,
+    get_filename_without_extension,
+    get_new_id,
+    get_uuid,
+)
 
 
 class Annotation_Data(BaseModel):
@@ -112,13 +117,16 @@ def convert_opf_for_pre_stam_format(
     opf_annot: OpfAnnotation,
     annotation_type_key: AnnotationGroupEnum,
     resource_file_path: Union[str, Path],
+    id_parts: Optional[Sequence[str]] = None,
 ) -> Annotation_Store:
     """
     Convert opf annotation to annotation store for pre-stam format.
     class Annotation_Store is defined with format that is  compatible with stam.
+    With id_parts, the new ids are derived from them, see get_new_id. The
+    annotation data id comes from its key and value, like in the streaming path.
     """
 
-    store_id = get_uuid()
+    store_id = get_new_id(id_parts, "store")
     annotation_store = Annotation_Store(store_id=store_id)
     resource = create_resource(resource_file_path)
     annotation_store.add_resource(resource)
@@ -129,7 +137,9 @@ def convert_opf_for_pre_stam_format(
     annotation_store.add_data_set(data_set)
 
     annotation_data = Annotation_Data(
-        annotation_data_id=get_uuid(),
+        annotation_data_id=get_annotation_data_id(
+            annotation_type_key.value, opf_annot.annotation_type
+        ),
         annotation_data_key=annotation_type_key,
         annotation_data_value=opf_annot.annotation_type,
         store_id=store_id,
@@ -0,0 +1,301 @@
+import json
+import os
+import shutil
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from stam_annotator.config import ROOT_DIR
+from stam_annotator.profiling import write_profile_report
+from stam_annotator.stam_fetcher.mirror_cache import MirrorCache
+
+JOURNAL_FILE_NAME = "batch_journal.jsonl"
+
+
+class BatchItem(NamedTuple):
+    kind: str  # "pecha" or "alignment"
+    id_: str
+
+
+def fetch_repo(
+    item: BatchItem, output_path: Path, mirror_cache: Optional[MirrorCache] = None
+):
+    """
+    clone the source repo of a pecha or an alignment. A source folder left by an
+    interrupted fetch or by an earlier run is removed first, as git clone needs
+    an empty folder, unless the mirror cache can update its working tree.
+    """
+    from stam_annotator.convert_to_stam import AlignmentRepo, PechaRepo
+
+    base_path = output_path / item.id_
+    base_path.mkdir(parents=True, exist_ok=True)
+    repo = (
+        PechaRepo(item.id_, base_path)
+        if item.kind == "pecha"
+        else AlignmentRepo(item.id_, base_path)
+    )
+    source_path = base_path / repo.source_org
+    if source_path.exists() and (
+        mirror_cache is None or not (source_path / ".git").exists()
+    ):
+        shutil.rmtree(source_path)
+    if isinstance(repo, PechaRepo):
+        repo.get_pecha_repo(mirror_cache)
+    else:
+        repo.get_alignment_repo(mirror_cache)
+
+
+def convert_repo(
+    item: BatchItem,
+    output_path: Path,
+    profile_dir: Optional[Path] = None,
+    deterministic_ids: bool = False,
+) -> int:
+    """
+    convert a fetched pecha or alignment, returns the number of annotations.
+    With a profile_dir, the volumes of a pecha are profiled in profile_dir/<id>.
+    """
+    from stam_annotator.convert_to_stam import AlignmentRepo, PechaRepo
+
+    base_path = output_path / item.id_
+    if item.kind == "pecha":
+        pecha_profile_dir = profile_dir / item.id_ if profile_dir else None
+        results = PechaRepo(item.id_, base_path).convert_pecha_repo_to_stam(
+            profile_dir=pecha_profile_dir, deterministic_ids=deterministic_ids
+        )
+        return sum(result.annotations_count for result in results)
+    AlignmentRepo(item.id_, base_path).convert_alignment_repo_to_json()
+    return 0
+
+
+class BatchConverter:
+    """
+    Fetch and convert many pechas and alignments. Fetching is network bound and
+    runs in a bounded thread pool, conversion is cpu bound and runs in a separate
+    process pool, so a repo is converted as soon as it is fetched.
+
+    The status of every id is appended to a journal, a rerun with the same journal
+    skips the ids that were already converted and retries the failed ones.
+    The pechas of every alignment are fetched and converted with it, like
+    AlignmentRepo.get_aligned_pechas.
+
+    With a profile_dir, the volumes are converted under cProfile and a report
+    aggregated over all the pechas is written in profile_dir after the run.
+    With deterministic_ids, the pechas are converted to the same files on every
+    run, see PechaRepo.convert_pecha_repo_to_stam.
+    """
+
+    def __init__(
+        self,
+        pecha_ids: Iterable[str] = (),
+        alignment_ids: Iterable[str] = (),
+        output_path: Path = ROOT_DIR,
+        journal_path: Optional[Path] = None,
+        fetch_workers: int = 4,
+        convert_workers: Optional[int] = None,
+        mirror_cache: Optional[MirrorCache] = None,
+        fetch: Callable = fetch_repo,
+        convert: Callable = convert_repo,
+        profile_dir: Optional[Path] = None,
+        deterministic_ids: bool = False,
+    ):
+        self.items = [BatchItem("pecha", id_) for id_ in pecha_ids] + [
+            BatchItem("alignment", id_) for id_ in alignment_ids
+        ]
+        self.output_path = Path(output_path)
+        self.journal_path = Path(journal_path or self.output_path / JOURNAL_FILE_NAME)
+        self.fetch_workers = fetch_workers
+        self.convert_workers = convert_workers or os.cpu_count() or 1
+        self.mirror_cache = mirror_cache
+        self.fetch = fetch
+        self.convert = convert
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        convert_options: Dict = {}
+        if self.profile_dir is not None:
+            convert_options["profile_dir"] = self.profile_dir
+        if deterministic_ids:
+            convert_options["deterministic_ids"] = True
+        if convert_options:
+            self.convert = partial(convert, **convert_options)
+
+    def load_journal(self) -> Dict[BatchItem, Dict]:
+        """last journal record of every item"""
+        records: Dict[BatchItem, Dict] = {}
+        if not self.journal_path.exists():
+            return records
+        with open(self.journal_path, encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                records[BatchItem(record["kind"], record["id"])] = record
+        return records
+
+    def write_journal(self, item: BatchItem, status: str, **fields):
+        record = {"kind": item.kind, "id": item.id_, "status": status, **fields}
+        with open(self.journal_path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(record) + "\n")
+
+    def get_alignment_pecha_items(self, item: BatchItem) -> List[BatchItem]:
+        """the pechas of a converted alignment, from its meta.json"""
+        from stam_annotator.convert_to_stam import AlignmentRepo
+
+        alignment_repo = AlignmentRepo(item.id_, self.output_path / item.id_)
+        if not alignment_repo.alignment_repo_fn.exists():
+            return []
+        with open(alignment_repo.alignment_repo_fn, encoding="utf-8") as file:
+            pecha_ids = json.load(file).get("pechas") or []
+        return [BatchItem("pecha", pecha_id) for pecha_id in pecha_ids]
+
+    def get_items(self, journal: Dict[BatchItem, Dict]) -> List[BatchItem]:
+        """the items, and the pechas of the alignments converted in a previous run"""
+        items = list(self.items)
+        for item in self.items:
+            if item.kind != "alignment":
+                continue
+            if journal.get(item, {}).get("status") != "converted":
+                continue
+            for pecha_item in self.get_alignment_pecha_items(item):
+                if pecha_item not in items:
+                    items.append(pecha_item)
+        return items
+
+    def get_pending_items(self) -> Dict[BatchItem, str]:
+        """
+        items not converted yet, with the status of their last run. Items that
+        failed to convert are converted again without fetching them again.
+        """
+        journal = self.load_journal()
+        pending_items = {}
+        for item in self.get_items(journal):
+            record = journal.get(item, {})
+            status = record.get("status", "pending")
+            if status == "failed" and record.get("stage") == "convert":
+                status = "fetched"
+            if status != "converted":
+                pending_items[item] = status
+        return pending_items
+
+    def run(self) -> Dict:
+        """
+        fetch and convert all pending items, returns the throughput report.
+        The pechas of a converted alignment are fetched and converted too.
+        """
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        journal = self.load_journal()
+        known_items = set(self.get_items(journal))
+        pending_items = self.get_pending_items()
+        skipped_count = len(known_items) - len(pending_items)
+        converted: List[BatchItem] = []
+        failed: List[BatchItem] = []
+        annotations_count = 0
+
+        start_time = time.time()
+        fetch_executor = ThreadPoolExecutor(self.fetch_workers)
+        convert_executor = ProcessPoolExecutor(self.convert_workers)
+        with fetch_executor, convert_executor:
+            fetching: Dict[Future, BatchItem] = {}
+            converting: Dict[Future, BatchItem] = {}
+
+            def submit_fetch(item: BatchItem):
+                future = fetch_executor.submit(
+                    self.fetch, item, self.output_path, self.mirror_cache
+                )
+                fetching[future] = item
+
+            def submit_convert(item: BatchItem):
+                future = convert_executor.submit(self.convert, item, self.output_path)
+                converting[future] = item
+
+            for item, status in pending_items.items():
+                """items fetched in an interrupted run go straight to conversion"""
+                if status == "fetched":
+                    submit_convert(item)
+                else:
+                    submit_fetch(item)
+
+            while fetching or converting:
+                done, _ = wait(
+                    list(fetching) + list(converting), return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    if future in fetching:
+                        stage, item = "fetch", fetching.pop(future)
+                    else:
+                        stage, item = "convert", converting.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        failed.append(item)
+                        self.write_journal(
+                            item, "failed", stage=stage, error=str(error)
+                        )
+                    elif stage == "fetch":
+                        self.write_journal(item, "fetched")
+                        submit_convert(item)
+                    else:
+                        converted.append(item)
+                        annotations_count += future.result()
+                        self.write_journal(
+                            item, "converted", annotations=future.result()
+                        )
+                        if item.kind != "alignment":
+                            continue
+                        for pecha_item in self.get_alignment_pecha_items(item):
+                            if pecha_item not in known_items:
+                                known_items.add(pecha_item)
+                                submit_fetch(pecha_item)
+
+        elapsed_time = max(time.time() - start_time, 1e-9)
+        if self.profile_dir is not None:
+            write_profile_report(self.profile_dir)
+        pechas_count = sum(1 for item in converted if item.kind == "pecha")
+        return {
+            "converted": len(converted),
+            "failed": len(failed),
+            "skipped": skipped_count,
+            "annotations": annotations_count,
+            "seconds": elapsed_time,
+            "pechas_per_minute": pechas_count * 60 / elapsed_time,
+            "annotations_per_second": annotations_count / elapsed_time,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="fetch and convert pechas to stam")
+    parser.add_argument("--pechas", nargs="*", default=[], help="pecha ids")
+    parser.add_argument("--alignments", nargs="*", default=[], help="alignment ids")
+    parser.add_argument("--fetch-workers", type=int, default=4)
+    parser.add_argument("--convert-workers", type=int, default=None)
+    parser.add_argument("--journal", type=Path, default=None)
+    parser.add_argument(
+        "--profile-dir", type=Path, default=None, help="profile the conversions"
+    )
+    parser.add_argument("--deterministic-ids", action="store_true")
+    args = parser.parse_args()
+
+    from stam_annotator.opf_to_stam import setup_validation_log
+
+    setup_validation_log()
+
+    batch_converter = BatchConverter(
+        args.pechas,
+        args.alignments,
+        journal_path=args.journal,
+        fetch_workers=args.fetch_workers,
+        convert_workers=args.convert_workers,
+        profile_dir=args.profile_dir,
+        deterministic_ids=args.deterministic_ids,
+    )
+    report = batch_converter.run()
+    for key, value in report.items():
+        print(f"{key}: {value}")
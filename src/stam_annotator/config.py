@@ -1,17 +1,11 @@
 from enum import Enum
 from pathlib import Path
 
-
-def _mkdir(path):
-    if path.is_dir():
-        return path
-    path.mkdir(exist_ok=True, parents=True)
-    return path
-
-
-# Path
-BASE_PATH = _mkdir(Path.home() / ".pecha_data")
-PECHAS_PATH = _mkdir(BASE_PATH / "pechas")
+# Path, folders are created when something is first written to them
+BASE_PATH = Path.home() / ".pecha_data"
+PECHAS_PATH = BASE_PATH / "pechas"
+LAYER_CACHE_PATH = BASE_PATH / "cache" / "layers"
+MIRRORS_PATH = BASE_PATH / "mirrors"
 ROOT_DIR = Path(__file__).parent.parent.parent
 
 
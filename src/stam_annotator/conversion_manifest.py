@@ -0,0 +1,154 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from stam_annotator.utility import delete_annotation_store
+from stam_annotator.volume_converter import (
+    VolumeJob,
+    VolumeResult,
+    convert_volumes_to_stam,
+)
+
+"""bump when a change to the converter changes the stam output"""
+CONVERTER_VERSION = "2"
+MANIFEST_FILE_NAME = "conversion_manifest.json"
+
+
+def get_file_hash(file_path: Union[str, Path]) -> str:
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_volume_job_hashes(job: VolumeJob) -> Dict:
+    return {
+        "base_file": get_file_hash(job.base_file_path),
+        "layer_files": {
+            layer_file_path.name: get_file_hash(layer_file_path)
+            for layer_file_path in job.layer_file_paths
+        },
+    }
+
+
+class ConversionManifest:
+    """
+    Record of the inputs each volume was converted from: the hashes of the
+    base text and layer files, plus the converter version and options.
+    Used to convert only the volumes whose inputs changed since the last run.
+    """
+
+    def __init__(
+        self,
+        manifest_path: Union[str, Path],
+        options: Optional[Dict] = None,
+        volumes: Optional[Dict[str, Dict]] = None,
+    ):
+        self.manifest_path = Path(manifest_path)
+        self.converter_version = CONVERTER_VERSION
+        self.options = options or {}
+        self.volumes = volumes or {}
+
+    @classmethod
+    def load(
+        cls, manifest_path: Union[str, Path], options: Optional[Dict] = None
+    ) -> "ConversionManifest":
+        """
+        Load the manifest of the last run. If there is none, or it was written by
+        another converter version or with other options, an empty one is returned
+        so that every volume is converted again.
+        """
+        manifest_path = Path(manifest_path)
+        options = options or {}
+        if not manifest_path.exists():
+            return cls(manifest_path, options)
+        with open(manifest_path, encoding="utf-8") as file:
+            data = json.load(file)
+        if (
+            data.get("converter_version") != CONVERTER_VERSION
+            or data.get("options") != options
+        ):
+            return cls(manifest_path, options)
+        return cls(manifest_path, options, data.get("volumes", {}))
+
+    def get_output_file_path(self, volume_name: str) -> Optional[Path]:
+        output_file = self.volumes[volume_name]["output_file"]
+        return self.manifest_path.parent / output_file if output_file else None
+
+    def is_volume_changed(self, job: VolumeJob, hashes: Dict) -> bool:
+        volume = self.volumes.get(job.volume_name)
+        if volume is None or volume["hashes"] != hashes:
+            return True
+        """the volume had no annotations and so no output"""
+        if volume["output_file"] is None:
+            return False
+        return not job.output_file_path.exists()
+
+    def update_volume(
+        self, volume_name: str, hashes: Dict, output_file_path: Optional[Path]
+    ):
+        """a volume without annotations has no output, delete the stale one"""
+        if output_file_path is None and volume_name in self.volumes:
+            old_output_file_path = self.get_output_file_path(volume_name)
+            if old_output_file_path is not None:
+                delete_annotation_store(old_output_file_path)
+
+        output_file = None
+        if output_file_path is not None:
+            output_file = str(
+                Path(output_file_path).relative_to(self.manifest_path.parent)
+            )
+        self.volumes[volume_name] = {"hashes": hashes, "output_file": output_file}
+
+    def remove_missing_volumes(self, volume_names: List[str]) -> List[str]:
+        """drop the volumes that are no more in the repo and delete their output"""
+        removed_volume_names = [
+            volume_name
+            for volume_name in self.volumes
+            if volume_name not in volume_names
+        ]
+        for volume_name in removed_volume_names:
+            output_file_path = self.get_output_file_path(volume_name)
+            if output_file_path is not None:
+                delete_annotation_store(output_file_path)
+            del self.volumes[volume_name]
+        return removed_volume_names
+
+    def save(self):
+        data = {
+            "converter_version": self.converter_version,
+            "options": self.options,
+            "volumes": self.volumes,
+        }
+        self.manifest_path.write_text(json.dumps(data, indent=4), encoding="utf-8")
+
+
+def convert_changed_volumes_to_stam(
+    volume_jobs: List[VolumeJob],
+    manifest_path: Union[str, Path],
+    workers: int = 1,
+    options: Optional[Dict] = None,
+) -> Dict[str, Optional[VolumeResult]]:
+    """
+    Convert only the volumes whose base text or layer files changed since the
+    run recorded in the manifest, and delete the output of removed volumes.
+    Returns the results of the volumes that were converted, by volume name.
+    """
+    manifest = ConversionManifest.load(manifest_path, options)
+    manifest.remove_missing_volumes([job.volume_name for job in volume_jobs])
+
+    changed_jobs, changed_hashes = [], []
+    for job in volume_jobs:
+        hashes = get_volume_job_hashes(job)
+        if manifest.is_volume_changed(job, hashes):
+            changed_jobs.append(job)
+            changed_hashes.append(hashes)
+
+    results = convert_volumes_to_stam(changed_jobs, workers)
+    for job, hashes, result in zip(changed_jobs, changed_hashes, results):
+        output_file_path = result.output_file_path if result else None
+        manifest.update_volume(job.volume_name, hashes, output_file_path)
+    manifest.save()
+    return {job.volume_name: result for job, result in zip(changed_jobs, results)}
@@ -1,24 +1,41 @@
 import json
 import shutil
-import subprocess
 from datetime import datetime
 from json import JSONEncoder
 from pathlib import Path
-from typing import Dict, List
-
-import yaml
-from github import Github
-
-from stam_annotator.config import ROOT_DIR, AnnotationGroupEnum
-from stam_annotator.github_token import GITHUB_TOKEN
-from stam_annotator.opf_to_stam import opf_to_stam_pipeline
-from stam_annotator.stam_manager import combine_stams
-from stam_annotator.utility import save_annotation_store
+from typing import Dict, List, Optional
+
+from stam_annotator.config import ROOT_DIR
+from stam_annotator.conversion_manifest import (
+    MANIFEST_FILE_NAME,
+    convert_changed_volumes_to_stam,
+)
+from stam_annotator.git_upload import push_folder_to_repo
+from stam_annotator.instrumentation import stage
+from stam_annotator.layer_cache import LayerCache
+from stam_annotator.profiling import write_profile_report
+from stam_annotator.repo_manifest import RepoManifest
+from stam_annotator.stam_fetcher.mirror_cache import GITHUB_URL_TEMPLATE, MirrorCache
+from stam_annotator.stam_fetcher.utility import clone_repo
+from stam_annotator.utility import load_yaml
+from stam_annotator.volume_converter import (
+    VolumeJob,
+    VolumeResult,
+    check_output_options,
+    convert_volumes_to_stam,
+)
 
 SOURCE_ORG = "OpenPecha-Data"
 DESTINATION_ORG = "PechaData"
 
 
+def get_github_token() -> str:
+    """the token module is only imported when github is accessed"""
+    from stam_annotator.github_token import GITHUB_TOKEN
+
+    return GITHUB_TOKEN
+
+
 class PechaRepo:
     pecha_id: str
     source_org: str
@@ -34,81 +51,153 @@ class PechaRepo:
     def pecha_repo_fn(self):
         return self.base_path / f"{self.source_org}"
 
+    @property
+    def conversion_manifest_fn(self):
+        return self.base_path / MANIFEST_FILE_NAME
+
     @classmethod
     def from_id(cls, id_: str) -> "PechaRepo":
         cls.base_path = make_local_folder(ROOT_DIR / id_)
         return PechaRepo(id_, cls.base_path)
 
-    def get_pecha_repo(self):
-        try:
-            org, repo_name, token = self.source_org, self.pecha_id, GITHUB_TOKEN
-            """make a inner folder with source org name and clone the repo in it"""
-            destination_folder = self.base_path / org
-            repo_url = f"https://{token}@github.com/{org}/{repo_name}.git"
-            subprocess.run(["git", "clone", repo_url, destination_folder], check=True)
-            print(
-                f"Repository {repo_name} cloned successfully into {destination_folder}"
-            )
-
-        except subprocess.CalledProcessError as e:
-            print(f"Error cloning {repo_name} repository: {e}")
-
-    def convert_pecha_repo_to_stam(self):
-        group_files = get_folder_structure(self.base_path / self.source_org)
-        make_local_folder(self.base_path / self.destination_org)
-        for parent_dir, documents in group_files.items():
-            new_parent_dir = replace_parent_folder_name(
-                parent_dir, self.source_org, self.destination_org
-            )
-            """store all the converted stams in same dir and then combine"""
-            stams_in_dir = []
-            """loop through a files and folder in same dir."""
-            for doc, tag in documents:
-                if tag == "folder":
-                    continue
-                create_folder_if_not_exists(new_parent_dir)
-                if not doc.endswith(".yml"):
-                    shutil.copy(parent_dir / doc, new_parent_dir / doc)
-                    continue
-                if doc.endswith(".yml") and parent_dir.parent.name != "layers":
-                    yml_file_path = parent_dir / doc
-                    json_output_path = new_parent_dir / doc.replace(".yml", ".json")
-                    convert_yml_file_to_json(yml_file_path, json_output_path)
-                    continue
+    def get_pecha_repo(self, mirror_cache: Optional[MirrorCache] = None):
+        """
+        With a mirror_cache, the repo is checked out from a local mirror.
+        Raises RepoCloneError in both cases if the repo could not be fetched.
+        """
+        """make a inner folder with source org name and clone the repo in it"""
+        destination_folder = self.base_path / self.source_org
+        clone_repo(
+            self.source_org,
+            self.pecha_id,
+            get_github_token(),
+            destination_folder,
+            mirror_cache,
+        )
 
-                """convert yml files in layers to stam"""
-                if parent_dir.parent.name == "layers":
-                    base_file_path = next(
-                        self.pecha_repo_fn.rglob(f"{parent_dir.name}.txt")
+    def convert_pecha_repo_to_stam(
+        self,
+        workers: int = 1,
+        single_store: bool = True,
+        layer_cache: Optional[LayerCache] = None,
+        incremental: bool = False,
+        binary: bool = False,
+        standoff: bool = False,
+        profile_dir: Optional[Path] = None,
+        deterministic_ids: bool = False,
+    ) -> List[VolumeResult]:
+        """
+        Convert the pecha repo to stam. Volumes are independent of each other,
+        so with workers > 1 they are converted in a process pool.
+        single_store=False converts every layer to its own store and combines them.
+        With a layer_cache, unchanged layer yml files are not parsed again.
+        With incremental=True, only the volumes whose inputs changed since the last
+        run are converted, as recorded in the conversion manifest next to the output.
+        With binary=True, every volume stam is also saved as cbor next to the json.
+        With standoff=True, the volume stams reference the base text copied to the
+        output repo instead of embedding it, so they only hold the annotations.
+        It can not be combined with binary, as the cbor embeds the text anyway.
+        With a profile_dir, every volume is converted under cProfile and a report
+        of the hotspots and slowest volumes and layers is written in profile_dir,
+        see stam_annotator.profiling.
+        With deterministic_ids=True, the ids that are not in the layer files are
+        derived from the pecha id, volume, layer and annotation, so unchanged
+        inputs give byte-identical stam files.
+        Returns the results of the converted volumes.
+        """
+        check_output_options(binary, standoff)
+        with stage(
+            "convert_pecha_repo_to_stam", pecha_id=self.pecha_id
+        ) as current_stage:
+            manifest = RepoManifest.from_path(self.pecha_repo_fn)
+            make_local_folder(self.base_path / self.destination_org)
+            for parent_dir, documents in manifest.folder_structure.items():
+                new_parent_dir = replace_parent_folder_name(
+                    parent_dir, self.source_org, self.destination_org
+                )
+                """loop through a files and folder in same dir."""
+                for doc, tag in documents:
+                    if tag == "folder":
+                        continue
+                    create_folder_if_not_exists(new_parent_dir)
+                    if not doc.endswith(".yml"):
+                        shutil.copy(parent_dir / doc, new_parent_dir / doc)
+                        continue
+                    if doc.endswith(".yml") and parent_dir.parent.name != "layers":
+                        yml_file_path = parent_dir / doc
+                        json_output_path = new_parent_dir / doc.replace(".yml", ".json")
+                        convert_yml_file_to_json(yml_file_path, json_output_path)
+                        continue
+
+            """yml files in layers are converted to stam, one job per volume"""
+            volume_jobs: List[VolumeJob] = []
+            for volume_name, layer_file_paths in manifest.layer_files.items():
+                new_parent_dir = replace_parent_folder_name(
+                    layer_file_paths[0].parent, self.source_org, self.destination_org
+                )
+                base_file_path = manifest.get_base_file(volume_name)
+                if standoff:
+                    """the copy of the base text in the output repo"""
+                    new_base_dir = replace_parent_folder_name(
+                        base_file_path.parent, self.source_org, self.destination_org
                     )
-                    curr_stam = opf_to_stam_pipeline(
-                        self.pecha_id,
-                        parent_dir / doc,
-                        base_file_path,
-                        AnnotationGroupEnum.structure_type,
+                    base_file_path = new_base_dir / base_file_path.name
+                volume_jobs.append(
+                    VolumeJob(
+                        pecha_id=self.pecha_id,
+                        volume_name=volume_name,
+                        layer_file_paths=layer_file_paths,
+                        base_file_path=base_file_path,
+                        output_file_path=new_parent_dir / f"{volume_name}.opf.json",
+                        single_store=single_store,
+                        layer_cache=layer_cache,
+                        binary=binary,
+                        standoff=standoff,
+                        profile_dir=profile_dir,
+                        deterministic_ids=deterministic_ids,
                     )
-                    if curr_stam:
-                        stams_in_dir.append(curr_stam)
-                    continue
-
-            stams_count = len(stams_in_dir)
-            if stams_count == 0:
-                continue
-            combined_stam = (
-                stams_in_dir[0] if stams_count == 1 else combine_stams(stams_in_dir)
-            )
-
-            save_annotation_store(
-                combined_stam, new_parent_dir / f"{parent_dir.name}.opf.json"
-            )
-
-    def upload_pecha_repo(self):
+                )
+
+            volume_results: List[Optional[VolumeResult]]
+            if incremental:
+                volume_results = list(
+                    convert_changed_volumes_to_stam(
+                        volume_jobs,
+                        self.conversion_manifest_fn,
+                        workers,
+                        options={
+                            "single_store": single_store,
+                            "binary": binary,
+                            "standoff": standoff,
+                            "deterministic_ids": deterministic_ids,
+                        },
+                    ).values()
+                )
+            else:
+                volume_results = convert_volumes_to_stam(volume_jobs, workers)
+            results = [result for result in volume_results if result is not None]
+            current_stage.count = sum(result.annotations_count for result in results)
+        if profile_dir is not None:
+            write_profile_report(profile_dir)
+        return results
+
+    def upload_pecha_repo(self, single_commit: bool = True):
+        """
+        With single_commit, the repo is pushed as one git commit that only holds
+        the files changed since the last upload, also when the repo already exists.
+        """
         org_name, repo_name = DESTINATION_ORG, self.pecha_id
-        repo_is_created = create_github_repo(org_name, repo_name, GITHUB_TOKEN)
+        token = get_github_token()
+        repo_is_created = create_github_repo(org_name, repo_name, token)
+        if single_commit:
+            project_path = self.base_path / self.destination_org
+            if push_files_to_github_repo(org_name, repo_name, project_path, token):
+                print(f"Pecha repo {repo_name} uploaded successfully")
+            return
         if repo_is_created:
             project_path = self.base_path / self.destination_org
             repo_name = self.pecha_id
-            upload_files_to_github_repo(org_name, repo_name, project_path, GITHUB_TOKEN)
+            upload_files_to_github_repo(org_name, repo_name, project_path, token)
             print(f"Pecha repo {repo_name} uploaded successfully")
 
 
@@ -146,24 +235,25 @@ class AlignmentRepo:
         for pecha_id in pechas:
             self.pecha_repos[pecha_id] = PechaRepo.from_id(pecha_id)
 
-    def get_alignment_repo(self):
-        try:
-            org, repo_name, token = self.source_org, self.alignment_id, GITHUB_TOKEN
-            """make a inner folder with source org name and clone the repo in it"""
-            destination_folder = self.base_path / org
-            repo_url = f"https://{token}@github.com/{org}/{repo_name}.git"
-            subprocess.run(["git", "clone", repo_url, destination_folder], check=True)
-            print(
-                f"Repository {repo_name} cloned successfully into {destination_folder}"
-            )
-
-        except subprocess.CalledProcessError as e:
-            print(f"Error cloning {repo_name} repository: {e}")
+    def get_alignment_repo(self, mirror_cache: Optional[MirrorCache] = None):
+        """
+        With a mirror_cache, the repo is checked out from a local mirror.
+        Raises RepoCloneError in both cases if the repo could not be fetched.
+        """
+        """make a inner folder with source org name and clone the repo in it"""
+        destination_folder = self.base_path / self.source_org
+        clone_repo(
+            self.source_org,
+            self.alignment_id,
+            get_github_token(),
+            destination_folder,
+            mirror_cache,
+        )
 
     def convert_alignment_repo_to_json(self):
-        group_files = get_folder_structure(self.base_path / self.source_org)
+        manifest = RepoManifest.from_path(self.base_path / self.source_org)
         make_local_folder(self.base_path / self.destination_org)
-        for parent_dir, documents in group_files.items():
+        for parent_dir, documents in manifest.folder_structure.items():
             new_parent_dir = replace_parent_folder_name(
                 parent_dir, self.source_org, self.destination_org
             )
@@ -185,13 +275,23 @@ class AlignmentRepo:
                 shutil.copy(parent_dir / doc, new_parent_dir / doc)
                 continue
 
-    def upload_alignment_repo(self):
+    def upload_alignment_repo(self, single_commit: bool = True):
+        """
+        With single_commit, the repo is pushed as one git commit that only holds
+        the files changed since the last upload, also when the repo already exists.
+        """
         org_name, repo_name = DESTINATION_ORG, self.alignment_id
-        repo_is_created = create_github_repo(org_name, repo_name, GITHUB_TOKEN)
+        token = get_github_token()
+        repo_is_created = create_github_repo(org_name, repo_name, token)
+        if single_commit:
+            project_path = self.base_path / self.destination_org
+            if push_files_to_github_repo(org_name, repo_name, project_path, token):
+                print(f"Alignment repo {repo_name} uploaded successfully")
+            return
         if repo_is_created:
             project_path = self.base_path / self.destination_org
             repo_name = self.alignment_id
-            upload_files_to_github_repo(org_name, repo_name, project_path, GITHUB_TOKEN)
+            upload_files_to_github_repo(org_name, repo_name, project_path, token)
             print(f"Alignment repo {repo_name} uploaded successfully")
 
     def get_aligned_pechas(self):
@@ -218,6 +318,8 @@ def create_folder_if_not_exists(folder_path):
 
 
 def create_github_repo(org_name: str, repo_name: str, token: str) -> bool:
+    from github import Github
+
     try:
         g = Github(token)
         org = g.get_organization(org_name)
@@ -236,10 +338,12 @@ def upload_files_to_github_repo(
     token: str,
     commit_message: str = "upload file",
 ):
+    from github import Github
+
     g = Github(token)
     repo = g.get_organization(org_name).get_repo(repo_name)
     for file in project_path.rglob("*"):
-        if file.is_dir():
+        if file.is_dir() or ".git" in file.relative_to(project_path).parts:
             continue
         with open(file, encoding="utf-8") as f:
             data = f.read()
@@ -248,6 +352,20 @@ def upload_files_to_github_repo(
         repo.create_file(str(relative_file_path), commit_message, data, branch="main")
 
 
+def push_files_to_github_repo(
+    org_name: str,
+    repo_name: str,
+    project_path: Path,
+    token: str,
+    commit_message: str = "upload file",
+) -> bool:
+    """upload all the files in a single commit with git push, instead of a commit per file"""
+    repo_url = GITHUB_URL_TEMPLATE.format(
+        token=token, org=org_name, repo_name=repo_name
+    )
+    return push_folder_to_repo(project_path, repo_url, commit_message=commit_message)
+
+
 def make_local_folder(destination_folder: Path) -> Path:
     """make local folder to clone the alignment and pecha repo"""
     destination_folder.mkdir(parents=True, exist_ok=True)
@@ -255,19 +373,8 @@ def make_local_folder(destination_folder: Path) -> Path:
 
 
 def get_folder_structure(path: Path):
-    base_path = Path(path)
-    grouped_files: Dict[Path, List] = {}
-
-    for file in base_path.rglob("*"):
-        if ".git" not in file.parts:
-            # Group files and folders by their parent directory
-            file_tag_pair = (file.name, "file" if file.is_file() else "folder")
-            if file.parent not in grouped_files:
-                grouped_files[file.parent] = [file_tag_pair]
-            else:
-                grouped_files[file.parent].append(file_tag_pair)
-
-    return grouped_files
+    """Group files and folders by their parent directory"""
+    return RepoManifest.from_path(path).folder_structure
 
 
 def replace_parent_folder_name(path: Path, old_name: str, new_name: str):
@@ -287,9 +394,7 @@ def replace_parent_folder_name(path: Path, old_name: str, new_name: str):
 
 def convert_yml_file_to_json(yml_file_path: Path, json_output_path: Path):
     yml_content = yml_file_path.read_text(encoding="utf-8")
-    converted_json = json.dumps(
-        yaml.safe_load(yml_content), indent=4, cls=CustomEncoder
-    )
+    converted_json = json.dumps(load_yaml(yml_content), indent=4, cls=CustomEncoder)
     json_output_path.write_text(converted_json)
 
 
@@ -303,6 +408,9 @@ class CustomEncoder(JSONEncoder):
 
 
 if __name__ == "__main__":
+    from stam_annotator.opf_to_stam import setup_validation_log
+
+    setup_validation_log()
     pecha_repo = PechaRepo.from_id("P000216")
     pecha_repo.get_pecha_repo()
     pecha_repo.convert_pecha_repo_to_stam()
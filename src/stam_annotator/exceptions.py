@@ -24,3 +24,42 @@ class CustomDataValidationError(Exception):
     def __init__(self, message):
         self.message = message
         super().__init__(self.message)
+
+    def with_context(self, context: str) -> "CustomDataValidationError":
+        """the same error, with context (file name, pecha id) before the message"""
+        return CustomDataValidationError(f"{context}, {self.message}")
+
+
+class InvalidSpanError(CustomDataValidationError):
+    """Raised when spans of an opf layer are negative, reversed or out of text bound"""
+
+    def __init__(self, annotation_ids, context: str = ""):
+        self.annotation_ids = annotation_ids
+        self.context = context
+        message = (
+            f"Invalid span in {len(annotation_ids)} annotation(s): "
+            f"{', '.join(annotation_ids)}"
+        )
+        super().__init__(f"{context}, {message}" if context else message)
+
+    def with_context(self, context: str) -> "InvalidSpanError":
+        if self.context:
+            context = f"{context}, {self.context}"
+        return InvalidSpanError(self.annotation_ids, context)
+
+    def __reduce__(self):
+        return (self.__class__, (self.annotation_ids, self.context))
+
+
+class VolumeConversionError(Exception):
+    """Raised when a volume of a pecha could not be converted to stam"""
+
+    def __init__(self, pecha_id, volume_name, error):
+        self.pecha_id = pecha_id
+        self.volume_name = volume_name
+        self.error = error
+        self.message = f"pecha id: {pecha_id}, volume: {volume_name}, {error}"
+        super().__init__(self.message)
+
+    def __reduce__(self):
+        return (self.__class__, (self.pecha_id, self.volume_name, self.error))
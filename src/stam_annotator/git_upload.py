@@ -0,0 +1,59 @@
+import subprocess
+from pathlib import Path
+from typing import List
+
+"""identity of the upload commits"""
+COMMITTER_NAME = "OpenPecha"
+COMMITTER_EMAIL = "dev@openpecha.org"
+
+
+def run_git(project_path: Path, args: List[str], check: bool = True):
+    return subprocess.run(
+        [
+            "git",
+            "-c",
+            f"user.name={COMMITTER_NAME}",
+            "-c",
+            f"user.email={COMMITTER_EMAIL}",
+            *args,
+        ],
+        cwd=project_path,
+        check=check,
+        capture_output=True,
+    )
+
+
+def push_folder_to_repo(
+    project_path: Path,
+    repo_url: str,
+    branch: str = "main",
+    commit_message: str = "upload file",
+) -> bool:
+    """
+    Upload the whole folder to the repo as a single commit with git push.
+    The commit is made on top of the current remote branch, so it only holds
+    the files whose content changed since the last upload.
+    Returns False if there was nothing to upload.
+    """
+    project_path = Path(project_path)
+    if not (project_path / ".git").exists():
+        run_git(project_path, ["init", "-b", branch])
+        run_git(project_path, ["remote", "add", "origin", repo_url])
+    else:
+        run_git(project_path, ["remote", "set-url", "origin", repo_url])
+
+    """a newly created repo has no branch to fetch yet"""
+    fetched = run_git(
+        project_path, ["fetch", "--depth", "1", "origin", branch], check=False
+    )
+    if fetched.returncode == 0:
+        run_git(project_path, ["reset", "--mixed", "FETCH_HEAD"])
+
+    run_git(project_path, ["add", "-A"])
+    has_changes = run_git(project_path, ["diff", "--cached", "--quiet"], check=False)
+    if has_changes.returncode == 0:
+        return False
+
+    run_git(project_path, ["commit", "-m", commit_message])
+    run_git(project_path, ["push", "origin", f"HEAD:refs/heads/{branch}"])
+    return True
@@ -0,0 +1,203 @@
+"""
+Timing and memory instrumentation of the pipeline stages.
+
+    with stage("combine_stams", stores=len(stams)) as current_stage:
+        ...
+        current_stage.count = store.annotations_len()
+
+records the wall time, the count set by the stage and, with trace_memory, the
+tracemalloc peak of every stage, and hands the record to the enabled sinks.
+It is off by default, stage() then returns a shared no-op stage.
+
+It is enabled with enable_instrumentation(), or with the environment variable
+STAM_ANNOTATOR_INSTRUMENTATION, a comma separated list of sinks: "log",
+"memory" or the path of a json lines file. STAM_ANNOTATOR_TRACE_MEMORY=1 also
+records the peak memory. In a process pool, every worker records its own
+stages, only the log and json file sinks collect them all.
+"""
+import json
+import logging
+import os
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+INSTRUMENTATION_ENV = "STAM_ANNOTATOR_INSTRUMENTATION"
+TRACE_MEMORY_ENV = "STAM_ANNOTATOR_TRACE_MEMORY"
+
+logger = logging.getLogger(__name__)
+
+
+class StageRecord(NamedTuple):
+    stage: str
+    seconds: float
+    """the count set by the stage, count would shadow tuple.count"""
+    item_count: Optional[int]
+    peak_memory: Optional[int]
+    fields: Dict[str, Any]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "seconds": self.seconds,
+            "count": self.item_count,
+            "peak_memory": self.peak_memory,
+            "pid": os.getpid(),
+            **self.fields,
+        }
+
+
+class LoggingSink:
+    def record(self, stage_record: StageRecord):
+        logger.info(json.dumps(stage_record.to_dict(), default=str))
+
+
+class JsonFileSink:
+    """append every record as a json line, also from worker processes"""
+
+    def __init__(self, file_path: Union[str, Path]):
+        self.file_path = Path(file_path)
+
+    def record(self, stage_record: StageRecord):
+        line = json.dumps(stage_record.to_dict(), default=str)
+        with open(self.file_path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+
+class MemorySink:
+    """keep the records in a list, for tests"""
+
+    def __init__(self):
+        self.records: List[StageRecord] = []
+
+    def record(self, stage_record: StageRecord):
+        self.records.append(stage_record)
+
+    def get_records(self, stage_name: str) -> List[StageRecord]:
+        return [record for record in self.records if record.stage == stage_name]
+
+
+"""None until the instrumentation is configured, from the environment by default"""
+_sinks: Optional[List] = None
+_trace_memory = False
+"""peaks of the open stages, as nested stages reset the tracemalloc peak"""
+_memory_peaks: List[int] = []
+
+
+def enable_instrumentation(*sinks, trace_memory: bool = False):
+    global _sinks, _trace_memory
+    _sinks = list(sinks)
+    _trace_memory = trace_memory
+
+
+def disable_instrumentation():
+    enable_instrumentation()
+
+
+def add_sink(sink):
+    """record to sink too, besides the sinks already enabled"""
+    global _sinks
+    _sinks = get_sinks()
+    _sinks.append(sink)
+
+
+def remove_sink(sink):
+    if _sinks and sink in _sinks:
+        _sinks.remove(sink)
+
+
+def configure_from_env():
+    sinks: List[Union[LoggingSink, MemorySink, JsonFileSink]] = []
+    for sink_name in os.environ.get(INSTRUMENTATION_ENV, "").split(","):
+        sink_name = sink_name.strip()
+        if not sink_name:
+            continue
+        if sink_name == "log":
+            sinks.append(LoggingSink())
+        elif sink_name == "memory":
+            sinks.append(MemorySink())
+        else:
+            sinks.append(JsonFileSink(sink_name))
+    trace_memory = os.environ.get(TRACE_MEMORY_ENV, "") not in ["", "0"]
+    enable_instrumentation(*sinks, trace_memory=trace_memory)
+
+
+def get_sinks() -> List:
+    if _sinks is None:
+        configure_from_env()
+    return _sinks if _sinks is not None else []
+
+
+def reset_memory_peak():
+    """
+    tracemalloc.reset_peak is new in python 3.9, before it the peak of a stage
+    is the peak since the tracing started, an upper bound of it
+    """
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+
+
+class Stage:
+    __slots__ = ("name", "fields", "count", "start_time", "started_tracing")
+
+    def __init__(self, name: str, fields: Dict[str, Any]):
+        self.name = name
+        self.fields = fields
+        self.count: Optional[int] = None
+        self.start_time = 0.0
+        self.started_tracing = False
+
+    def __enter__(self) -> "Stage":
+        if _trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+            if _memory_peaks:
+                _memory_peaks[-1] = max(
+                    _memory_peaks[-1], tracemalloc.get_traced_memory()[1]
+                )
+            _memory_peaks.append(0)
+            reset_memory_peak()
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start_time
+        peak_memory = None
+        if _trace_memory and _memory_peaks:
+            peak_memory = max(_memory_peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if _memory_peaks:
+                _memory_peaks[-1] = max(_memory_peaks[-1], peak_memory)
+            if self.started_tracing:
+                tracemalloc.stop()
+        """failed stages are not recorded"""
+        if exc_type is not None:
+            return False
+        stage_record = StageRecord(
+            self.name, seconds, self.count, peak_memory, self.fields
+        )
+        for sink in get_sinks():
+            sink.record(stage_record)
+        return False
+
+
+class NullStage:
+    """stage used when the instrumentation is off, setting count is a no-op"""
+
+    count: Optional[int] = None
+
+    def __enter__(self) -> "NullStage":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+def stage(name: str, **fields) -> Union[Stage, NullStage]:
+    if not get_sinks():
+        return NULL_STAGE
+    return Stage(name, fields)
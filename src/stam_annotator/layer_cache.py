@@ -0,0 +1,80 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from stam_annotator.config import LAYER_CACHE_PATH
+
+"""bump when the normalization of opf layers changes, so old entries are not used"""
+LAYER_CACHE_VERSION = "1"
+
+
+class LayerCache:
+    """
+    On disk cache of normalized opf layer dicts, keyed by the hash of the
+    layer yml content. Reconverting an unchanged layer reads the pickled
+    dict instead of parsing the yml again.
+    """
+
+    def __init__(self, cache_path: Union[str, Path] = LAYER_CACHE_PATH):
+        self.cache_path = Path(cache_path)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(content: bytes, namespace: str = "") -> str:
+        """namespace separates the entries of a content normalized differently"""
+        key = hashlib.sha256(LAYER_CACHE_VERSION.encode() + content)
+        if namespace:
+            key.update(namespace.encode())
+        return key.hexdigest()
+
+    def get_entry_path(self, key: str) -> Path:
+        return self.cache_path / key[:2] / f"{key}.pickle"
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def set(self, key: str, data: Dict):
+        entry_path = self.get_entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        """
+        write to a temporary file of its own first, so readers never see a partial
+        entry and writers of the same key in other processes do not clash. The
+        writers write the same data, the last one to replace the entry wins.
+        """
+        fd, temp_file_name = tempfile.mkstemp(dir=entry_path.parent, suffix=".tmp")
+        temp_path = Path(temp_file_name)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            temp_path.replace(entry_path)
+        except OSError:
+            temp_path.unlink(missing_ok=True)
+            if not entry_path.exists():
+                raise
+
+    def clear(self):
+        for entry_path in self.cache_path.glob("*/*.pickle"):
+            entry_path.unlink()
+
+    def get_stats(self) -> Dict:
+        entry_paths = list(self.cache_path.glob("*/*.pickle"))
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(entry_paths),
+            "size_bytes": sum(path.stat().st_size for path in entry_paths),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -2,7 +2,11 @@ from typing import Any, Dict, Optional
 
 from pydantic import BaseModel, Field, ValidationError, ValidationInfo, field_validator
 
-from stam_annotator.exceptions import CustomDataValidationError
+from stam_annotator.exceptions import CustomDataValidationError, InvalidSpanError
+from stam_annotator.opf_validation import (  # noqa: F401
+    find_invalid_spans,
+    validate_opf_data,
+)
 from stam_annotator.utility import get_uuid
 
 
@@ -32,15 +36,19 @@ class Annotation(BaseModel):
 class Annotations(BaseModel):
     annotations_dict: Dict[str, Annotation]
 
-    def __init__(self, annotations: Dict[str, Dict]):
+    def __init__(self, annotations: Dict[str, Dict], text_length: Optional[int] = None):
         try:
             if annotations is None or not annotations:
                 annotations_processed = {}
             else:
+                invalid_ids = find_invalid_spans(annotations, text_length)
+                if invalid_ids:
+                    raise InvalidSpanError(invalid_ids)
+                """the span dict is validated with the annotation in one call"""
                 annotations_processed = {
                     id: Annotation(
                         id=id,
-                        span=Span(**value["span"]),
+                        span=value["span"],
                         payloads={k: v for k, v in value.items() if k != "span"},
                     )
                     for id, value in annotations.items()
@@ -84,16 +92,16 @@ class OpfAnnotation(BaseModel):
         return v
 
 
-def create_opf_annotation_instance(data: Dict) -> OpfAnnotation:
+def create_opf_annotation_instance(
+    data: Dict, text_length: Optional[int] = None
+) -> OpfAnnotation:
     try:
         opf_obj = OpfAnnotation(
             id=data["id"],
             annotation_type=data["annotation_type"],
             revision=data["revision"],
-            annotations=Annotations(data["annotations"]),
+            annotations=Annotations(data["annotations"], text_length),
         )
         return opf_obj
     except CustomDataValidationError as e:
-        raise CustomDataValidationError(
-            f"file name:{data['annotation_type']}, {e.message}"
-        )
+        raise e.with_context(f"file name:{data['annotation_type']}")
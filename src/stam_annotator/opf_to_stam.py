@@ -1,32 +1,110 @@
+import json
 import logging
+import os
 from pathlib import Path
-from typing import Dict, List
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
 from uuid import uuid4
 
-from stam import AnnotationStore, Offset, Selector
+from stam import AnnotationDataSet, AnnotationStore, Offset, Selector, TextResource
 
-from stam_annotator.annotation_store import (
-    Annotation_Store,
-    convert_opf_for_pre_stam_format,
-)
-from stam_annotator.config import AnnotationGroupEnum
+from stam_annotator.config import AnnotationEnum, AnnotationGroupEnum
 from stam_annotator.exceptions import CustomDataValidationError
-from stam_annotator.opf_loader import create_opf_annotation_instance
-from stam_annotator.utility import load_opf_annotations_from_yaml
+from stam_annotator.instrumentation import stage
+from stam_annotator.layer_cache import LayerCache
+from stam_annotator.opf_validation import validate_opf_data
+from stam_annotator.utility import (
+    get_annotation_data_id,
+    get_filename_without_extension,
+    get_layer_id_parts,
+    get_new_id,
+    load_opf_annotations_from_yaml,
+)
+
+if TYPE_CHECKING:
+    from stam_annotator.annotation_store import Annotation_Store
+
+VALIDATION_LOG_FILE = "validation_errors.log"
+
+logger = logging.getLogger(__name__)
+
+
+def setup_validation_log(log_file_path: Union[str, Path] = VALIDATION_LOG_FILE):
+    """
+    Write the validation errors of the converters to a log file. Called by the
+    command line entry points, importing the module has no side effect.
+    """
+    log_file_path = str(Path(log_file_path).absolute())
+    for handler in logger.handlers:
+        if getattr(handler, "baseFilename", None) == log_file_path:
+            return
+    handler = logging.FileHandler(log_file_path)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    handler.setLevel(logging.ERROR)
+    logger.addHandler(handler)
 
 
 def get_uuid():
     return uuid4().hex
 
 
-def create_annotationstore(id: str):
-    return AnnotationStore(id=id)
+class AnnotationDataInterner:
+    """
+    Identical (set, key, value) annotation data is added once to a store, with
+    the id of get_annotation_data_id, and the annotations after the first one
+    refer to it by id. Layers like Language or Pagination repeat the same few
+    values on thousands of annotations.
+    An interner is used with one store, stam keeps the data that already exists
+    in the store when it is added again with the same id.
+    """
+
+    def __init__(self):
+        self.data_ids: Dict[Tuple[str, str, str], str] = {}
+
+    def get_data(
+        self, set_id: str, key: str, value: Any, data_id: Optional[str] = None
+    ) -> Dict:
+        """
+        the json of the value keeps 1, 1.0 and True apart. data_id is the id of
+        data that already has one, like the pre-stam annotation data
+        """
+        data_key = (set_id, key, json.dumps(value, sort_keys=True))
+        interned_id = self.data_ids.get(data_key)
+        if interned_id is not None:
+            return {"id": interned_id, "set": set_id}
+        interned_id = data_id or get_annotation_data_id(key, value)
+        self.data_ids[data_key] = interned_id
+        return {"id": interned_id, "key": key, "value": value, "set": set_id}
+
+
+def create_annotationstore(id: str, workdir: Optional[Path] = None):
+    """with a workdir, included files are referenced relative to it"""
+    if workdir is None:
+        return AnnotationStore(id=id)
+    return AnnotationStore(id=id, config={"workdir": str(workdir)})
 
 
 def create_resource(store: AnnotationStore, resource_id: str, text: str):
     return store.add_resource(id=resource_id, text=text)
 
 
+def create_base_resource(
+    store: AnnotationStore,
+    resource_file_path: Union[str, Path],
+    standoff_dir: Optional[Path] = None,
+) -> TextResource:
+    """
+    Add the base text of a volume to the store. With a standoff_dir, the store
+    only references the base text file, by its path relative to standoff_dir
+    (the folder the store is saved to), instead of embedding the text.
+    """
+    resource_id = get_filename_without_extension(resource_file_path)
+    if standoff_dir is None:
+        text = Path(resource_file_path).read_text(encoding="utf-8")
+        return create_resource(store=store, resource_id=resource_id, text=text)
+    include_path = os.path.relpath(resource_file_path, standoff_dir)
+    return store.add_resource(id=resource_id, filename=include_path)
+
+
 def create_dataset(store: AnnotationStore, id: str, key: AnnotationGroupEnum):
     dataset = store.add_dataset(id=id)
     dataset.add_key(key.value)
@@ -39,7 +117,7 @@ def create_annotation(
     return store.annotate(id=id, target=target, data=data)
 
 
-def opf_annotation_store_to_stam(annotation_store: Annotation_Store):
+def opf_annotation_store_to_stam(annotation_store: "Annotation_Store"):
     # Create annotation store
     store = create_annotationstore(id=annotation_store.store_id)
     # Create resource
@@ -54,19 +132,21 @@ def opf_annotation_store_to_stam(annotation_store: Annotation_Store):
         store=store, id=data_set.data_set_id, key=data_set.data_set_key
     )
     # Create annotation
+    interner = AnnotationDataInterner()
+    dataset_id = dataset.id()
     for annotation in annotation_store.annotations:
         annotation_data = annotation.annotation_data
         data = [
-            {
-                "id": get_uuid(),
-                "key": annotation_data.annotation_data_key.value,
-                "value": annotation_data.annotation_data_value.value,
-                "set": dataset.id(),
-            }
+            interner.get_data(
+                dataset_id,
+                annotation_data.annotation_data_key.value,
+                annotation_data.annotation_data_value.value,
+                annotation_data.annotation_data_id,
+            )
         ]
         if annotation.payloads:
             for key, value in annotation.payloads.items():
-                data.append({"key": key, "value": value, "set": dataset.id()})
+                data.append(interner.get_data(dataset_id, key, value))
 
         create_annotation(
             store=store,
@@ -81,11 +161,70 @@ def opf_annotation_store_to_stam(annotation_store: Annotation_Store):
     return store
 
 
-logging.basicConfig(
-    level=logging.ERROR,  # Set the log level to ERROR or the desired level
-    filename="validation_errors.log",  # Specify the log file
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
+def annotate_opf_data(
+    store: AnnotationStore,
+    resource: TextResource,
+    dataset: AnnotationDataSet,
+    opf_data_dict: Dict,
+    annotation_type_key: AnnotationGroupEnum,
+    interner: Optional[AnnotationDataInterner] = None,
+):
+    """
+    Write the annotations of a validated opf yml dict into an existing store,
+    on the given resource and data set. An interner can be shared by the layers
+    written into the same store.
+    """
+    if interner is None:
+        interner = AnnotationDataInterner()
+    annotation_type = AnnotationEnum(opf_data_dict["annotation_type"])
+    dataset_id = dataset.id()
+    if dataset_id is None:
+        raise ValueError("interned annotation data refer to the data set by its id")
+    for annotation_id, annotation in opf_data_dict["annotations"].items():
+        data = [
+            interner.get_data(
+                dataset_id, annotation_type_key.value, annotation_type.value
+            )
+        ]
+        for key, value in annotation.items():
+            if key != "span":
+                data.append(interner.get_data(dataset_id, key, value))
+
+        span = annotation["span"]
+        create_annotation(
+            store=store,
+            id=annotation_id or get_uuid(),
+            target=Selector.textselector(
+                resource, Offset.simple(int(span["start"]), int(span["end"]))
+            ),
+            data=data,
+        )
+
+
+def opf_data_to_stam(
+    opf_data_dict: Dict,
+    annotation_type_key: AnnotationGroupEnum,
+    resource_file_path: Union[str, Path],
+    standoff_dir: Optional[Path] = None,
+    id_parts: Optional[Sequence[str]] = None,
+) -> AnnotationStore:
+    """
+    Convert the normalized opf yml dict straight to a stam annotation store.
+    Gives the same store as the strict path, without building the pydantic
+    opf models and the pre-stam annotation store in between.
+    With id_parts, the store id is derived from them, see get_new_id.
+    """
+    store = create_annotationstore(
+        id=get_new_id(id_parts, "store"), workdir=standoff_dir
+    )
+    resource = create_base_resource(store, resource_file_path, standoff_dir)
+    validate_opf_data(opf_data_dict, text_length=resource.textlen())
+
+    dataset = create_dataset(
+        store=store, id=opf_data_dict["id"] or get_uuid(), key=annotation_type_key
+    )
+    annotate_opf_data(store, resource, dataset, opf_data_dict, annotation_type_key)
+    return store
 
 
 def opf_to_stam_pipeline(
@@ -93,18 +232,135 @@ def opf_to_stam_pipeline(
     opf_yml_file_path: Path,
     resource_file_path: Path,
     annotation_type_key: AnnotationGroupEnum,
+    strict: bool = False,
+    layer_cache: Optional[LayerCache] = None,
+    standoff_dir: Optional[Path] = None,
+    deterministic_ids: bool = False,
 ):
-    opf_data_dict = load_opf_annotations_from_yaml(opf_yml_file_path)
-    """if there are no annotations in the opf file, return None"""
-    if not opf_data_dict["annotations"]:
-        return None
-    try:
-        opf_obj = create_opf_annotation_instance(opf_data_dict)
-    except CustomDataValidationError as e:
-        logging.error(f"pecha id: {pecha_id}, {e.message}")
-        raise CustomDataValidationError(f"pecha id: {pecha_id}, {e.message}")
-    opf_annotation_store = convert_opf_for_pre_stam_format(
-        opf_obj, annotation_type_key, resource_file_path
-    )
-    opf_stam = opf_annotation_store_to_stam(annotation_store=opf_annotation_store)
+    """
+    Convert an opf layer yml file to a stam annotation store.
+    strict=True goes through the pydantic opf models and the pre-stam annotation
+    store, otherwise the yml data is written straight into the stam store.
+    standoff_dir is only used by the latter, the strict path embeds the text.
+    With deterministic_ids, the ids that are not in the yml file are derived from
+    the pecha id, volume, layer and annotation index instead of new uuids, so
+    converting the same files again gives the same store.
+    """
+    layer_name = Path(opf_yml_file_path).name
+    id_parts = None
+    if deterministic_ids:
+        id_parts = get_layer_id_parts(pecha_id, resource_file_path, opf_yml_file_path)
+    with stage(
+        "opf_to_stam_pipeline", pecha_id=pecha_id, layer=layer_name, strict=strict
+    ) as current_stage:
+        opf_data_dict = load_opf_annotations_from_yaml(
+            opf_yml_file_path, layer_cache, id_parts
+        )
+        """if there are no annotations in the opf file, return None"""
+        if not opf_data_dict["annotations"]:
+            current_stage.count = 0
+            return None
+        try:
+            if not strict:
+                opf_stam = opf_data_to_stam(
+                    opf_data_dict,
+                    annotation_type_key,
+                    resource_file_path,
+                    standoff_dir,
+                    id_parts,
+                )
+                current_stage.count = opf_stam.annotations_len()
+                return opf_stam
+            """pydantic is only imported when the strict path is used"""
+            from stam_annotator.annotation_store import convert_opf_for_pre_stam_format
+            from stam_annotator.opf_loader import create_opf_annotation_instance
+
+            """spans past the end of the base text are rejected like in streaming"""
+            text_length = len(Path(resource_file_path).read_text(encoding="utf-8"))
+            opf_obj = create_opf_annotation_instance(opf_data_dict, text_length)
+        except CustomDataValidationError as e:
+            logger.error(f"pecha id: {pecha_id}, {e.message}")
+            raise e.with_context(f"pecha id: {pecha_id}")
+        opf_annotation_store = convert_opf_for_pre_stam_format(
+            opf_obj, annotation_type_key, resource_file_path, id_parts
+        )
+        opf_stam = opf_annotation_store_to_stam(annotation_store=opf_annotation_store)
+        current_stage.count = opf_stam.annotations_len()
     return opf_stam
+
+
+def opf_layers_to_stam(
+    pecha_id: str,
+    opf_yml_file_paths: List[Path],
+    resource_file_path: Path,
+    annotation_type_key: AnnotationGroupEnum,
+    layer_cache: Optional[LayerCache] = None,
+    standoff_dir: Optional[Path] = None,
+    deterministic_ids: bool = False,
+) -> Optional[AnnotationStore]:
+    """
+    Convert all the layers of a volume into a single stam annotation store.
+    The base text is added once and every layer is annotated straight into
+    the store, instead of one store per layer that are combined afterwards.
+    Like combine_stams, all the layers share the data set of the first layer.
+    With a standoff_dir, the base text file is referenced instead of embedded,
+    see create_base_resource.
+    For deterministic_ids, see opf_to_stam_pipeline.
+    Returns None if none of the layers has annotations.
+    """
+    store: Optional[AnnotationStore] = None
+    resource: Optional[TextResource] = None
+    dataset: Optional[AnnotationDataSet] = None
+    interner = AnnotationDataInterner()
+    with stage(
+        "opf_layers_to_stam", pecha_id=pecha_id, layers=len(opf_yml_file_paths)
+    ) as current_stage:
+        for opf_yml_file_path in opf_yml_file_paths:
+            layer_stage = stage(
+                "annotate_layer", pecha_id=pecha_id, layer=opf_yml_file_path.name
+            )
+            with layer_stage:
+                id_parts = None
+                if deterministic_ids:
+                    id_parts = get_layer_id_parts(
+                        pecha_id, resource_file_path, opf_yml_file_path
+                    )
+                opf_data_dict = load_opf_annotations_from_yaml(
+                    opf_yml_file_path, layer_cache, id_parts
+                )
+                """if there are no annotations in the opf file, skip it"""
+                if not opf_data_dict["annotations"]:
+                    continue
+                if store is None or resource is None or dataset is None:
+                    volume_id_parts = None
+                    if deterministic_ids:
+                        volume_id_parts = get_layer_id_parts(
+                            pecha_id, resource_file_path
+                        )
+                    store = create_annotationstore(
+                        id=get_new_id(volume_id_parts, "store"), workdir=standoff_dir
+                    )
+                    resource = create_base_resource(
+                        store, resource_file_path, standoff_dir
+                    )
+                    dataset = create_dataset(
+                        store=store,
+                        id=opf_data_dict["id"] or get_uuid(),
+                        key=annotation_type_key,
+                    )
+                try:
+                    validate_opf_data(opf_data_dict, text_length=resource.textlen())
+                except CustomDataValidationError as e:
+                    logger.error(f"pecha id: {pecha_id}, {e.message}")
+                    raise e.with_context(f"pecha id: {pecha_id}")
+                annotate_opf_data(
+                    store,
+                    resource,
+                    dataset,
+                    opf_data_dict,
+                    annotation_type_key,
+                    interner,
+                )
+                layer_stage.count = len(opf_data_dict["annotations"])
+        current_stage.count = store.annotations_len() if store is not None else 0
+    return store
@@ -0,0 +1,53 @@
+"""
+Checks of the normalized opf yml dicts that do not need the pydantic models,
+so the streaming converter can validate a layer without importing pydantic.
+"""
+from typing import Dict, List, Optional
+
+from stam_annotator.exceptions import CustomDataValidationError, InvalidSpanError
+
+
+def find_invalid_spans(
+    annotations: Dict[str, Dict], text_length: Optional[int] = None
+) -> List[str]:
+    """
+    Check the spans of a whole layer in a single pass and return the ids of
+    every annotation whose span is missing, not made of integers, negative,
+    reversed or past the end of the text. The spans that pass do not need to
+    be checked again, one Span model per annotation.
+    """
+    invalid_ids = []
+    for id_, value in annotations.items():
+        span = value.get("span") if isinstance(value, dict) else None
+        if not isinstance(span, dict):
+            invalid_ids.append(id_)
+            continue
+        start, end = span.get("start"), span.get("end")
+        """offsets are ints, bools and floats like 3.7 are rejected"""
+        if (
+            type(start) is not int
+            or type(end) is not int
+            or start < 0
+            or end < start
+            or (text_length is not None and end > text_length)
+        ):
+            invalid_ids.append(id_)
+    return invalid_ids
+
+
+def validate_opf_data(data: Dict, text_length: Optional[int] = None) -> None:
+    """
+    Run the same checks as create_opf_annotation_instance on the normalized
+    yml dict, without building a pydantic model for every annotation.
+    """
+    annotation_type, revision = data["annotation_type"], data["revision"]
+    if not isinstance(annotation_type, str) or not annotation_type.isalpha():
+        raise CustomDataValidationError("annotation_type must be alphabetic")
+    if not isinstance(revision, str) or not revision.isdigit():
+        raise CustomDataValidationError(
+            "revision must be parsable to an integer and consist only of digits"
+        )
+
+    invalid_ids = find_invalid_spans(data["annotations"] or {}, text_length)
+    if invalid_ids:
+        raise InvalidSpanError(invalid_ids, f"file name:{annotation_type}")
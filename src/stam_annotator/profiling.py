@@ -0,0 +1,159 @@
+"""
+cProfile of volume conversions, to find out why a pecha converts slowly.
+
+With a profile_dir, every volume conversion is run under cProfile and dumps
+
+    <profile_dir>/<pecha id>-<volume>.prof        the cProfile stats
+    <profile_dir>/<pecha id>-<volume>.prof.json   time and annotation counts
+                                                  of the volume and its layers
+
+in the process that converts it, so it works with the process pools.
+write_profile_report then aggregates all the .prof files below a folder into a
+report of the top hotspots by cumulative time, and of the slowest volumes and
+layers with their annotation counts. Volumes and layers that take more than
+SLOW_FACTOR times the median time per annotation are tagged as outliers.
+"""
+import cProfile
+import io
+import json
+import pstats
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from stam_annotator.instrumentation import MemorySink, add_sink, remove_sink
+
+PROFILE_SUFFIX = ".prof"
+PROFILE_DATA_SUFFIX = ".prof.json"
+PROFILE_REPORT_FILE_NAME = "profile_report.txt"
+"""stages that record the annotations of one layer"""
+LAYER_STAGES = ["annotate_layer", "opf_to_stam_pipeline"]
+SLOW_FACTOR = 2.0
+
+T = TypeVar("T")
+
+
+def get_volume_profile_path(profile_dir: Path, pecha_id: str, volume_name: str):
+    return Path(profile_dir) / f"{pecha_id}-{volume_name}{PROFILE_SUFFIX}"
+
+
+def profile_volume_conversion(
+    profile_path: Path,
+    pecha_id: str,
+    volume_name: str,
+    convert: Callable[[], T],
+    annotations_count: Callable[[T], int],
+) -> T:
+    """run convert under cProfile, dump its stats and the layer counts"""
+    profile_path.parent.mkdir(parents=True, exist_ok=True)
+    layer_sink = MemorySink()
+    add_sink(layer_sink)
+    profiler = cProfile.Profile()
+    start_time = time.perf_counter()
+    try:
+        result = profiler.runcall(convert)
+    finally:
+        seconds = time.perf_counter() - start_time
+        remove_sink(layer_sink)
+        profiler.dump_stats(str(profile_path))
+
+    layers = [
+        {
+            "layer": record.fields.get("layer"),
+            "seconds": record.seconds,
+            "annotations": record.item_count or 0,
+        }
+        for record in layer_sink.records
+        if record.stage in LAYER_STAGES
+    ]
+    profile_data = {
+        "pecha_id": pecha_id,
+        "volume_name": volume_name,
+        "seconds": seconds,
+        "annotations": annotations_count(result),
+        "layers": layers,
+    }
+    profile_data_path = profile_path.with_suffix(PROFILE_DATA_SUFFIX)
+    profile_data_path.write_text(json.dumps(profile_data, indent=4), encoding="utf-8")
+    return result
+
+
+def load_profile_data(profile_dir: Path) -> List[Dict]:
+    profile_data = []
+    for profile_data_path in sorted(Path(profile_dir).rglob(f"*{PROFILE_DATA_SUFFIX}")):
+        with open(profile_data_path, encoding="utf-8") as file:
+            profile_data.append(json.load(file))
+    return profile_data
+
+
+def tag_slow_items(items: List[Dict]) -> List[Dict]:
+    """
+    sort items by time, and tag those that take more than SLOW_FACTOR times the
+    median time per annotation as slow, those are outliers of the data
+    """
+    rates = [
+        item["seconds"] / item["annotations"] for item in items if item["annotations"]
+    ]
+    median_rate = statistics.median(rates) if rates else 0.0
+    tagged_items = []
+    for item in sorted(items, key=lambda item: item["seconds"], reverse=True):
+        rate = item["seconds"] / item["annotations"] if item["annotations"] else None
+        is_slow = rate is not None and rate > SLOW_FACTOR * median_rate
+        tagged_items.append({**item, "slow": is_slow})
+    return tagged_items
+
+
+def format_item_table(items: List[Dict], name_fields: List[str], top: int) -> str:
+    lines = [f"{'seconds':>10} {'annotations':>12} {'ms/annotation':>14}  name"]
+    for item in items[:top]:
+        rate = (
+            item["seconds"] * 1000 / item["annotations"] if item["annotations"] else 0
+        )
+        name = "/".join(str(item[field]) for field in name_fields)
+        tag = "  SLOW" if item["slow"] else ""
+        seconds, annotations = item["seconds"], item["annotations"]
+        lines.append(f"{seconds:>10.3f} {annotations:>12} {rate:>14.4f}  {name}{tag}")
+    return "\n".join(lines)
+
+
+def write_profile_report(
+    profile_dir: Path, top: int = 30, report_path: Optional[Path] = None
+) -> Optional[Path]:
+    """
+    aggregate the volume profiles below profile_dir into a text report, sorted
+    by cumulative time across the volumes. Returns the report path, or None if
+    there are no profiles.
+    """
+    profile_dir = Path(profile_dir)
+    profile_paths = sorted(profile_dir.rglob(f"*{PROFILE_SUFFIX}"))
+    if not profile_paths:
+        return None
+
+    stats_stream = io.StringIO()
+    stats = pstats.Stats(*[str(path) for path in profile_paths], stream=stats_stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+
+    volumes = load_profile_data(profile_dir)
+    layers = [
+        {"pecha_id": volume["pecha_id"], "volume_name": volume["volume_name"], **layer}
+        for volume in volumes
+        for layer in volume["layers"]
+    ]
+    report = "\n\n".join(
+        [
+            f"slowest volumes of {len(volumes)}",
+            format_item_table(
+                tag_slow_items(volumes), ["pecha_id", "volume_name"], top
+            ),
+            f"slowest layers of {len(layers)}",
+            format_item_table(
+                tag_slow_items(layers), ["pecha_id", "volume_name", "layer"], top
+            ),
+            f"top {top} functions by cumulative time of {len(profile_paths)} volumes",
+            stats_stream.getvalue(),
+        ]
+    )
+    report_path = Path(report_path or profile_dir / PROFILE_REPORT_FILE_NAME)
+    report_path.write_text(report, encoding="utf-8")
+    return report_path
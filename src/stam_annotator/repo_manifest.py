@@ -0,0 +1,65 @@
+import os
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+LAYERS_DIR = "layers"
+
+
+class RepoManifest:
+    """
+    Index of a cloned pecha or alignment repo, built with a single walk
+    over the repo. Maps every folder to its files and sub folders, volume
+    names to their base text file and volume names to their layer files.
+    """
+
+    folder_structure: Dict[Path, List[Tuple[str, str]]]
+    base_files: Dict[str, Path]
+    layer_files: Dict[str, List[Path]]
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self.folder_structure = {}
+        self.base_files = {}
+        self.layer_files = {}
+
+    @classmethod
+    def from_path(cls, root: Union[str, Path]) -> "RepoManifest":
+        manifest = cls(root)
+        manifest.build()
+        return manifest
+
+    def build(self):
+        """
+        os.walk takes the file/folder tag from the directory entry, no stat per file.
+        Folders and files are sorted, the order of a directory listing depends on
+        the file system and sets the order the layers are converted in.
+        """
+        for dir_path, dir_names, file_names in os.walk(self.root):
+            if ".git" in dir_names:
+                dir_names.remove(".git")
+            # sorted in place, so os.walk also descends in this order
+            dir_names.sort()
+            file_names.sort()
+            parent_dir = Path(dir_path)
+            documents = [(name, "folder") for name in dir_names] + [
+                (name, "file") for name in file_names
+            ]
+            if documents:
+                self.folder_structure[parent_dir] = documents
+
+            is_volume_dir = parent_dir.parent.name == LAYERS_DIR
+            for file_name in file_names:
+                if file_name.endswith(".txt"):
+                    self.base_files.setdefault(file_name[:-4], parent_dir / file_name)
+                elif is_volume_dir and file_name.endswith(".yml"):
+                    self.layer_files.setdefault(parent_dir.name, []).append(
+                        parent_dir / file_name
+                    )
+
+    def get_base_file(self, volume_name: str) -> Path:
+        try:
+            return self.base_files[volume_name]
+        except KeyError:
+            raise FileNotFoundError(
+                f"Base text {volume_name}.txt not found in {self.root}"
+            )
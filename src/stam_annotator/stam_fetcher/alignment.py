@@ -1,10 +1,17 @@
 import json
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from stam_annotator.config import PECHAS_PATH
 from stam_annotator.exceptions import RepoCloneError, RepoDoesNotExist
+from stam_annotator.instrumentation import stage
+from stam_annotator.stam_fetcher.mirror_cache import MirrorCache
 from stam_annotator.stam_fetcher.pecha import Pecha
+from stam_annotator.stam_fetcher.segment_cache import (
+    SegmentCache,
+    get_files_fingerprint,
+    write_segment_cache,
+)
 from stam_annotator.stam_fetcher.utility import check_repo_exists, clone_repo
 
 ORGANIZATION = "PechaData"
@@ -14,26 +21,55 @@ class Alignment:
     segment_source: Dict[str, Dict[str, str]]
     segment_pairs: Dict[str, Dict[str, str]]
 
-    def __init__(self, id_: str, github_token: str, base_path: Path):
+    def __init__(
+        self,
+        id_: str,
+        github_token: str,
+        base_path: Path,
+        mirror_cache: Optional[MirrorCache] = None,
+        use_segment_cache: bool = False,
+        pechas_path: Path = PECHAS_PATH,
+    ):
+        """
+        The source pechas are loaded from pechas_path.
+        With use_segment_cache, the segment pairs are materialized once in a
+        segment cache file next to alignment.json and read from there, without
+        loading the volumes of the pechas.
+        """
         self.id_ = id_
         self.github_token = github_token
         self.base_path = base_path
+        self.mirror_cache = mirror_cache
+        self.use_segment_cache = use_segment_cache
+        self.pechas_path = pechas_path
         self.pechas: Dict = {}
+        self.segment_cache: Optional[SegmentCache] = None
         self.load_alignment()
 
     @property
     def alignment_fn(self):
         return str(self.base_path / f"{self.id_}.opa" / "alignment.json")
 
-    def load_alignment(self):
-        with open(self.alignment_fn, encoding="utf-8") as file:
-            data = json.load(file)
-        self.segment_source = data["segment_sources"]
-        self.segment_pairs = data["segment_pairs"]
+    @property
+    def segment_cache_fn(self):
+        return self.base_path / f"{self.id_}.opa" / "alignment.segments.bin"
 
-        # load pechas
-        for id_ in self.segment_source.keys():
-            self.pechas[id_] = Pecha.from_id(id_, self.github_token)
+    def load_alignment(self):
+        with stage("load_alignment", alignment_id=self.id_) as current_stage:
+            with open(self.alignment_fn, encoding="utf-8") as file:
+                data = json.load(file)
+            self.segment_source = data["segment_sources"]
+            self.segment_pairs = data["segment_pairs"]
+
+            # load pechas
+            for id_ in self.segment_source.keys():
+                self.pechas[id_] = Pecha.from_id(
+                    id_,
+                    self.github_token,
+                    out_path=self.pechas_path,
+                    mirror_cache=self.mirror_cache,
+                )
+            current_stage.count = len(self.segment_pairs)
 
     def get_meta_data(self):
         for file_path in self.base_path.rglob("meta.json"):
@@ -41,7 +77,41 @@ class Alignment:
                 return json.load(file)
         return {}
 
+    def get_segment_cache_fingerprint(self) -> List:
+        """alignment.json and the volume files of the source pechas"""
+        file_paths = [self.alignment_fn]
+        for pecha_id, source in self.segment_source.items():
+            volume_files = self.pechas[pecha_id].pecha_volumes.volume_files
+            if source["base"] in volume_files:
+                file_paths.append(volume_files[source["base"]])
+        return get_files_fingerprint(file_paths)
+
+    def get_segment_cache(self) -> SegmentCache:
+        """open the segment cache, (re)building it if missing or out of date"""
+        if self.segment_cache is not None:
+            return self.segment_cache
+        fingerprint = self.get_segment_cache_fingerprint()
+        segment_cache = SegmentCache.open_if_valid(self.segment_cache_fn, fingerprint)
+        if segment_cache is None:
+            with stage("build_segment_cache", alignment_id=self.id_) as current_stage:
+                write_segment_cache(
+                    self.segment_cache_fn,
+                    ((id_, self.get_segment_pair(id_)) for id_ in self.segment_pairs),
+                    fingerprint,
+                )
+                segment_cache = SegmentCache(self.segment_cache_fn)
+                current_stage.count = len(segment_cache)
+            """the pairs are read from the cache now, not from the volumes"""
+            for pecha in self.pechas.values():
+                if pecha is not None:
+                    pecha.pecha_volumes.clear()
+        self.segment_cache = segment_cache
+        return segment_cache
+
     def get_segment_pairs(self):
+        if self.use_segment_cache:
+            yield from self.get_segment_cache().get_segment_pairs()
+            return
         for id_ in self.segment_pairs:
             yield self.get_segment_pair(id_)
 
@@ -57,16 +127,29 @@ class Alignment:
         return segment_pair
 
     @classmethod
-    def from_id(cls, id_: str, github_token: str, out_path: Path = PECHAS_PATH):
-        """load if alignment exits"""
-        if not (out_path / f"{id_}").exists():
+    def from_id(
+        cls,
+        id_: str,
+        github_token: str,
+        out_path: Path = PECHAS_PATH,
+        mirror_cache: Optional[MirrorCache] = None,
+        use_segment_cache: bool = False,
+    ):
+        """
+        load if alignment exits.
+        With a mirror_cache, the alignment and its pechas are also updated
+        following the refresh policy of the cache.
+        """
+        if mirror_cache is not None or not (out_path / f"{id_}").exists():
             try:
-                check_repo_exists(github_token, ORGANIZATION, repo_name=id_)
+                if mirror_cache is None:
+                    check_repo_exists(github_token, ORGANIZATION, repo_name=id_)
                 clone_repo(
                     ORGANIZATION,
                     id_,
                     github_token,
                     destination_folder=out_path / f"{id_}",
+                    mirror_cache=mirror_cache,
                 )
             except RepoDoesNotExist as error:
                 print(f"Alignment {error.message}")
@@ -76,7 +159,14 @@ class Alignment:
                 return None
 
         cls.base_path = out_path / f"{id_}"
-        return cls(id_, github_token, cls.base_path)
+        return cls(
+            id_,
+            github_token,
+            cls.base_path,
+            mirror_cache=mirror_cache,
+            use_segment_cache=use_segment_cache,
+            pechas_path=out_path,
+        )
 
 
 if __name__ == "__main__":
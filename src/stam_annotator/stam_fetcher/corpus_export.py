@@ -0,0 +1,223 @@
+import json
+import shutil
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from stam_annotator.config import PECHAS_PATH
+from stam_annotator.stam_fetcher.alignment import Alignment
+
+EXPORT_FORMATS = ["jsonl", "tsv"]
+DEFAULT_LANGS = ("bo", "en")
+
+"""the alignment last loaded in a worker process and its segment ids, reused
+across the segment ranges of that alignment the worker exports"""
+_worker_alignment: Optional[Tuple[Tuple[str, str], Alignment, List[str]]] = None
+
+
+def get_alignment(
+    alignment_id: str,
+    github_token: str,
+    out_path: Path = PECHAS_PATH,
+    use_segment_cache: bool = False,
+) -> Tuple[Alignment, List[str]]:
+    """a worker keeps one alignment, the previous one is dropped with its volumes"""
+    global _worker_alignment
+    key = (alignment_id, str(out_path))
+    if _worker_alignment is None or _worker_alignment[0] != key:
+        _worker_alignment = None
+        alignment = Alignment(
+            alignment_id,
+            github_token,
+            out_path / alignment_id,
+            use_segment_cache=use_segment_cache,
+            pechas_path=out_path,
+        )
+        _worker_alignment = (key, alignment, list(alignment.segment_pairs))
+    return _worker_alignment[1], _worker_alignment[2]
+
+
+def iter_alignments(
+    alignment_ids: Sequence[str],
+    github_token: str,
+    out_path: Path = PECHAS_PATH,
+    use_segment_cache: bool = False,
+) -> Iterator[Alignment]:
+    """
+    load (and fetch if needed) the alignments one at a time, an alignment is
+    only referenced here until the next one is loaded
+    """
+    for alignment_id in alignment_ids:
+        alignment = Alignment.from_id(
+            alignment_id, github_token, out_path, use_segment_cache=use_segment_cache
+        )
+        if alignment is None:
+            continue
+        if use_segment_cache:
+            alignment.get_segment_cache()
+        yield alignment
+
+
+def iter_parallel_segments(
+    alignment: Alignment,
+    segment_ids: Sequence[str],
+    langs: Sequence[str] = DEFAULT_LANGS,
+) -> Iterator[Dict]:
+    """
+    yield a record per segment pair with a text for every one of langs,
+    pairs missing one of the languages are skipped
+    """
+    for segment_id in segment_ids:
+        if alignment.use_segment_cache:
+            segment_pair = alignment.get_segment_cache().get_segment_pair(segment_id)
+        else:
+            segment_pair = alignment.get_segment_pair(segment_id)
+        texts = {lang: text for text, lang, _ in segment_pair}
+        if not all(lang in texts for lang in langs):
+            continue
+        record = {"alignment_id": alignment.id_, "segment_id": segment_id}
+        record.update((lang, texts[lang]) for lang in langs)
+        yield record
+
+
+def write_parallel_segment(
+    file: TextIO, record: Dict, langs: Sequence[str], export_format: str
+):
+    if export_format == "jsonl":
+        file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return
+    """tabs and newlines inside a segment would break the tsv rows"""
+    texts = [" ".join(record[lang].split()) for lang in langs]
+    file.write("\t".join(texts) + "\n")
+
+
+def export_segment_range(
+    alignment_id: str,
+    github_token: str,
+    out_path: Path,
+    start: int,
+    end: int,
+    langs: Sequence[str],
+    export_format: str,
+    part_file_path: Path,
+    use_segment_cache: bool = False,
+) -> int:
+    """write the segment pairs [start, end) of an alignment to a part file"""
+    alignment, segment_ids = get_alignment(
+        alignment_id, github_token, out_path, use_segment_cache
+    )
+    segment_ids = segment_ids[start:end]
+    count = 0
+    with open(part_file_path, "w", encoding="utf-8") as file:
+        for record in iter_parallel_segments(alignment, segment_ids, langs):
+            write_parallel_segment(file, record, langs, export_format)
+            count += 1
+    return count
+
+
+def export_parallel_corpus(
+    alignment_ids: Sequence[str],
+    github_token: str,
+    output_file_path: Path,
+    langs: Sequence[str] = DEFAULT_LANGS,
+    export_format: Optional[str] = None,
+    workers: int = 1,
+    chunk_size: int = 10000,
+    out_path: Path = PECHAS_PATH,
+    use_segment_cache: bool = False,
+) -> int:
+    """
+    Stream the aligned segment pairs of alignments to a jsonl or tsv file
+    (taken from the file suffix if export_format is not given), returns the
+    number of pairs written.
+
+    With workers > 1, the segment ids of every alignment are split in ranges of
+    chunk_size that are exported to part files by a process pool, the part files
+    are then appended to the output in order.
+    Every process holds a single alignment at a time, with the volumes of its
+    pechas it reads, so memory use grows with the largest alignment and not with
+    the number of alignments. The records are written as they are read.
+    """
+    output_file_path = Path(output_file_path)
+    export_format = export_format or output_file_path.suffix.lstrip(".")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"export format should be one of {EXPORT_FORMATS}")
+
+    if workers <= 1:
+        count = 0
+        with open(output_file_path, "w", encoding="utf-8") as file:
+            for alignment in iter_alignments(
+                alignment_ids, github_token, out_path, use_segment_cache
+            ):
+                segment_ids = list(alignment.segment_pairs)
+                for record in iter_parallel_segments(alignment, segment_ids, langs):
+                    write_parallel_segment(file, record, langs, export_format)
+                    count += 1
+        return count
+
+    """fetch the alignments and build their segment caches before any worker"""
+    segment_counts = [
+        (alignment.id_, len(alignment.segment_pairs))
+        for alignment in iter_alignments(
+            alignment_ids, github_token, out_path, use_segment_cache
+        )
+    ]
+
+    part_dir = Path(tempfile.mkdtemp(dir=output_file_path.parent))
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures: List[Tuple[Future, Path]] = []
+            for alignment_id, segments_count in segment_counts:
+                for start in range(0, segments_count, chunk_size):
+                    part_file_path = part_dir / f"{len(futures):08d}.part"
+                    future = executor.submit(
+                        export_segment_range,
+                        alignment_id,
+                        github_token,
+                        out_path,
+                        start,
+                        start + chunk_size,
+                        langs,
+                        export_format,
+                        part_file_path,
+                        use_segment_cache,
+                    )
+                    futures.append((future, part_file_path))
+
+            count = 0
+            with open(output_file_path, "w", encoding="utf-8") as file:
+                for future, part_file_path in futures:
+                    count += future.result()
+                    with open(part_file_path, encoding="utf-8") as part_file:
+                        shutil.copyfileobj(part_file, file)
+                    part_file_path.unlink()
+        return count
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from stam_annotator.github_token import GITHUB_TOKEN
+
+    parser = argparse.ArgumentParser(description="export aligned segment pairs")
+    parser.add_argument("alignments", nargs="+", help="alignment ids")
+    parser.add_argument("--output", type=Path, required=True, help=".jsonl or .tsv")
+    parser.add_argument("--langs", nargs="+", default=list(DEFAULT_LANGS))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--use-segment-cache", action="store_true")
+    args = parser.parse_args()
+
+    pairs_count = export_parallel_corpus(
+        args.alignments,
+        GITHUB_TOKEN,
+        args.output,
+        langs=args.langs,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        use_segment_cache=args.use_segment_cache,
+    )
+    print(f"{pairs_count} segment pairs written to {args.output}")
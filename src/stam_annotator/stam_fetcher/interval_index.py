@@ -0,0 +1,125 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterator, List, Sequence
+
+from stam import AnnotationStore
+
+"""subtrees at or below this level are scanned linearly"""
+LINEAR_SCAN_LEVEL = 3
+
+
+class IntervalIndex:
+    """
+    Sorted interval index of the annotation offsets of a volume.
+
+    Offsets are kept in compact int arrays sorted by begin, laid out as an
+    implicit augmented binary tree (as in cgranges): every node also stores the
+    max end of its subtree, so overlap queries run in O(log n + k).
+    Ranges are half open [start, end); a zero length annotation at p overlaps
+    [start, end) if start <= p < end.
+    """
+
+    def __init__(
+        self, annotation_ids: Sequence[str], begins: Sequence[int], ends: Sequence[int]
+    ):
+        order = sorted(range(len(annotation_ids)), key=lambda i: (begins[i], ends[i]))
+        self.annotation_ids = [annotation_ids[i] for i in order]
+        self.begins = array("q", (begins[i] for i in order))
+        self.ends = array("q", (ends[i] for i in order))
+        self.max_ends = array("q", self.ends)
+        self.max_level = self.build()
+
+    @classmethod
+    def from_store(cls, store: AnnotationStore) -> "IntervalIndex":
+        """annotations without an id or a text offset can not be indexed"""
+        annotation_ids: List[str] = []
+        begins: List[int] = []
+        ends: List[int] = []
+        for annotation in store.annotations():
+            id_, offset = annotation.id(), annotation.offset()
+            if id_ is None or offset is None:
+                continue
+            annotation_ids.append(id_)
+            begins.append(offset.begin().value())
+            ends.append(offset.end().value())
+        return cls(annotation_ids, begins, ends)
+
+    def __len__(self) -> int:
+        return len(self.annotation_ids)
+
+    def build(self) -> int:
+        """fill the max end of every subtree, returns the level of the root"""
+        n, ends, max_ends = len(self), self.ends, self.max_ends
+        if n == 0:
+            return -1
+        last_i, last = 0, 0
+        for i in range(0, n, 2):
+            last_i, last = i, ends[i]
+        k = 1
+        while 1 << k <= n:
+            x = 1 << (k - 1)
+            for i in range((x << 1) - 1, n, x << 2):
+                right_max = max_ends[i + x] if i + x < n else last
+                max_ends[i] = max(ends[i], max_ends[i - x], right_max)
+            last_i = last_i - x if last_i >> k & 1 else last_i + x
+            if last_i < n and max_ends[last_i] > last:
+                last = max_ends[last_i]
+            k += 1
+        return k - 1
+
+    def overlaps(self, i: int, start: int, end: int) -> bool:
+        begin_i, end_i = self.begins[i], self.ends[i]
+        if begin_i == end_i:
+            return start <= begin_i < end
+        return begin_i < end and end_i > start
+
+    def iter_overlapping(self, start: int, end: int) -> Iterator[int]:
+        """positions of the intervals overlapping [start, end), in O(log n + k)"""
+        n, begins, max_ends = len(self), self.begins, self.max_ends
+        if n == 0:
+            return
+        stack = [(self.max_level, (1 << self.max_level) - 1, False)]
+        while stack:
+            k, x, left_done = stack.pop()
+            if k <= LINEAR_SCAN_LEVEL:
+                i0 = x >> k << k
+                for i in range(i0, min(i0 + (1 << (k + 1)) - 1, n)):
+                    if begins[i] >= end:
+                        break
+                    if self.overlaps(i, start, end):
+                        yield i
+            elif not left_done:
+                y = x - (1 << (k - 1))
+                stack.append((k, x, True))
+                if y >= n or max_ends[y] >= start:
+                    stack.append((k - 1, y, False))
+            elif x < n and begins[x] < end:
+                if self.overlaps(x, start, end):
+                    yield x
+                stack.append((k - 1, x + (1 << (k - 1)), False))
+
+    def point(self, offset: int) -> List[str]:
+        """ids of the annotations covering the character at offset"""
+        return self.overlapping(offset, offset + 1)
+
+    def overlapping(self, start: int, end: int) -> List[str]:
+        """ids of the annotations overlapping [start, end)"""
+        return [
+            self.annotation_ids[i] for i in sorted(self.iter_overlapping(start, end))
+        ]
+
+    def containing(self, start: int, end: int) -> List[str]:
+        """ids of the annotations that contain the whole [start, end)"""
+        return [
+            self.annotation_ids[i]
+            for i in sorted(self.iter_overlapping(start, end))
+            if self.begins[i] <= start and self.ends[i] >= end
+        ]
+
+    def contained(self, start: int, end: int) -> List[str]:
+        """ids of the annotations that lie within [start, end)"""
+        first = bisect_left(self.begins, start)
+        last = bisect_left(self.begins, end)
+        return [
+            self.annotation_ids[i] for i in range(first, last) if self.ends[i] <= end
+        ]
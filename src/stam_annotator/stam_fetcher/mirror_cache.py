@@ -0,0 +1,135 @@
+import subprocess
+import time
+from enum import Enum
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+from stam_annotator.config import MIRRORS_PATH
+from stam_annotator.exceptions import RepoCloneError
+
+GITHUB_URL_TEMPLATE = "https://{token}@github.com/{org}/{repo_name}.git"
+
+"""non cone sparse checkout patterns: layers, base text and the top level files"""
+PECHA_SPARSE_PATTERNS = [
+    "/*",
+    "!/*/",
+    "/*.opf/*",
+    "!/*.opf/*/",
+    "/*.opf/layers/",
+    "/*.opf/base/",
+]
+
+
+class RefreshPolicy(Enum):
+    always = "always"  # fetch the mirror every time it is used
+    if_stale = "if_stale"  # fetch if the last fetch is older than max_age
+    never = "never"  # only fetch when the mirror does not exist yet
+
+
+class MirrorCache:
+    """
+    Local cache of bare mirrors of github repos. A repo is cloned once as a
+    mirror and then only fetched incrementally, following the refresh policy.
+    Working trees are shallow (and optionally sparse) clones of the mirror.
+    """
+
+    def __init__(
+        self,
+        cache_path: Union[str, Path] = MIRRORS_PATH,
+        refresh: RefreshPolicy = RefreshPolicy.if_stale,
+        max_age: float = 3600,
+        url_template: str = GITHUB_URL_TEMPLATE,
+    ):
+        self.cache_path = Path(cache_path)
+        self.refresh = refresh
+        self.max_age = max_age
+        self.url_template = url_template
+
+    def get_mirror_path(self, org: str, repo_name: str) -> Path:
+        return self.cache_path / org / f"{repo_name}.git"
+
+    def get_repo_url(self, org: str, repo_name: str, token: str) -> str:
+        return self.url_template.format(token=token, org=org, repo_name=repo_name)
+
+    def is_stale(self, mirror_path: Path) -> bool:
+        if self.refresh == RefreshPolicy.always:
+            return True
+        if self.refresh == RefreshPolicy.never:
+            return False
+        fetched_at_file = mirror_path / "FETCHED_AT"
+        if not fetched_at_file.exists():
+            return True
+        return time.time() - fetched_at_file.stat().st_mtime > self.max_age
+
+    def update_mirror(self, org: str, repo_name: str, token: str) -> Path:
+        """clone the mirror if it is missing, else fetch it if it is stale"""
+        mirror_path = self.get_mirror_path(org, repo_name)
+        try:
+            if not mirror_path.exists():
+                mirror_path.parent.mkdir(parents=True, exist_ok=True)
+                repo_url = self.get_repo_url(org, repo_name, token)
+                run_git(["clone", "--mirror", repo_url, str(mirror_path)])
+            elif self.is_stale(mirror_path):
+                run_git(["remote", "update", "--prune"], cwd=mirror_path)
+            else:
+                return mirror_path
+        except subprocess.CalledProcessError as e:
+            raise RepoCloneError(org, repo_name, e)
+        (mirror_path / "FETCHED_AT").touch()
+        return mirror_path
+
+    def checkout(
+        self,
+        org: str,
+        repo_name: str,
+        token: str,
+        destination_folder: Path,
+        sparse_patterns: Optional[Sequence[str]] = None,
+    ) -> Path:
+        """
+        Create or update a shallow working tree of the repo from its mirror.
+        With sparse_patterns, only the matching paths are checked out.
+        An existing working tree, for instance a clone made without the cache,
+        is pointed at the mirror and made sparse before it is updated.
+        """
+        mirror_path = self.update_mirror(org, repo_name, token)
+        mirror_uri = mirror_path.resolve().as_uri()
+        destination_folder = Path(destination_folder)
+        try:
+            if not (destination_folder / ".git").exists():
+                run_git(
+                    [
+                        "clone",
+                        "--depth",
+                        "1",
+                        "--no-checkout",
+                        mirror_uri,
+                        str(destination_folder),
+                    ]
+                )
+                if sparse_patterns:
+                    run_git(
+                        ["sparse-checkout", "set", "--no-cone", *sparse_patterns],
+                        cwd=destination_folder,
+                    )
+                run_git(["checkout"], cwd=destination_folder)
+            else:
+                run_git(
+                    ["remote", "set-url", "origin", mirror_uri], cwd=destination_folder
+                )
+                if sparse_patterns:
+                    run_git(
+                        ["sparse-checkout", "set", "--no-cone", *sparse_patterns],
+                        cwd=destination_folder,
+                    )
+                run_git(
+                    ["fetch", "--depth", "1", "origin", "HEAD"], cwd=destination_folder
+                )
+                run_git(["reset", "--hard", "FETCH_HEAD"], cwd=destination_folder)
+        except subprocess.CalledProcessError as e:
+            raise RepoCloneError(org, repo_name, e)
+        return destination_folder
+
+
+def run_git(args: List[str], cwd: Optional[Path] = None):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
@@ -1,22 +1,54 @@
 import json
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from stam import Annotation, AnnotationStore
 
 from stam_annotator.config import PECHAS_PATH, AnnotationEnum, AnnotationGroupEnum
 from stam_annotator.exceptions import RepoCloneError, RepoDoesNotExist
+from stam_annotator.instrumentation import stage
+from stam_annotator.stam_fetcher.interval_index import IntervalIndex
+from stam_annotator.stam_fetcher.mirror_cache import PECHA_SPARSE_PATTERNS, MirrorCache
 from stam_annotator.stam_fetcher.utility import check_repo_exists, clone_repo
-from stam_annotator.utility import get_enum_value_if_match_ignore_case
+from stam_annotator.stam_fetcher.volume_cache import VolumeCache
+from stam_annotator.utility import (
+    get_binary_stam_file_path,
+    get_enum_value_if_match_ignore_case,
+    save_jsonl_file,
+)
 
 ORGANIZATION = "PechaData"
 
 
+def get_newest_stam_file(json_file: Path) -> Path:
+    binary_file = get_binary_stam_file_path(json_file)
+    if (
+        binary_file.exists()
+        and binary_file.stat().st_mtime_ns >= json_file.stat().st_mtime_ns
+    ):
+        return binary_file
+    return json_file
+
+
 class Pecha:
-    def __init__(self, id_: str, base_path: Path):
+    def __init__(
+        self,
+        id_: str,
+        base_path: Path,
+        max_volumes: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        """
+        Volumes are loaded on first access and kept in a LRU cache,
+        bounded by max_volumes and/or max_bytes of volume json files.
+        """
         self.id_ = id_
         self.base_path = base_path
-        self.pecha_volumes: Dict[str, AnnotationStore] = {}
+        self.max_volumes = max_volumes
+        self.max_bytes = max_bytes
+        self.pecha_volumes: VolumeCache = VolumeCache({})
+        """interval indexes of the cached volumes, evicted with their volume"""
+        self.interval_indexes: Dict[str, IntervalIndex] = {}
         self.load_pecha()
 
     @property
@@ -24,23 +56,55 @@ class Pecha:
         return self.base_path / f"{self.id_}.opf" / "layers"
 
     def load_pecha(self):
-        json_files = list(self.pecha_fn.glob("**/*.opf.json"))
-        for json_file in json_files:
-            index = json_file.name.index(".opf.json")
-            volumen_name = json_file.name[:index]
-            self.pecha_volumes[volumen_name] = AnnotationStore(file=str(json_file))
+        """
+        A volume is loaded from its cbor copy when there is one that is not
+        older than the json file, as cbor loads faster.
+        """
+        volume_files = {}
+        with stage("load_pecha", pecha_id=self.id_) as current_stage:
+            json_files = list(self.pecha_fn.glob("**/*.opf.json"))
+            for json_file in json_files:
+                index = json_file.name.index(".opf.json")
+                volumen_name = json_file.name[:index]
+                volume_files[volumen_name] = get_newest_stam_file(json_file)
+            current_stage.count = len(volume_files)
+        self.pecha_volumes = VolumeCache(
+            volume_files,
+            max_volumes=self.max_volumes,
+            max_bytes=self.max_bytes,
+            on_evict=self.drop_interval_index,
+        )
+        self.interval_indexes = {}
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        return self.pecha_volumes.get_stats()
 
     @classmethod
-    def from_id(cls, id_: str, github_token: str, out_path: Path = PECHAS_PATH):
-        """Check if repo exists in github"""
-        if not (out_path / f"{id_}").exists():
+    def from_id(
+        cls,
+        id_: str,
+        github_token: str,
+        out_path: Path = PECHAS_PATH,
+        max_volumes: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        mirror_cache: Optional[MirrorCache] = None,
+    ):
+        """
+        Check if repo exists in github.
+        With a mirror_cache, an existing clone is also updated following the
+        refresh policy of the cache, and only layers and base text are checked out.
+        """
+        if mirror_cache is not None or not (out_path / f"{id_}").exists():
             try:
-                check_repo_exists(github_token, ORGANIZATION, repo_name=id_)
+                if mirror_cache is None:
+                    check_repo_exists(github_token, ORGANIZATION, repo_name=id_)
                 clone_repo(
                     ORGANIZATION,
                     id_,
                     github_token,
                     destination_folder=out_path / f"{id_}",
+                    mirror_cache=mirror_cache,
+                    sparse_patterns=PECHA_SPARSE_PATTERNS,
                 )
             except RepoDoesNotExist as error:
                 print(f"Pecha {error.message}")
@@ -50,7 +114,7 @@ class Pecha:
                 return None
 
         cls.base_path = out_path / f"{id_}"
-        return cls(id_, cls.base_path)
+        return cls(id_, cls.base_path, max_volumes=max_volumes, max_bytes=max_bytes)
 
     def get_meta_data(self):
         for file_path in self.base_path.rglob("meta.json"):
@@ -78,11 +142,48 @@ class Pecha:
         annotation_span = self.get_span_from_annotation(annotation)
         return (annotation_text, annotation_span)
 
+    def get_interval_index(self, volume_name: str) -> IntervalIndex:
+        """
+        Interval index of the annotation offsets of a volume. It is built on first
+        use and reused across queries, until the volume is evicted from the cache.
+        """
+        stam_volume = self.pecha_volumes[volume_name]
+        interval_index = self.interval_indexes.get(volume_name)
+        if interval_index is None:
+            interval_index = IntervalIndex.from_store(stam_volume)
+            self.interval_indexes[volume_name] = interval_index
+        return interval_index
+
+    def drop_interval_index(self, volume_name: str):
+        self.interval_indexes.pop(volume_name, None)
+
+    def get_annotations_at(self, offset: int, volume_name: str) -> List[str]:
+        """ids of the annotations covering the character at offset"""
+        return self.get_interval_index(volume_name).point(offset)
+
+    def get_overlapping_annotations(
+        self, start: int, end: int, volume_name: str
+    ) -> List[str]:
+        """ids of the annotations overlapping the range [start, end)"""
+        return self.get_interval_index(volume_name).overlapping(start, end)
+
+    def get_containing_annotations(
+        self, start: int, end: int, volume_name: str
+    ) -> List[str]:
+        """ids of the annotations that contain the whole range [start, end)"""
+        return self.get_interval_index(volume_name).containing(start, end)
+
+    def get_contained_annotations(
+        self, start: int, end: int, volume_name: str
+    ) -> List[str]:
+        """ids of the annotations that lie within the range [start, end)"""
+        return self.get_interval_index(volume_name).contained(start, end)
+
     def get_pecha_volume_names(self) -> List:
         return list(self.pecha_volumes.keys())
 
-    def format_annotations_as_dict(self, annotations) -> Dict:
-        annotations_dict = {}
+    def iter_formatted_annotations(self, annotations) -> Iterator[Tuple[str, Dict]]:
+        """yield (annotation id, annotation content) one annotation at a time"""
         for annotation in annotations:
             """get annotation text, key and type"""
             annotation_content = {}
@@ -98,20 +199,66 @@ class Pecha:
                 else:
                     annotation_payloads[key] = value
 
-            """save annotation data in a dict with annotation id """
             annotation_content["text"] = str(annotation)
             annotation_content["span"] = self.get_span_from_annotation(annotation)
             if annotation_payloads:
                 annotation_content["payloads"] = annotation_payloads
-            annotations_dict[annotation.id()] = annotation_content
-        return annotations_dict
+            yield annotation.id(), annotation_content
 
-    def get_annotations(self) -> Optional[Dict]:
-        annotations = {}
+    def format_annotations_as_dict(self, annotations) -> Dict:
+        """save annotation data in a dict with annotation id"""
+        return dict(self.iter_formatted_annotations(annotations))
+
+    def iter_volumes(self) -> Iterator[Tuple[str, AnnotationStore]]:
+        """
+        yield (volume name, volume) one volume at a time. A volume that was not
+        in the cache before is dropped from it once the caller is done with it,
+        so a pass over the pecha holds a single volume whatever max_volumes is.
+        """
         for volume_name in self.get_pecha_volume_names():
-            stam_annotations = self.pecha_volumes[volume_name].annotations()
-            volume_annotations = self.format_annotations_as_dict(stam_annotations)
-            annotations[volume_name] = volume_annotations
+            was_loaded = volume_name in self.pecha_volumes.loaded_volumes
+            try:
+                yield volume_name, self.pecha_volumes[volume_name]
+            finally:
+                if not was_loaded:
+                    self.pecha_volumes.discard(volume_name)
+
+    def iter_annotations(self) -> Iterator[Tuple[str, str, Dict]]:
+        """yield (volume name, annotation id, annotation content) volume by volume"""
+        for volume_name, stam_volume in self.iter_volumes():
+            stam_annotations = stam_volume.annotations()
+            for id_, content in self.iter_formatted_annotations(stam_annotations):
+                yield volume_name, id_, content
+
+    def iter_filtered_annotations(
+        self,
+        annotation_group: AnnotationGroupEnum,
+        annotation_type: AnnotationEnum,
+    ) -> Iterator[Tuple[str, str, Dict]]:
+        """yield (volume name, annotation id, annotation content) volume by volume"""
+        for volume_name, stam_volume in self.iter_volumes():
+            stam_dataset = next(stam_volume.datasets())
+            stam_key = stam_dataset.key(annotation_group.value)
+            stam_annotations = stam_volume.annotations(
+                filter=stam_key, value=annotation_type.value
+            )
+            for id_, content in self.iter_formatted_annotations(stam_annotations):
+                yield volume_name, id_, content
+
+    @staticmethod
+    def group_annotations_by_volume(
+        annotations: Iterable[Tuple[str, str, Dict]]
+    ) -> Dict:
+        annotations_by_volume: Dict[str, Dict] = {}
+        for volume_name, id_, content in annotations:
+            annotations_by_volume.setdefault(volume_name, {})[id_] = content
+        return annotations_by_volume
+
+    def get_annotations(self) -> Optional[Dict]:
+        annotations: Dict[str, Dict] = {
+            volume_name: {} for volume_name in self.get_pecha_volume_names()
+        }
+        annotations.update(self.group_annotations_by_volume(self.iter_annotations()))
         return annotations
 
     def get_filtered_annotations(
@@ -123,18 +270,40 @@ class Pecha:
             print("Please provide annotation_group and annotation_type")
             return None
 
-        annotations = {}
-        for volume_name in self.get_pecha_volume_names():
-            stam_volume = self.pecha_volumes[volume_name]
-            stam_dataset = next(stam_volume.datasets())
-            stam_key = stam_dataset.key(annotation_group.value)
-            stam_annotations = stam_volume.annotations(
-                filter=stam_key, value=annotation_type.value
+        annotations: Dict[str, Dict] = {
+            volume_name: {} for volume_name in self.get_pecha_volume_names()
+        }
+        annotations.update(
+            self.group_annotations_by_volume(
+                self.iter_filtered_annotations(annotation_group, annotation_type)
             )
-            volume_annotations = self.format_annotations_as_dict(stam_annotations)
-            annotations[volume_name] = volume_annotations
+        )
         return annotations
 
+    def export_annotations_to_jsonl(
+        self,
+        output_file_path: Path,
+        annotation_group: Optional[AnnotationGroupEnum] = None,
+        annotation_type: Optional[AnnotationEnum] = None,
+    ) -> int:
+        """
+        Write the annotations of the pecha to a JSON Lines file, one annotation
+        per line, without holding all of them in memory.
+        Only annotations of annotation_group and annotation_type are written,
+        if both are given. Returns the number of annotations written.
+        """
+        if annotation_group is None or annotation_type is None:
+            annotations = self.iter_annotations()
+        else:
+            annotations = self.iter_filtered_annotations(
+                annotation_group, annotation_type
+            )
+        records = (
+            {"volume": volume_name, "id": id_, **content}
+            for volume_name, id_, content in annotations
+        )
+        return save_jsonl_file(records, output_file_path)
+
 
 if __name__ == "__main__":
 
@@ -0,0 +1,164 @@
+"""
+Columnar file of the materialized segment pairs of an alignment.
+
+    magic | text blob | int64 columns | footer json | footer offset | magic
+
+The text blob holds the utf-8 texts of all segments one after another, the
+int64 columns hold per pair the first row and per row (segment) the language,
+the span and the text offsets. The footer has the pair ids, the languages,
+the column positions and the fingerprint of the files the cache was built
+from. The file is memory mapped and texts are decoded only when read.
+"""
+import json
+import mmap
+import struct
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+MAGIC = b"STAMSEG1"
+MAGIC_SIZE = len(MAGIC)
+SEGMENT_CACHE_VERSION = 1
+COLUMNS = ["pair_rows", "langs", "starts", "ends", "text_offsets"]
+
+SegmentPair = List[Tuple[str, str, Dict]]
+
+
+def get_files_fingerprint(file_paths: Sequence[Union[str, Path]]) -> List:
+    """size and modification time of each file, changes when a file changes"""
+    fingerprint = []
+    for file_path in file_paths:
+        stat = Path(file_path).stat()
+        fingerprint.append([str(file_path), stat.st_size, stat.st_mtime_ns])
+    return fingerprint
+
+
+def write_segment_cache(
+    cache_path: Union[str, Path],
+    segment_pairs: Iterable[Tuple[str, SegmentPair]],
+    fingerprint: List,
+):
+    """stream (pair id, segment pair) items to a segment cache file"""
+    cache_path = Path(cache_path)
+    pair_ids: List[str] = []
+    langs: List[str] = []
+    lang_indexes: Dict[str, int] = {}
+    columns = {name: array("q") for name in COLUMNS}
+
+    temp_path = cache_path.with_suffix(".tmp")
+    with open(temp_path, "wb") as f:
+        f.write(MAGIC)
+        text_offset = 0
+        columns["text_offsets"].append(text_offset)
+        for pair_id, segment_pair in segment_pairs:
+            pair_ids.append(pair_id)
+            columns["pair_rows"].append(len(columns["starts"]))
+            for text, lang, span in segment_pair:
+                if lang not in lang_indexes:
+                    lang_indexes[lang] = len(langs)
+                    langs.append(lang)
+                encoded_text = text.encode("utf-8")
+                f.write(encoded_text)
+                text_offset += len(encoded_text)
+                columns["langs"].append(lang_indexes[lang])
+                columns["starts"].append(span["start"])
+                columns["ends"].append(span["end"])
+                columns["text_offsets"].append(text_offset)
+        columns["pair_rows"].append(len(columns["starts"]))
+
+        """int64 columns are 8 bytes aligned so they can be cast in place"""
+        f.write(b"\0" * (-f.tell() % 8))
+        column_positions = {}
+        for name in COLUMNS:
+            column_positions[name] = [f.tell(), len(columns[name])]
+            f.write(columns[name].tobytes())
+
+        footer = {
+            "version": SEGMENT_CACHE_VERSION,
+            "fingerprint": fingerprint,
+            "pair_ids": pair_ids,
+            "langs": langs,
+            "text_start": MAGIC_SIZE,
+            "columns": column_positions,
+        }
+        footer_offset = f.tell()
+        f.write(json.dumps(footer, ensure_ascii=False).encode("utf-8"))
+        f.write(struct.pack("<q", footer_offset))
+        f.write(MAGIC)
+    temp_path.replace(cache_path)
+
+
+class SegmentCache:
+    """Read only, memory mapped view of a segment cache file"""
+
+    def __init__(self, cache_path: Union[str, Path]):
+        self.cache_path = Path(cache_path)
+        with open(self.cache_path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        trailer_start = len(self.buffer) - MAGIC_SIZE - 8
+        magic_start = trailer_start + 8
+        if (
+            trailer_start < MAGIC_SIZE
+            or self.buffer[:MAGIC_SIZE] != MAGIC
+            or self.buffer[magic_start:] != MAGIC
+        ):
+            self.buffer.close()
+            raise ValueError(f"{self.cache_path} is not a segment cache file")
+        (footer_offset,) = struct.unpack_from("<q", self.buffer, trailer_start)
+        self.footer = json.loads(self.buffer[footer_offset:trailer_start])
+        self.pair_ids: List[str] = self.footer["pair_ids"]
+        self.langs: List[str] = self.footer["langs"]
+        self.pair_indexes = {id_: index for index, id_ in enumerate(self.pair_ids)}
+
+        view = memoryview(self.buffer)
+        self.columns = {}
+        for name, (offset, length) in self.footer["columns"].items():
+            column_end = offset + length * 8
+            self.columns[name] = view[offset:column_end].cast("q")
+
+    @classmethod
+    def open_if_valid(
+        cls, cache_path: Union[str, Path], fingerprint: List
+    ) -> Optional["SegmentCache"]:
+        """open the cache, or None if it is missing, unreadable or out of date"""
+        try:
+            segment_cache = cls(cache_path)
+        except (OSError, ValueError):
+            return None
+        if (
+            segment_cache.footer["version"] != SEGMENT_CACHE_VERSION
+            or segment_cache.footer["fingerprint"] != fingerprint
+        ):
+            segment_cache.close()
+            return None
+        return segment_cache
+
+    def __len__(self) -> int:
+        return len(self.pair_ids)
+
+    def get_segment_pair(self, id_: str) -> SegmentPair:
+        index = self.pair_indexes[id_]
+        pair_rows = self.columns["pair_rows"]
+        text_start = self.footer["text_start"]
+        text_offsets = self.columns["text_offsets"]
+        segment_pair = []
+        for row in range(pair_rows[index], pair_rows[index + 1]):
+            text_begin = text_start + text_offsets[row]
+            text_end = text_start + text_offsets[row + 1]
+            text = self.buffer[text_begin:text_end].decode("utf-8")
+            span = {
+                "start": self.columns["starts"][row],
+                "end": self.columns["ends"][row],
+            }
+            segment_pair.append((text, self.langs[self.columns["langs"][row]], span))
+        return segment_pair
+
+    def get_segment_pairs(self) -> Iterator[SegmentPair]:
+        for id_ in self.pair_ids:
+            yield self.get_segment_pair(id_)
+
+    def close(self):
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        self.buffer.close()
@@ -1,12 +1,15 @@
 import subprocess
 from pathlib import Path
-
-from github import Github, GithubException
+from typing import Optional, Sequence
 
 from stam_annotator.exceptions import RepoCloneError, RepoDoesNotExist
+from stam_annotator.stam_fetcher.mirror_cache import MirrorCache
 
 
 def check_repo_exists(token, org_name, repo_name):
+    """github is imported here as it is slow to import and rarely needed"""
+    from github import Github, GithubException
+
     g = Github(token)
     try:
         org = g.get_organization(org_name)
@@ -15,7 +18,24 @@ def check_repo_exists(token, org_name, repo_name):
         raise RepoDoesNotExist(org_name, repo_name)
 
 
-def clone_repo(org, repo_name, token, destination_folder: Path):
+def clone_repo(
+    org,
+    repo_name,
+    token,
+    destination_folder: Path,
+    mirror_cache: Optional[MirrorCache] = None,
+    sparse_patterns: Optional[Sequence[str]] = None,
+):
+    """
+    With a mirror_cache, the working tree is checked out from a local mirror
+    that is fetched incrementally, and updated if it already exists.
+    """
+    Path(destination_folder).parent.mkdir(parents=True, exist_ok=True)
+    if mirror_cache is not None:
+        mirror_cache.checkout(
+            org, repo_name, token, destination_folder, sparse_patterns
+        )
+        return
     try:
         """make a inner folder with source org name and clone the repo in it"""
         repo_url = f"https://{token}@github.com/{org}/{repo_name}.git"
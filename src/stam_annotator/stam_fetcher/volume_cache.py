@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Mapping, Optional
+
+from stam import AnnotationStore
+
+from stam_annotator.instrumentation import stage
+
+
+class VolumeCache(Mapping):
+    """
+    Volume name -> AnnotationStore mapping that loads a volume on first access
+    and keeps the loaded volumes in a LRU cache.
+
+    The budget is a number of volumes (max_volumes) and/or the size of the
+    volume json files on disk (max_bytes). When a newly loaded volume takes the
+    cache over budget, the least recently used volumes are evicted. The volume
+    that was just loaded is always kept, even if it is over budget on its own.
+    on_evict is called with the name of every volume that leaves the cache, to
+    drop what was derived from it.
+    """
+
+    def __init__(
+        self,
+        volume_files: Dict[str, Path],
+        max_volumes: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ):
+        self.volume_files = volume_files
+        self.max_volumes = max_volumes
+        self.max_bytes = max_bytes
+        self.loaded_volumes: "OrderedDict[str, AnnotationStore]" = OrderedDict()
+        self.volume_sizes: Dict[str, int] = {}
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getitem__(self, volume_name: str) -> AnnotationStore:
+        if volume_name in self.loaded_volumes:
+            self.hits += 1
+            self.loaded_volumes.move_to_end(volume_name)
+            return self.loaded_volumes[volume_name]
+
+        volume_file = self.volume_files[volume_name]
+        self.misses += 1
+        with stage(
+            "load_volume", volume=volume_name, file=volume_file
+        ) as current_stage:
+            store = AnnotationStore(file=str(volume_file))
+            current_stage.count = store.annotations_len()
+        self.loaded_volumes[volume_name] = store
+        self.volume_sizes[volume_name] = volume_file.stat().st_size
+        self.evict()
+        return store
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.volume_files)
+
+    def __len__(self) -> int:
+        return len(self.volume_files)
+
+    @property
+    def loaded_bytes(self) -> int:
+        return sum(self.volume_sizes[name] for name in self.loaded_volumes)
+
+    def is_over_budget(self) -> bool:
+        if self.max_volumes is not None and len(self.loaded_volumes) > self.max_volumes:
+            return True
+        if self.max_bytes is not None and self.loaded_bytes > self.max_bytes:
+            return True
+        return False
+
+    def evict(self):
+        """evict least recently used volumes, but never the most recent one"""
+        while len(self.loaded_volumes) > 1 and self.is_over_budget():
+            volume_name, _ = self.loaded_volumes.popitem(last=False)
+            del self.volume_sizes[volume_name]
+            self.evictions += 1
+            self.notify_evicted(volume_name)
+
+    def discard(self, volume_name: str):
+        """drop a loaded volume from the cache, it is loaded again on next access"""
+        if volume_name in self.loaded_volumes:
+            del self.loaded_volumes[volume_name]
+            del self.volume_sizes[volume_name]
+            self.notify_evicted(volume_name)
+
+    def clear(self):
+        volume_names = list(self.loaded_volumes)
+        self.loaded_volumes.clear()
+        self.volume_sizes.clear()
+        for volume_name in volume_names:
+            self.notify_evicted(volume_name)
+
+    def notify_evicted(self, volume_name: str):
+        if self.on_evict is not None:
+            self.on_evict(volume_name)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "loaded_volumes": len(self.loaded_volumes),
+            "loaded_bytes": self.loaded_bytes,
+        }
@@ -1,14 +1,16 @@
-import time
 from pathlib import Path
-from typing import List, Sequence, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple, Union
 
 import stam
-from stam import AnnotationDataSet, Annotations, AnnotationStore
+from stam import Annotation, AnnotationDataSet, Annotations, AnnotationStore
 
 from stam_annotator.config import AnnotationEnum, AnnotationGroupEnum
-from stam_annotator.opa_loader import OpaAnnotation
+from stam_annotator.instrumentation import stage
 from stam_annotator.utility import convert_opf_stam_annotation_to_dictionary
 
+if TYPE_CHECKING:
+    from stam_annotator.opa_loader import OpaAnnotation
+
 
 def load_stam_from_json(file_path: Union[str, Path]) -> AnnotationStore:
     file_path = str(file_path)
@@ -21,16 +23,19 @@ def load_multiple_stam_from_json(
     return [load_stam_from_json(file_path) for file_path in file_paths]
 
 
-def get_annotation_data_set(store: AnnotationStore, key: str) -> AnnotationDataSet:
+def get_key_data_set_map(store: AnnotationStore) -> Dict[str, AnnotationDataSet]:
+    """map every data key id in the store to the first data set that has it"""
+    key_data_sets: Dict[str, AnnotationDataSet] = {}
     for data_set in store.datasets():
         for data_set_key in data_set.keys():
-            try:
-                if data_set_key == data_set.key(key):
-                    return data_set
-            except:  # noqa
-                pass
+            key_id = data_set_key.id()
+            if key_id is not None:
+                key_data_sets.setdefault(key_id, data_set)
+    return key_data_sets
 
-    return False
+
+def get_annotation_data_set(store: AnnotationStore, key: str) -> AnnotationDataSet:
+    return get_key_data_set_map(store).get(key, False)
 
 
 def get_annotations(
@@ -39,19 +44,15 @@ def get_annotations(
     value: AnnotationEnum,
     include_payload: bool = True,
 ) -> Annotations:
-    start_time = time.time()
-
-    data_set = get_annotation_data_set(store, key.value)
-    data_key = data_set.key(key.value)
-    annotations = data_set.data(filter=data_key, value=value.value).annotations()
-
-    annotations = convert_opf_stam_annotation_to_dictionary(
-        annotations, include_payload
-    )
-    end_time = time.time()
-    elapsed_time = end_time - start_time
-    print(f"Time taken: {elapsed_time:.2f} seconds")
-
+    with stage("get_annotations", key=key.value, value=value.value) as current_stage:
+        data_set = get_annotation_data_set(store, key.value)
+        data_key = data_set.key(key.value)
+        annotations = data_set.data(filter=data_key, value=value.value).annotations()
+
+        annotations = convert_opf_stam_annotation_to_dictionary(
+            annotations, include_payload
+        )
+        current_stage.count = len(annotations)
     return annotations
 
 
@@ -63,87 +64,109 @@ def combine_stams(stams: List[AnnotationStore]) -> AnnotationStore:
     if len(stams) < 2:
         raise ValueError("At least two STAM objects are required.")
 
-    stam1 = stams[0]
-    for stam2 in stams[1:]:
-        stam1 = combine_two_stam(stam1, stam2)
+    with stage("combine_stams", stores=len(stams)) as current_stage:
+        stam1 = stams[0]
+        for stam2 in stams[1:]:
+            stam1 = combine_two_stam(stam1, stam2)
+        current_stage.count = stam1.annotations_len()
     return stam1
 
 
 def combine_two_stam(stam1: AnnotationStore, stam2: AnnotationStore) -> AnnotationStore:
-
     """
     In this function, all the resources, data set and annotations are being transfered from
     stam2 to stam1.
     """
     # transfer resources
+    resource_ids = {resource.id() for resource in stam1.resources()}
     for resource in stam2.resources():
-        stam1.add_resource(id=resource.id(), text=resource.text())
+        if resource.id() not in resource_ids:
+            stam1.add_resource(id=resource.id(), text=resource.text())
 
-    # transfer annotations
+    """
+    key -> data set of stam1 is resolved once for the whole merge.
+    if the key already exists in a data set of stam1, that data set is used with the
+    annotation data, else the key is added to the first data set of stam1.
+    """
+    key_data_sets = get_key_data_set_map(stam1)
+    default_data_set = next(stam1.datasets())
+
+    # collect the annotations with all their data, payloads included
+    annotations_to_add = []
     for annotation in stam2.annotations():
-        annotation_data = next(annotation.__iter__(), None)
-        if not annotation_data:
-            continue
-
-        """
-        if the associated data set already exists, then data_set_id of already existing is used
-        with annotation,
-        else data set id of new is used.
-
-        """
-        annotation_data_key = annotation_data.key().id()
-
-        data_set = get_annotation_data_set(stam1, annotation_data_key)
-        """if the key is not present in the data set, then it is added to data set"""
-        if not data_set:
-            data_set = next(stam1.datasets())
-            data_set.add_key(annotation_data_key)
-
-        data_set_id = data_set.id()
-        data = {
-            "id": annotation_data.id(),
-            "key": annotation_data_key,
-            "value": annotation_data.value().get(),
-            "set": data_set_id,
-        }
-        stam1.annotate(id=annotation.id(), target=annotation.target(), data=data)
+        data = []
+        for annotation_data in annotation:
+            annotation_data_key = annotation_data.key().id()
+            if annotation_data_key is None:
+                raise ValueError("annotation data keys must have an id")
+            data_set = key_data_sets.get(annotation_data_key)
+            if data_set is None:
+                default_data_set.add_key(annotation_data_key)
+                data_set = key_data_sets[annotation_data_key] = default_data_set
+
+            current_data = {
+                "key": annotation_data_key,
+                "value": annotation_data.value().get(),
+                "set": data_set.id(),
+            }
+            if annotation_data.id():
+                current_data["id"] = annotation_data.id()
+            data.append(current_data)
+        if data:
+            annotations_to_add.append((annotation.id(), annotation.target(), data))
+
+    # transfer annotations
+    for annotation_id, target, data in annotations_to_add:
+        stam1.annotate(id=annotation_id, target=target, data=data)
     return stam1
 
 
+def build_annotation_index(
+    stores: Sequence[AnnotationStore],
+) -> Dict[str, Tuple[AnnotationStore, Annotation]]:
+    """
+    Map every annotation id to its store and annotation.
+    If an id exists in more than one store, the first store wins.
+    Annotations without an id can not be referred to, and are left out.
+    """
+    annotation_index: Dict[str, Tuple[AnnotationStore, Annotation]] = {}
+    for store in stores:
+        for annotation in store.annotations():
+            annotation_id = annotation.id()
+            if annotation_id is not None:
+                annotation_index.setdefault(annotation_id, (store, annotation))
+    return annotation_index
+
+
 def get_alignment_annotations(
-    opa_alignment: OpaAnnotation,
+    opa_alignment: "OpaAnnotation",
     opf_annotations: List[AnnotationStore],
+    annotation_index: Optional[Dict[str, Tuple[AnnotationStore, Annotation]]] = None,
 ):
     """
     This function returns the annotations of the given key and value from the alignment
     annotation store.
+    annotation_index can be built once with build_annotation_index and shared across calls.
     """
-
-    start_time = time.time()
-    alignment_sources = list(opa_alignment.segment_sources.keys())
-
-    alignment_annotations = {}
-    for segment_id, segment in opa_alignment.segment_pairs.items():
-        # Get if all the sources are present in the segment
-        if not all(source in segment for source in alignment_sources):
-            raise ValueError("The alignment is not complete.")
-
-        # get the annotation
-        current_annotation = {}
-        for source_id, segment_offset in segment.items():
-            for opf_annot in opf_annotations:
-                try:
-                    if opf_annot.annotation(segment_offset):
-                        language = opa_alignment.segment_sources[source_id].lang
-                        current_annotation[language] = str(
-                            opf_annot.annotation(segment_offset)
-                        )
-                        break
-                except:  # noqa
-                    pass
-        alignment_annotations[segment_id] = current_annotation
-    end_time = time.time()  # End timing
-    elapsed_time = end_time - start_time
-    print(f"Time taken: {elapsed_time:.2f} seconds")
-
+    with stage("get_alignment_annotations") as current_stage:
+        if annotation_index is None:
+            annotation_index = build_annotation_index(opf_annotations)
+        alignment_sources = list(opa_alignment.segment_sources.keys())
+
+        alignment_annotations = {}
+        for segment_id, segment in opa_alignment.segment_pairs.items():
+            # Get if all the sources are present in the segment
+            if not all(source in segment for source in alignment_sources):
+                raise ValueError("The alignment is not complete.")
+
+            # get the annotation
+            current_annotation = {}
+            for source_id, segment_offset in segment.items():
+                indexed_annotation = annotation_index.get(segment_offset)
+                if indexed_annotation is None:
+                    continue
+                language = opa_alignment.segment_sources[source_id].lang
+                current_annotation[language] = str(indexed_annotation[1])
+            alignment_annotations[segment_id] = current_annotation
+        current_stage.count = len(alignment_annotations)
     return alignment_annotations
@@ -1,14 +1,15 @@
+import hashlib
 import json
 from pathlib import Path
-from typing import Dict, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
 from uuid import uuid4
 
 import stam
-import yaml
 from stam import Annotations, AnnotationStore
 
 from stam_annotator.config import AnnotationEnum
 from stam_annotator.exceptions import CustomDataValidationError
+from stam_annotator.layer_cache import LayerCache
 
 
 def get_filename_without_extension(file_path: Union[str, Path]):
@@ -19,10 +20,53 @@ def is_json_file_path(file_path: Path) -> bool:
     return file_path.suffix == ".json"
 
 
+"""stam picks the cbor serialization from this suffix"""
+BINARY_STAM_SUFFIX = ".store.stam.cbor"
+
+
+def get_binary_stam_file_path(json_file_path: Union[str, Path]) -> Path:
+    """v001.opf.json -> v001.opf.store.stam.cbor"""
+    json_file_path = Path(json_file_path)
+    return json_file_path.with_name(json_file_path.stem + BINARY_STAM_SUFFIX)
+
+
 def get_uuid():
     return uuid4().hex
 
 
+def get_deterministic_id(*parts) -> str:
+    """id derived from the json of the parts, the same parts always give the same id"""
+    parts_json = json.dumps(list(parts), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(parts_json.encode("utf-8")).hexdigest()[:32]
+
+
+def get_annotation_data_id(key: str, value: Any) -> str:
+    """id derived from the key and value, the same data always gets the same id"""
+    return get_deterministic_id(key, value)
+
+
+def get_new_id(id_parts: Optional[Sequence] = None, *parts) -> str:
+    """
+    a new uuid, or in the deterministic id mode, where id_parts is given
+    (pecha id, volume and layer), an id derived from id_parts and parts
+    """
+    if id_parts is None:
+        return get_uuid()
+    return get_deterministic_id(*id_parts, *parts)
+
+
+def get_layer_id_parts(
+    pecha_id: str,
+    resource_file_path: Union[str, Path],
+    layer_file_path: Optional[Union[str, Path]] = None,
+) -> List[str]:
+    """pecha id, volume (the name of the base text) and layer (the yml file name)"""
+    id_parts = [pecha_id, get_filename_without_extension(resource_file_path)]
+    if layer_file_path is not None:
+        id_parts.append(get_filename_without_extension(layer_file_path))
+    return id_parts
+
+
 def read_json_to_dict(file_path: Path) -> Dict:
     if not is_json_file_path(file_path):
         raise ValueError(f"The file path must lead to a JSON file. Given: {file_path}")
@@ -57,10 +101,67 @@ def get_enum_value_if_match_ignore_case(enum_class, string_to_check):
     return False
 
 
-def load_opf_annotations_from_yaml(yaml_file):
-    with open(yaml_file) as f:
-        data = yaml.safe_load(f)
-        data = convert_none_to_null_in_annotations(data)
+def load_yaml(stream):
+    """
+    parse yml with the LibYAML based loader when it is available,
+    yaml is imported on first use as only the converters need it
+    """
+    import yaml
+
+    return yaml.load(stream, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+
+def load_opf_annotations_from_yaml(
+    yaml_file,
+    layer_cache: Optional[LayerCache] = None,
+    id_parts: Optional[Sequence[str]] = None,
+):
+    """
+    Load and normalize an opf layer yml file.
+    With a layer_cache, the normalized data of an unchanged file is read from
+    the cache instead of parsing the yml again.
+    With id_parts, the ids missing in the file are derived from them instead
+    of new uuids, see fill_missing_ids.
+    """
+    if layer_cache is None:
+        with open(yaml_file) as f:
+            return fill_missing_ids(
+                normalize_opf_annotations(load_yaml(f), id_parts), id_parts
+            )
+
+    content = Path(yaml_file).read_bytes()
+    """the ids made up for the file depend on id_parts"""
+    namespace = json.dumps(id_parts) if id_parts is not None else ""
+    cache_key = layer_cache.get_key(content, namespace)
+    data = layer_cache.get(cache_key)
+    if data is None:
+        data = normalize_opf_annotations(load_yaml(content), id_parts)
+        data = fill_missing_ids(data, id_parts)
+        layer_cache.set(cache_key, data)
+    return data
+
+
+def fill_missing_ids(data: Dict, id_parts: Optional[Sequence[str]] = None) -> Dict:
+    """
+    In the deterministic id mode, the layer and annotation ids missing in a
+    normalized layer are derived from id_parts and the annotation index, the
+    converters would give them new uuids.
+    """
+    if id_parts is None:
+        return data
+    if not data.get("id"):
+        data["id"] = get_deterministic_id(*id_parts, "layer")
+    annotations = data.get("annotations") or {}
+    if not all(annotations):
+        data["annotations"] = {
+            annotation_id or get_deterministic_id(*id_parts, index): annotation
+            for index, (annotation_id, annotation) in enumerate(annotations.items())
+        }
+    return data
+
+
+def normalize_opf_annotations(data, id_parts: Optional[Sequence[str]] = None):
+    data = convert_none_to_null_in_annotations(data)
 
     """check if annotation type matches any enum value"""
     enum_matched_value = get_enum_value_if_match_ignore_case(
@@ -85,7 +186,7 @@ def load_opf_annotations_from_yaml(yaml_file):
 
     """annotations key is a list in some cases, convert it to dictionary"""
     if isinstance(data["annotations"], list) and len(data["annotations"]) == 1:
-        annotation_id = get_uuid()
+        annotation_id = get_new_id(id_parts, 0)
         data["annotations"] = {
             f"{annotation_id}": item for index, item in enumerate(data["annotations"])
         }
@@ -116,11 +217,14 @@ def load_opf_annotations_from_yaml(yaml_file):
 
 def load_opa_annotations_from_yaml(yaml_file):
     with open(yaml_file) as f:
-        data = yaml.safe_load(f)
+        data = load_yaml(f)
     return data
 
 
-def save_annotation_store(store: AnnotationStore, output_file_path: Union[str, Path]):
+def save_annotation_store(
+    store: AnnotationStore, output_file_path: Union[str, Path], binary: bool = False
+):
+    """with binary, the store is also saved as cbor next to the json file"""
     output_file_path = Path(output_file_path)
 
     # Check if the file extension is .json
@@ -131,6 +235,18 @@ def save_annotation_store(store: AnnotationStore, output_file_path: Union[str, P
 
     store.set_filename(str(output_file_path))
     store.save()
+    if binary:
+        """saved after the json, so the cbor copy is never older than it"""
+        store.set_filename(str(get_binary_stam_file_path(output_file_path)))
+        store.save()
+        store.set_filename(str(output_file_path))
+
+
+def delete_annotation_store(json_file_path: Union[str, Path]):
+    """delete a stam json file and its binary copy, if they exist"""
+    for file_path in [Path(json_file_path), get_binary_stam_file_path(json_file_path)]:
+        if file_path.exists():
+            file_path.unlink()
 
 
 def save_json_file(data: Dict, output_file_path: Union[str, Path]):
@@ -146,33 +262,72 @@ def save_json_file(data: Dict, output_file_path: Union[str, Path]):
         json.dump(data, f, indent=4)
 
 
-def convert_opf_stam_annotation_to_dictionary(
+def save_jsonl_file(records: Iterable[Dict], output_file_path: Union[str, Path]) -> int:
+    """
+    Write records to a JSON Lines file as they come, one record per line.
+    Returns the number of records written.
+    """
+    output_file_path = Path(output_file_path)
+
+    # Check if the file extension is .jsonl
+    if output_file_path.suffix != ".jsonl":
+        raise ValueError(
+            f"The file path must lead to a JSONL file. Given: {output_file_path}"
+        )
+
+    records_count = 0
+    with open(output_file_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+            records_count += 1
+    return records_count
+
+
+def iter_opf_stam_annotation_records(
     annotations: Annotations, include_payload: bool = True
-) -> Dict:
+) -> Iterator[Dict]:
     """
-    This function converts the annotation object to a dictionary.
+    This function yields the annotation objects as dictionaries, one at a time.
     """
-    annotation_dict = {}
     for annotation in annotations:
         # get the text to which this annotation refers (if any)
         text = str(annotation) if not isinstance(annotation, stam.StamError) else "n/a"
+        """the record of the last annotation data is kept"""
+        annotation_record = None
         for data in annotation:
-            annotation_dict[annotation.id()] = {
+            annotation_record = {
                 "id": annotation.id(),
                 "key": data.key().id(),
                 "value": str(data.value()),
                 "text": text,
             }
-            if include_payload:
-                payload_dictionary = {}
-                for annot in annotation.annotations():
-                    for data in annot:
-                        payload_dictionary[data.key().id()] = {
-                            "id": annot.id(),
-                            "value": str(data.value()),
-                        }
-                annotation_dict[annotation.id()]["payload"] = payload_dictionary
-    return annotation_dict
+        if annotation_record is None:
+            continue
+        if include_payload:
+            payload_dictionary = {}
+            for annot in annotation.annotations():
+                for data in annot:
+                    payload_dictionary[data.key().id()] = {
+                        "id": annot.id(),
+                        "value": str(data.value()),
+                    }
+            annotation_record["payload"] = payload_dictionary
+        yield annotation_record
+
+
+def convert_opf_stam_annotation_to_dictionary(
+    annotations: Annotations, include_payload: bool = True
+) -> Dict:
+    """
+    This function converts the annotation object to a dictionary.
+    """
+    return {
+        annotation_record["id"]: annotation_record
+        for annotation_record in iter_opf_stam_annotation_records(
+            annotations, include_payload
+        )
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,151 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from stam import AnnotationStore
+
+from stam_annotator.config import AnnotationGroupEnum
+from stam_annotator.exceptions import VolumeConversionError
+from stam_annotator.layer_cache import LayerCache
+from stam_annotator.opf_to_stam import opf_layers_to_stam, opf_to_stam_pipeline
+from stam_annotator.profiling import get_volume_profile_path, profile_volume_conversion
+from stam_annotator.stam_manager import combine_stams
+from stam_annotator.utility import save_annotation_store
+
+
+class VolumeJob(NamedTuple):
+    """everything needed to convert the layers of one volume to a stam file"""
+
+    pecha_id: str
+    volume_name: str
+    layer_file_paths: List[Path]
+    base_file_path: Path
+    output_file_path: Path
+    single_store: bool = True
+    layer_cache: Optional[LayerCache] = None
+    """also save the stam as cbor, which loads faster than json"""
+    binary: bool = False
+    """
+    reference base_file_path from the stam instead of embedding its text,
+    not with binary, as the cbor would embed the text anyway
+    """
+    standoff: bool = False
+    """run the conversion under cProfile and dump the stats in this folder"""
+    profile_dir: Optional[Path] = None
+    """derive the ids missing in the layers, the same inputs give the same stam"""
+    deterministic_ids: bool = False
+
+
+class VolumeResult(NamedTuple):
+    volume_name: str
+    output_file_path: Path
+    annotations_count: int
+
+
+def check_output_options(binary: bool, standoff: bool):
+    """
+    the cbor copy of a store always embeds its text, and is loaded in place of
+    the json, so it would undo standoff
+    """
+    if binary and standoff:
+        raise ValueError("binary can not be combined with standoff")
+
+
+def save_volume_stam(job: VolumeJob, volume_stam: AnnotationStore) -> VolumeResult:
+    save_annotation_store(volume_stam, job.output_file_path, binary=job.binary)
+    return VolumeResult(
+        job.volume_name, job.output_file_path, volume_stam.annotations_len()
+    )
+
+
+def convert_volume_to_stam(job: VolumeJob) -> Optional[VolumeResult]:
+    """
+    Convert all the layers of a volume to one stam and save the stam json.
+    With single_store the layers are written into one store, otherwise every
+    layer gets its own store and they are combined with combine_stams.
+    Returns the output file path and annotations count, or None if the volume
+    has no annotations.
+    With a profile_dir, see stam_annotator.profiling.
+    """
+    if job.profile_dir is not None:
+        return profile_volume_conversion(
+            get_volume_profile_path(job.profile_dir, job.pecha_id, job.volume_name),
+            job.pecha_id,
+            job.volume_name,
+            lambda: convert_volume_to_stam(job._replace(profile_dir=None)),
+            lambda result: result.annotations_count if result else 0,
+        )
+
+    standoff_dir = job.output_file_path.parent if job.standoff else None
+    if job.single_store:
+        volume_stam = opf_layers_to_stam(
+            job.pecha_id,
+            job.layer_file_paths,
+            job.base_file_path,
+            AnnotationGroupEnum.structure_type,
+            layer_cache=job.layer_cache,
+            standoff_dir=standoff_dir,
+            deterministic_ids=job.deterministic_ids,
+        )
+        if volume_stam is None:
+            return None
+        return save_volume_stam(job, volume_stam)
+
+    stams_in_volume = []
+    for layer_file_path in job.layer_file_paths:
+        curr_stam = opf_to_stam_pipeline(
+            job.pecha_id,
+            layer_file_path,
+            job.base_file_path,
+            AnnotationGroupEnum.structure_type,
+            layer_cache=job.layer_cache,
+            standoff_dir=standoff_dir,
+            deterministic_ids=job.deterministic_ids,
+        )
+        if curr_stam:
+            stams_in_volume.append(curr_stam)
+
+    stams_count = len(stams_in_volume)
+    if stams_count == 0:
+        return None
+    combined_stam = (
+        stams_in_volume[0] if stams_count == 1 else combine_stams(stams_in_volume)
+    )
+    return save_volume_stam(job, combined_stam)
+
+
+def convert_volumes_to_stam(
+    jobs: List[VolumeJob], workers: int = 1
+) -> List[Optional[VolumeResult]]:
+    """
+    Convert volumes one after another (workers=1) or in a process pool.
+    Every volume is converted by the same function in both modes, so the
+    written files do not depend on the mode. Errors are raised as
+    VolumeConversionError with the pecha id and volume name in both modes.
+    """
+    for job in jobs:
+        check_output_options(job.binary, job.standoff)
+    if workers <= 1 or len(jobs) <= 1:
+        results = []
+        for job in jobs:
+            try:
+                results.append(convert_volume_to_stam(job))
+            except Exception as error:
+                raise VolumeConversionError(
+                    job.pecha_id, job.volume_name, error
+                ) from error
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(convert_volume_to_stam, job) for job in jobs]
+        results = []
+        for job, future in zip(jobs, futures):
+            try:
+                results.append(future.result())
+            except Exception as error:
+                for pending_future in futures:
+                    pending_future.cancel()
+                raise VolumeConversionError(
+                    job.pecha_id, job.volume_name, error
+                ) from error
+    return results
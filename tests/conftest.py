@@ -0,0 +1,132 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+from stam import AnnotationStore, Offset, Selector
+
+from stam_annotator.repo_manifest import RepoManifest
+from stam_annotator.volume_converter import VolumeJob
+
+DATA_DIR = Path(__file__).parent.absolute() / "data"
+
+
+def git(cwd: Path, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@test", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def commit_files():
+    """write files to a git repo, created if it does not exist, and commit them"""
+
+    def commit(repo_path: Path, files) -> Path:
+        if not (repo_path / ".git").exists():
+            repo_path.mkdir(parents=True, exist_ok=True)
+            git(repo_path, "init", "-b", "main")
+        for file_name, content in files.items():
+            file_path = repo_path / file_name
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            file_path.write_text(content, encoding="utf-8")
+        git(repo_path, "add", "-A")
+        git(repo_path, "commit", "-m", "update")
+        return repo_path
+
+    return commit
+
+
+@pytest.fixture
+def make_pecha():
+    """save one stam with a segment annotation per volume in the layers folder"""
+
+    def make(base_path: Path, pecha_id: str, volume_names):
+        layers_path = base_path / f"{pecha_id}.opf" / "layers"
+        layers_path.mkdir(parents=True)
+        for volume_name in volume_names:
+            store = AnnotationStore(id=volume_name)
+            resource = store.add_resource(id=volume_name, text=f"{volume_name} text")
+            dataset = store.add_dataset(id="dataset")
+            dataset.add_key("Structure Type")
+            store.annotate(
+                id=f"{volume_name}_segment",
+                target=Selector.textselector(resource, Offset.simple(0, 4)),
+                data=[{"key": "Structure Type", "value": "Segment", "set": "dataset"}],
+            )
+            store.set_filename(str(layers_path / f"{volume_name}.opf.json"))
+            store.save()
+
+    return make
+
+
+@pytest.fixture
+def make_store():
+    """a store with one segment annotation, and the payloads as its other data"""
+
+    def make(store_id: str, annotation_id: str, payloads: dict) -> AnnotationStore:
+        store = AnnotationStore(id=store_id)
+        resource = store.add_resource(id="v001", text="ཀཁགངཅཆཇཉ")
+        dataset = store.add_dataset(id=f"{store_id}_set")
+        dataset.add_key("Structure Type")
+        data = [{"key": "Structure Type", "value": "Segment", "set": dataset.id()}]
+        data += [
+            {"key": key, "value": value, "set": dataset.id()}
+            for key, value in payloads.items()
+        ]
+        store.annotate(
+            id=annotation_id,
+            target=Selector.textselector(resource, Offset.simple(0, 4)),
+            data=data,
+        )
+        return store
+
+    return make
+
+
+@pytest.fixture
+def make_volume_jobs(tmp_path):
+    """
+    jobs converting the layers of tmp_path/layers to tmp_path/<output_dir_name>.
+    The layers and base text of a volume are written the first time, so the
+    jobs of later calls see the changes a test made to them.
+    """
+
+    def make(
+        output_dir_name: str = "output",
+        volume_names=("v001", "v002", "v003"),
+        layer_names=("opf_author.yml", "opf_quotations.yml"),
+        single_store: bool = True,
+        standoff: bool = False,
+    ):
+        for volume_name in volume_names:
+            volume_dir = tmp_path / "layers" / volume_name
+            if volume_dir.exists():
+                continue
+            volume_dir.mkdir(parents=True)
+            base_file_path = tmp_path / "base" / f"{volume_name}.txt"
+            base_file_path.parent.mkdir(exist_ok=True)
+            base_file_path.write_text("ཀ" * 20000, encoding="utf-8")
+            for layer_name in layer_names:
+                shutil.copy(DATA_DIR / layer_name, volume_dir / layer_name)
+
+        """the layers are listed like the converter lists them"""
+        manifest = RepoManifest.from_path(tmp_path / "layers")
+        output_dir = tmp_path / output_dir_name
+        output_dir.mkdir(exist_ok=True)
+        return [
+            VolumeJob(
+                pecha_id="P000001",
+                volume_name=volume_name,
+                layer_file_paths=manifest.layer_files[volume_name],
+                base_file_path=tmp_path / "base" / f"{volume_name}.txt",
+                output_file_path=output_dir / f"{volume_name}.opf.json",
+                single_store=single_store,
+                standoff=standoff,
+            )
+            for volume_name in volume_names
+        ]
+
+    return make
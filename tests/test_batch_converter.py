@@ -0,0 +1,180 @@
+import json
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from stam_annotator import convert_to_stam
+from stam_annotator.batch_converter import BatchConverter, BatchItem
+from stam_annotator.stam_fetcher import utility as stam_fetcher_utility
+from stam_annotator.stam_fetcher.mirror_cache import MirrorCache, RefreshPolicy
+
+DATA_DIR = Path(__file__).parent.absolute() / "data"
+
+
+def fake_fetch(item: BatchItem, output_path: Path, mirror_cache=None):
+    if (output_path / f"{item.id_}.fetch_error").exists():
+        raise RuntimeError(f"could not fetch {item.id_}")
+    (output_path / item.id_).mkdir(exist_ok=True)
+
+
+def fake_convert(item: BatchItem, output_path: Path) -> int:
+    (output_path / item.id_ / "converted").touch()
+    return 10 if item.kind == "pecha" else 0
+
+
+def read_journal(journal_path: Path):
+    return [json.loads(line) for line in journal_path.read_text().splitlines()]
+
+
+def test_batch_converter_resumes_from_journal(tmp_path):
+    (tmp_path / "P000002.fetch_error").touch()
+    batch_converter = BatchConverter(
+        pecha_ids=["P000001", "P000002"],
+        alignment_ids=["A000001"],
+        output_path=tmp_path,
+        fetch_workers=2,
+        convert_workers=2,
+        fetch=fake_fetch,
+        convert=fake_convert,
+    )
+
+    report = batch_converter.run()
+    assert (report["converted"], report["failed"], report["skipped"]) == (2, 1, 0)
+    assert report["annotations"] == 10
+    assert report["pechas_per_minute"] > 0
+    assert report["annotations_per_second"] > 0
+
+    journal = read_journal(tmp_path / "batch_journal.jsonl")
+    failed_records = [record for record in journal if record["status"] == "failed"]
+    assert failed_records[0]["id"] == "P000002"
+    assert failed_records[0]["stage"] == "fetch"
+
+    """the rerun only retries the failed pecha"""
+    (tmp_path / "P000002.fetch_error").unlink()
+    report = batch_converter.run()
+    assert (report["converted"], report["failed"], report["skipped"]) == (1, 0, 2)
+    assert (tmp_path / "P000002" / "converted").exists()
+
+
+def make_mirror_cache(tmp_path: Path) -> MirrorCache:
+    return MirrorCache(
+        tmp_path / "mirrors",
+        refresh=RefreshPolicy.always,
+        url_template=(tmp_path / "remote").as_uri() + "/{org}/{repo_name}",
+    )
+
+
+def fail_git_clone(args, **kwargs):
+    raise subprocess.CalledProcessError(128, args)
+
+
+@pytest.mark.parametrize("use_mirror_cache", [False, True])
+def test_failed_clone_is_journaled_as_failed_fetch(
+    tmp_path, monkeypatch, use_mirror_cache
+):
+    monkeypatch.setattr(convert_to_stam, "get_github_token", lambda: "")
+    monkeypatch.setattr(stam_fetcher_utility.subprocess, "run", fail_git_clone)
+    batch_converter = BatchConverter(
+        pecha_ids=["P000001"],
+        output_path=tmp_path / "output",
+        convert_workers=1,
+        mirror_cache=make_mirror_cache(tmp_path) if use_mirror_cache else None,
+    )
+
+    report = batch_converter.run()
+    assert (report["converted"], report["failed"]) == (0, 1)
+    [record] = read_journal(tmp_path / "output" / "batch_journal.jsonl")
+    assert (record["status"], record["stage"]) == ("failed", "fetch")
+
+
+def clone_from_local_remote(remote_path: Path):
+    """run git with the github urls of clone_repo pointed at remote_path"""
+    run = subprocess.run
+    github_url = "https://@github.com/"
+
+    def run_local(args, **kwargs):
+        args = [
+            str(remote_path / str(arg).split(github_url)[1].replace(".git", ""))
+            if str(arg).startswith(github_url)
+            else arg
+            for arg in args
+        ]
+        return run(args, **kwargs)
+
+    return run_local
+
+
+def commit_pecha(commit_files, source_path: Path):
+    commit_files(
+        source_path / "P000001",
+        {
+            "P000001.opf/meta.yml": "id: P000001\n",
+            "P000001.opf/base/v001.txt": "ཀ" * 20000,
+            "P000001.opf/layers/v001/Quotation-0001.yml": (
+                DATA_DIR / "opf_quotations.yml"
+            ).read_text(encoding="utf-8"),
+        },
+    )
+
+
+@pytest.mark.parametrize("use_mirror_cache", [False, True])
+def test_fetch_interrupted_mid_clone_is_retried(
+    tmp_path, monkeypatch, commit_files, use_mirror_cache
+):
+    monkeypatch.setattr(convert_to_stam, "get_github_token", lambda: "")
+    source_path = tmp_path / "remote" / "OpenPecha-Data"
+    commit_pecha(commit_files, source_path)
+    monkeypatch.setattr(
+        stam_fetcher_utility.subprocess,
+        "run",
+        clone_from_local_remote(source_path.parent),
+    )
+    """what a killed git clone leaves behind, the journal has no record of it"""
+    partial_clone_path = tmp_path / "output" / "P000001" / "OpenPecha-Data"
+    (partial_clone_path / "P000001.opf" / "layers").mkdir(parents=True)
+    if not use_mirror_cache:
+        (partial_clone_path / ".git").mkdir()
+    batch_converter = BatchConverter(
+        pecha_ids=["P000001"],
+        output_path=tmp_path / "output",
+        convert_workers=1,
+        mirror_cache=make_mirror_cache(tmp_path) if use_mirror_cache else None,
+    )
+
+    report = batch_converter.run()
+    assert (report["converted"], report["failed"]) == (1, 0)
+    assert (partial_clone_path / "P000001.opf" / "base" / "v001.txt").exists()
+
+
+def test_pechas_of_alignments_are_fetched_and_converted(
+    tmp_path, monkeypatch, commit_files
+):
+    monkeypatch.setattr(convert_to_stam, "get_github_token", lambda: "")
+    source_path = tmp_path / "remote" / "OpenPecha-Data"
+    commit_pecha(commit_files, source_path)
+    commit_files(
+        source_path / "A000001",
+        {
+            "A000001.opa/meta.yml": "id: A000001\npechas:\n- P000001\n",
+            "A000001.opa/A000001.yml": "segment_sources: {}\nsegment_pairs: {}\n",
+        },
+    )
+    batch_converter = BatchConverter(
+        alignment_ids=["A000001"],
+        output_path=tmp_path / "output",
+        convert_workers=1,
+        mirror_cache=make_mirror_cache(tmp_path),
+    )
+
+    report = batch_converter.run()
+    assert (report["converted"], report["failed"]) == (2, 0)
+    assert report["annotations"] > 0
+    volume_stam_path = (
+        tmp_path / "output/P000001/PechaData/P000001.opf/layers/v001.opf.json"
+    )
+    assert volume_stam_path.exists()
+
+    """the rerun knows the pecha of the alignment from the journal"""
+    report = batch_converter.run()
+    assert (report["converted"], report["skipped"]) == (0, 2)
@@ -0,0 +1,29 @@
+from stam_annotator.conversion_manifest import convert_changed_volumes_to_stam
+
+
+def test_only_changed_volumes_are_converted(tmp_path, make_volume_jobs):
+    manifest_path = tmp_path / "conversion_manifest.json"
+    jobs = make_volume_jobs(layer_names=["opf_quotations.yml"])
+
+    converted_volumes = convert_changed_volumes_to_stam(jobs, manifest_path)
+    assert list(converted_volumes) == ["v001", "v002", "v003"]
+    assert converted_volumes["v001"].annotations_count == 3
+
+    assert convert_changed_volumes_to_stam(jobs, manifest_path) == {}
+
+    """change a layer of v002 and remove v003"""
+    layer_file_path = jobs[1].layer_file_paths[0]
+    layer_file_path.write_text(
+        layer_file_path.read_text(encoding="utf-8").replace("16302", "16300"),
+        encoding="utf-8",
+    )
+    converted_volumes = convert_changed_volumes_to_stam(jobs[:2], manifest_path)
+    assert list(converted_volumes) == ["v002"]
+    assert jobs[0].output_file_path.exists()
+    assert not jobs[2].output_file_path.exists()
+
+    """changing the conversion options converts every volume again"""
+    converted_volumes = convert_changed_volumes_to_stam(
+        jobs[:2], manifest_path, options={"single_store": False}
+    )
+    assert list(converted_volumes) == ["v001", "v002"]
@@ -0,0 +1,145 @@
+import gc
+import json
+import shutil
+import weakref
+
+from stam import AnnotationStore, Offset, Selector
+
+from stam_annotator.stam_fetcher import corpus_export
+from stam_annotator.stam_fetcher.alignment import Alignment
+from stam_annotator.stam_fetcher.corpus_export import (
+    export_parallel_corpus,
+    export_segment_range,
+)
+
+
+def make_aligned_pecha(out_path, pecha_id, texts):
+    layers_path = out_path / pecha_id / f"{pecha_id}.opf" / "layers"
+    layers_path.mkdir(parents=True)
+    store = AnnotationStore(id="v001")
+    resource = store.add_resource(id="v001", text="".join(texts))
+    dataset = store.add_dataset(id="dataset")
+    dataset.add_key("Structure Type")
+    start = 0
+    for index, text in enumerate(texts):
+        store.annotate(
+            id=f"{pecha_id}_{index}",
+            target=Selector.textselector(
+                resource, Offset.simple(start, start + len(text))
+            ),
+            data=[{"key": "Structure Type", "value": "Segment", "set": "dataset"}],
+        )
+        start += len(text)
+    store.set_filename(str(layers_path / "v001.opf.json"))
+    store.save()
+
+
+def make_alignment(out_path, segments_count):
+    make_aligned_pecha(
+        out_path, "P000001", [f"བོད{index}" for index in range(segments_count)]
+    )
+    make_aligned_pecha(
+        out_path, "P000002", [f"en\t{index}" for index in range(segments_count)]
+    )
+    opa_path = out_path / "A000001" / "A000001.opa"
+    opa_path.mkdir(parents=True)
+    alignment_data = {
+        "segment_sources": {
+            "P000001": {"lang": "bo", "base": "v001"},
+            "P000002": {"lang": "en", "base": "v001"},
+        },
+        "segment_pairs": {
+            f"pair{index}": {
+                "P000001": f"P000001_{index}",
+                "P000002": f"P000002_{index}",
+            }
+            for index in range(segments_count)
+        },
+    }
+    (opa_path / "alignment.json").write_text(json.dumps(alignment_data))
+
+
+def test_parallel_export_matches_serial_export_in_order(tmp_path):
+    make_alignment(tmp_path, 7)
+    serial_file_path = tmp_path / "serial.jsonl"
+    parallel_file_path = tmp_path / "parallel.jsonl"
+
+    assert (
+        export_parallel_corpus(["A000001"], "", serial_file_path, out_path=tmp_path)
+        == 7
+    )
+    assert (
+        export_parallel_corpus(
+            ["A000001"],
+            "",
+            parallel_file_path,
+            workers=2,
+            chunk_size=3,
+            out_path=tmp_path,
+        )
+        == 7
+    )
+    assert serial_file_path.read_text() == parallel_file_path.read_text()
+    records = [json.loads(line) for line in serial_file_path.read_text().splitlines()]
+    assert [record["segment_id"] for record in records] == [
+        f"pair{index}" for index in range(7)
+    ]
+    assert (records[0]["bo"], records[0]["en"]) == ("བོད0", "en\t0")
+
+    tsv_file_path = tmp_path / "corpus.tsv"
+    export_parallel_corpus(
+        ["A000001"], "", tsv_file_path, workers=2, chunk_size=3, out_path=tmp_path
+    )
+    assert tsv_file_path.read_text(encoding="utf-8").splitlines()[1] == "བོད1\ten 1"
+
+
+def test_export_holds_one_alignment_at_a_time(tmp_path, monkeypatch):
+    make_alignment(tmp_path, 3)
+    shutil.copytree(tmp_path / "A000001", tmp_path / "A000002")
+    (tmp_path / "A000002" / "A000001.opa").rename(tmp_path / "A000002" / "A000002.opa")
+    alignments = {}
+    from_id = Alignment.from_id
+
+    def track_from_id(id_, *args, **kwargs):
+        alignment = from_id(id_, *args, **kwargs)
+        alignments[id_] = weakref.ref(alignment)
+        return alignment
+
+    monkeypatch.setattr(Alignment, "from_id", track_from_id)
+    write_parallel_segment = corpus_export.write_parallel_segment
+    released = []
+
+    def check_released(file, record, *args):
+        if record["alignment_id"] == "A000002":
+            gc.collect()
+            released.append(alignments["A000001"]() is None)
+        write_parallel_segment(file, record, *args)
+
+    monkeypatch.setattr(corpus_export, "write_parallel_segment", check_released)
+    output_file_path = tmp_path / "corpus.jsonl"
+    assert (
+        export_parallel_corpus(
+            ["A000001", "A000002"], "", output_file_path, out_path=tmp_path
+        )
+        == 6
+    )
+    assert released == [True, True, True]
+
+
+def test_worker_keeps_the_last_alignment_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(corpus_export, "_worker_alignment", None)
+    for out_path in [tmp_path / "first", tmp_path / "second"]:
+        make_alignment(out_path, 3)
+    part_file_path = tmp_path / "part"
+
+    export_segment_range(
+        "A000001", "", tmp_path / "first", 0, 3, ["bo"], "jsonl", part_file_path
+    )
+    first_alignment = weakref.ref(corpus_export._worker_alignment[1])
+    export_segment_range(
+        "A000001", "", tmp_path / "second", 0, 3, ["bo"], "jsonl", part_file_path
+    )
+    gc.collect()
+
+    assert first_alignment() is None
+    assert corpus_export._worker_alignment[0] == ("A000001", str(tmp_path / "second"))
@@ -0,0 +1,43 @@
+import subprocess
+from pathlib import Path
+
+from stam_annotator.git_upload import push_folder_to_repo
+
+
+def git_output(cwd: Path, *args) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout
+
+
+def test_push_folder_uploads_changed_files_in_one_commit(tmp_path):
+    remote_path = tmp_path / "P000001.git"
+    remote_path.mkdir()
+    git_output(remote_path, "init", "--bare", "-b", "main")
+    project_path = tmp_path / "PechaData"
+    (project_path / "P000001.opf" / "layers").mkdir(parents=True)
+    for volume_name in ["v001", "v002", "v003"]:
+        volume_file = project_path / "P000001.opf" / "layers" / f"{volume_name}.json"
+        volume_file.write_text(volume_name)
+
+    assert push_folder_to_repo(project_path, remote_path.as_uri())
+    assert git_output(remote_path, "rev-list", "--count", "main").strip() == "1"
+
+    """nothing changed, nothing is uploaded"""
+    assert not push_folder_to_repo(project_path, remote_path.as_uri())
+
+    """a fresh copy of the folder only uploads the changed file"""
+    new_project_path = tmp_path / "new" / "PechaData"
+    (new_project_path / "P000001.opf" / "layers").mkdir(parents=True)
+    for volume_name in ["v001", "v002", "v003"]:
+        volume_file = (
+            new_project_path / "P000001.opf" / "layers" / f"{volume_name}.json"
+        )
+        volume_file.write_text(volume_name if volume_name != "v002" else "changed")
+
+    assert push_folder_to_repo(new_project_path, remote_path.as_uri())
+    assert git_output(remote_path, "rev-list", "--count", "main").strip() == "2"
+    changed_files = git_output(
+        remote_path, "diff", "--name-only", "main~1", "main"
+    ).split()
+    assert changed_files == ["P000001.opf/layers/v002.json"]
@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).parent.parent.absolute() / "src"
+
+MODULES = [
+    "stam_annotator.convert_to_stam",
+    "stam_annotator.batch_converter",
+    "stam_annotator.stam_fetcher.alignment",
+    "stam_annotator.stam_fetcher.corpus_export",
+]
+
+
+def test_import_has_no_side_effects_and_no_heavy_dependencies(tmp_path):
+    code = (
+        "import json, sys\n"
+        + "".join(f"import {module}\n" for module in MODULES)
+        + "print(json.dumps([m for m in ['github', 'pydantic', 'yaml'] "
+        "if m in sys.modules]))"
+    )
+    env = {**os.environ, "HOME": str(tmp_path), "PYTHONPATH": str(SRC_DIR)}
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert json.loads(result.stdout) == []
+    """no data folder in home and no log file in the working directory"""
+    assert list(tmp_path.iterdir()) == []
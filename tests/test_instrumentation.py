@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from stam_annotator import instrumentation
+from stam_annotator.instrumentation import (
+    MemorySink,
+    disable_instrumentation,
+    enable_instrumentation,
+    stage,
+)
+from stam_annotator.stam_fetcher.pecha import Pecha
+from stam_annotator.stam_manager import combine_stams
+
+
+@pytest.fixture
+def memory_sink():
+    sink = MemorySink()
+    enable_instrumentation(sink)
+    yield sink
+    disable_instrumentation()
+
+
+def test_stages_record_time_and_counts(tmp_path, memory_sink, make_pecha, make_store):
+    stores = [
+        make_store(f"stam{index}", f"annotation{index}", {}) for index in range(3)
+    ]
+    combine_stams(stores)
+    make_pecha(tmp_path, "P000001", ["v001", "v002"])
+    pecha = Pecha("P000001", tmp_path)
+    pecha.get_annotation("v001_segment", "v001")
+
+    [combine_record] = memory_sink.get_records("combine_stams")
+    assert combine_record.item_count == 3
+    assert combine_record.fields == {"stores": 3}
+    assert combine_record.seconds >= 0
+    assert combine_record.peak_memory is None
+    assert memory_sink.get_records("load_pecha")[0].item_count == 2
+    assert memory_sink.get_records("load_volume")[0].item_count == 1
+
+
+@pytest.mark.parametrize("has_reset_peak", [True, False])
+def test_nested_stages_trace_memory(monkeypatch, has_reset_peak):
+    if not has_reset_peak:
+        """tracemalloc of python 3.8"""
+        monkeypatch.delattr(instrumentation.tracemalloc, "reset_peak", raising=False)
+    sink = MemorySink()
+    enable_instrumentation(sink, trace_memory=True)
+    try:
+        with stage("outer"):
+            with stage("inner"):
+                data = bytearray(10**6)
+            del data
+    finally:
+        disable_instrumentation()
+
+    [inner_record] = sink.get_records("inner")
+    [outer_record] = sink.get_records("outer")
+    assert inner_record.peak_memory >= 10**6
+    assert outer_record.peak_memory >= inner_record.peak_memory
+
+
+def test_failed_and_disabled_stages_are_not_recorded(memory_sink, make_store):
+    with pytest.raises(ValueError):
+        with stage("failing"):
+            raise ValueError
+    disable_instrumentation()
+    combine_stams([make_store("stam1", "a1", {}), make_store("stam2", "a2", {})])
+    assert memory_sink.records == []
+
+
+def test_instrumentation_configured_from_env(tmp_path, monkeypatch):
+    records_path = tmp_path / "stages.jsonl"
+    monkeypatch.setenv(instrumentation.INSTRUMENTATION_ENV, str(records_path))
+    monkeypatch.setattr(instrumentation, "_sinks", None)
+    try:
+        with stage("from_env", pecha_id="P000001") as current_stage:
+            current_stage.count = 5
+    finally:
+        disable_instrumentation()
+
+    [record] = [json.loads(line) for line in records_path.read_text().splitlines()]
+    assert record["stage"] == "from_env"
+    assert record["count"] == 5
+    assert record["pecha_id"] == "P000001"
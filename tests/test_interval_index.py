@@ -0,0 +1,47 @@
+import random
+
+from stam_annotator.stam_fetcher.interval_index import IntervalIndex
+
+
+def overlaps(begin, end, start, stop):
+    if begin == end:
+        return start <= begin < stop
+    return begin < stop and end > start
+
+
+def test_interval_index_queries_match_brute_force():
+    random_generator = random.Random(0)
+    begins = [random_generator.randint(0, 1000) for _ in range(500)]
+    ends = [begin + random_generator.choice([0, 1, 5, 50, 400]) for begin in begins]
+    annotation_ids = [f"annotation{i}" for i in range(len(begins))]
+    intervals = list(zip(annotation_ids, begins, ends))
+    interval_index = IntervalIndex(annotation_ids, begins, ends)
+
+    for _ in range(200):
+        start = random_generator.randint(0, 1100)
+        stop = start + random_generator.randint(1, 100)
+        overlapping = [
+            id_ for id_, begin, end in intervals if overlaps(begin, end, start, stop)
+        ]
+        assert sorted(interval_index.overlapping(start, stop)) == sorted(overlapping)
+        assert sorted(interval_index.containing(start, stop)) == sorted(
+            id_
+            for id_, begin, end in intervals
+            if overlaps(begin, end, start, stop) and begin <= start and end >= stop
+        )
+        assert sorted(interval_index.contained(start, stop)) == sorted(
+            id_
+            for id_, begin, end in intervals
+            if start <= begin < stop and end <= stop
+        )
+        assert sorted(interval_index.point(start)) == sorted(
+            id_
+            for id_, begin, end in intervals
+            if overlaps(begin, end, start, start + 1)
+        )
+
+
+def test_empty_interval_index():
+    interval_index = IntervalIndex([], [], [])
+    assert interval_index.overlapping(0, 10) == []
+    assert interval_index.contained(0, 10) == []
@@ -1,5 +1,7 @@
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from stam_annotator.layer_cache import LayerCache
 from stam_annotator.utility import load_opf_annotations_from_yaml
 
 
@@ -28,5 +30,63 @@ def test_load_opf_annotations_from_yaml():
     }
 
 
+def test_load_opf_annotations_from_yaml_with_layer_cache(tmp_path):
+    layer_cache = LayerCache(tmp_path / "cache")
+    yaml_file_path = Path(__file__).parent.absolute() / "data" / "opf_author.yml"
+
+    parsed_annotations = load_opf_annotations_from_yaml(yaml_file_path, layer_cache)
+    cached_annotations = load_opf_annotations_from_yaml(yaml_file_path, layer_cache)
+
+    """list form annotations keep the same generated id when read from cache"""
+    assert cached_annotations == parsed_annotations
+    stats = layer_cache.get_stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+    assert stats["size_bytes"] > 0
+
+
+def write_layer_cache_entry(cache_path: Path):
+    layer_cache = LayerCache(cache_path)
+    for _ in range(20):
+        layer_cache.set("ab" * 32, {"annotations": list(range(1000))})
+
+
+def test_layer_cache_writers_of_the_same_key_do_not_clash(tmp_path):
+    with ProcessPoolExecutor(max_workers=8) as executor:
+        futures = [
+            executor.submit(write_layer_cache_entry, tmp_path / "cache")
+            for _ in range(8)
+        ]
+        for future in futures:
+            future.result()
+
+    layer_cache = LayerCache(tmp_path / "cache")
+    assert layer_cache.get("ab" * 32) == {"annotations": list(range(1000))}
+    assert layer_cache.get_stats()["entries"] == 1
+    assert not list((tmp_path / "cache").glob("*/*.tmp"))
+
+
+def test_deterministic_ids_of_list_form_annotations(tmp_path):
+    layer_cache = LayerCache(tmp_path / "cache")
+    yaml_file_path = Path(__file__).parent.absolute() / "data" / "opf_author.yml"
+    id_parts = ["P000001", "v001", "Author-0001"]
+
+    random_annotations = load_opf_annotations_from_yaml(yaml_file_path, layer_cache)
+    """the entry cached with a random id is not used in the deterministic mode"""
+    first_annotations = load_opf_annotations_from_yaml(
+        yaml_file_path, layer_cache, id_parts
+    )
+    second_annotations = load_opf_annotations_from_yaml(yaml_file_path, None, id_parts)
+
+    assert first_annotations == second_annotations
+    assert first_annotations["annotations"] != random_annotations["annotations"]
+    other_volume_annotations = load_opf_annotations_from_yaml(
+        yaml_file_path, None, ["P000001", "v002", "Author-0001"]
+    )
+    assert list(other_volume_annotations["annotations"]) != list(
+        first_annotations["annotations"]
+    )
+
+
 if __name__ == "__main__":
     test_load_opf_annotations_from_yaml()
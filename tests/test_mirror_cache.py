@@ -0,0 +1,98 @@
+import subprocess
+from pathlib import Path
+
+from stam_annotator.stam_fetcher.mirror_cache import (
+    PECHA_SPARSE_PATTERNS,
+    MirrorCache,
+    RefreshPolicy,
+)
+
+
+def make_remote_repo(remote_path: Path, commit_files) -> Path:
+    repo_path = remote_path / "PechaData" / "P000001"
+    commit_files(
+        repo_path,
+        {
+            "P000001.opf/meta.json": "{}",
+            "P000001.opf/base/v001.txt": "ཀ",
+            "P000001.opf/layers/v001/v001.opf.json": "{}",
+            "P000001.opf/assets/image.png": "png",
+        },
+    )
+    return repo_path
+
+
+def test_checkout_from_mirror_is_sparse_and_incremental(tmp_path, commit_files):
+    repo_path = make_remote_repo(tmp_path / "remote", commit_files)
+    mirror_cache = MirrorCache(
+        tmp_path / "mirrors",
+        refresh=RefreshPolicy.always,
+        url_template=(tmp_path / "remote").as_uri() + "/{org}/{repo_name}",
+    )
+    destination_folder = tmp_path / "pechas" / "P000001"
+
+    mirror_cache.checkout(
+        "PechaData", "P000001", "", destination_folder, PECHA_SPARSE_PATTERNS
+    )
+    opf_path = destination_folder / "P000001.opf"
+    assert (opf_path / "meta.json").exists()
+    assert (opf_path / "base" / "v001.txt").exists()
+    assert (opf_path / "layers" / "v001" / "v001.opf.json").exists()
+    assert not (opf_path / "assets").exists()
+    assert mirror_cache.get_mirror_path("PechaData", "P000001").is_dir()
+
+    commit_files(repo_path, {"P000001.opf/layers/v002/v002.opf.json": "{}"})
+    mirror_cache.checkout(
+        "PechaData", "P000001", "", destination_folder, PECHA_SPARSE_PATTERNS
+    )
+    assert (opf_path / "layers" / "v002" / "v002.opf.json").exists()
+    assert not (opf_path / "assets").exists()
+
+
+def test_refresh_policy_never_does_not_fetch(tmp_path, commit_files):
+    repo_path = make_remote_repo(tmp_path / "remote", commit_files)
+    mirror_cache = MirrorCache(
+        tmp_path / "mirrors",
+        refresh=RefreshPolicy.never,
+        url_template=(tmp_path / "remote").as_uri() + "/{org}/{repo_name}",
+    )
+    destination_folder = tmp_path / "pechas" / "P000001"
+    mirror_cache.checkout("PechaData", "P000001", "", destination_folder)
+
+    commit_files(repo_path, {"P000001.opf/layers/v002/v002.opf.json": "{}"})
+    mirror_cache.checkout("PechaData", "P000001", "", destination_folder)
+    assert not (destination_folder / "P000001.opf" / "layers" / "v002").exists()
+
+
+def test_checkout_takes_over_a_clone_made_without_the_cache(tmp_path, commit_files):
+    repo_path = make_remote_repo(tmp_path / "remote", commit_files)
+    destination_folder = tmp_path / "pechas" / "P000001"
+    destination_folder.parent.mkdir()
+    subprocess.run(
+        ["git", "clone", str(repo_path), str(destination_folder)],
+        check=True,
+        capture_output=True,
+    )
+    mirror_cache = MirrorCache(
+        tmp_path / "mirrors",
+        refresh=RefreshPolicy.always,
+        url_template=(tmp_path / "remote").as_uri() + "/{org}/{repo_name}",
+    )
+
+    commit_files(repo_path, {"P000001.opf/layers/v002/v002.opf.json": "{}"})
+    mirror_cache.checkout(
+        "PechaData", "P000001", "", destination_folder, PECHA_SPARSE_PATTERNS
+    )
+
+    origin_url = subprocess.run(
+        ["git", "remote", "get-url", "origin"],
+        cwd=destination_folder,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    mirror_path = mirror_cache.get_mirror_path("PechaData", "P000001")
+    assert origin_url == mirror_path.resolve().as_uri()
+    opf_path = destination_folder / "P000001.opf"
+    assert (opf_path / "layers" / "v002" / "v002.opf.json").exists()
+    assert not (opf_path / "assets").exists()
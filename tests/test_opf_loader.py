@@ -1,6 +1,13 @@
 from pathlib import Path
 
-from stam_annotator.opf_loader import create_opf_annotation_instance
+import pytest
+
+from stam_annotator.exceptions import InvalidSpanError
+from stam_annotator.opf_loader import (
+    Annotations,
+    create_opf_annotation_instance,
+    find_invalid_spans,
+)
 from stam_annotator.utility import load_opf_annotations_from_yaml
 
 
@@ -38,5 +45,36 @@ def test_create_annotation_loader():
             assert end == 16444
 
 
+def test_find_invalid_spans_reports_every_offending_annotation():
+    annotations = {
+        "valid": {"span": {"start": 0, "end": 5}},
+        "negative": {"span": {"start": -1, "end": 5}},
+        "reversed": {"span": {"start": 8, "end": 2}},
+        "out_of_bound": {"span": {"start": 5, "end": 20}},
+        "unparsable": {"span": {"start": "a", "end": 2}},
+        "float": {"span": {"start": 0, "end": 3.7}},
+        "bool": {"span": {"start": True, "end": 2}},
+        "missing": {"text": "no span"},
+    }
+    not_integers = ["unparsable", "float", "bool", "missing"]
+    assert find_invalid_spans(annotations) == ["negative", "reversed", *not_integers]
+    assert find_invalid_spans(annotations, text_length=10) == [
+        "negative",
+        "reversed",
+        "out_of_bound",
+        *not_integers,
+    ]
+
+    with pytest.raises(InvalidSpanError) as error:
+        Annotations(annotations, text_length=10)
+    assert error.value.annotation_ids == [
+        "negative",
+        "reversed",
+        "out_of_bound",
+        *not_integers,
+    ]
+
+
 if __name__ == "__main__":
     test_create_annotation_loader()
+    test_find_invalid_spans_reports_every_offending_annotation()
@@ -0,0 +1,148 @@
+from pathlib import Path
+
+import pytest
+
+from stam_annotator.config import AnnotationGroupEnum
+from stam_annotator.exceptions import InvalidSpanError
+from stam_annotator.opf_to_stam import opf_to_stam_pipeline
+from stam_annotator.utility import get_annotation_data_id
+
+DATA_DIR = Path(__file__).parent.absolute() / "data"
+
+
+def get_annotations_summary(store):
+    summary = {}
+    for annotation in store.annotations():
+        offset = annotation.offset()
+        summary[annotation.id()] = (
+            offset.begin().value(),
+            offset.end().value(),
+            sorted((data.key().id(), str(data.value())) for data in annotation),
+        )
+    return summary
+
+
+def test_streaming_and_strict_conversion_give_same_annotations(tmp_path):
+    base_file_path = tmp_path / "v001.txt"
+    base_file_path.write_text("ཀ" * 20000, encoding="utf-8")
+
+    for layer_name in ["opf_author.yml", "opf_quotations.yml"]:
+        strict_stam = opf_to_stam_pipeline(
+            "P000001",
+            DATA_DIR / layer_name,
+            base_file_path,
+            AnnotationGroupEnum.structure_type,
+            strict=True,
+        )
+        streamed_stam = opf_to_stam_pipeline(
+            "P000001",
+            DATA_DIR / layer_name,
+            base_file_path,
+            AnnotationGroupEnum.structure_type,
+        )
+        strict_annotations = get_annotations_summary(strict_stam)
+        streamed_annotations = get_annotations_summary(streamed_stam)
+        """list form annotations (opf_author.yml) get a new uuid on every load"""
+        assert sorted(streamed_annotations.values()) == sorted(
+            strict_annotations.values()
+        )
+        if layer_name == "opf_quotations.yml":
+            assert streamed_annotations == strict_annotations
+        assert [dataset.id() for dataset in streamed_stam.datasets()] == [
+            dataset.id() for dataset in strict_stam.datasets()
+        ]
+
+
+@pytest.mark.parametrize("invalid_end", ["end: 10", "end: 500", "end: 83.7"])
+def test_invalid_span_is_rejected_in_both_modes(tmp_path, invalid_end):
+    """reversed, past the end of the 100 character text and not an integer"""
+    base_file_path = tmp_path / "v001.txt"
+    base_file_path.write_text("ཀ" * 100, encoding="utf-8")
+    yaml_file_path = tmp_path / "Author-0001.yml"
+    yaml_file_path.write_text(
+        (DATA_DIR / "opf_author.yml")
+        .read_text(encoding="utf-8")
+        .replace("end: 83", invalid_end),
+        encoding="utf-8",
+    )
+
+    for strict in [True, False]:
+        with pytest.raises(InvalidSpanError) as error:
+            opf_to_stam_pipeline(
+                "P000001",
+                yaml_file_path,
+                base_file_path,
+                AnnotationGroupEnum.structure_type,
+                strict=strict,
+            )
+        """the list form layer gets its ids on load, only one span is invalid"""
+        [annotation_id] = error.value.annotation_ids
+        assert annotation_id in error.value.message
+        assert error.value.message.startswith("pecha id: P000001, file name:Author, ")
+
+
+def test_identical_annotation_data_is_interned(tmp_path):
+    base_file_path = tmp_path / "v001.txt"
+    base_file_path.write_text("ཀ" * 100, encoding="utf-8")
+    yaml_file_path = tmp_path / "Language-0001.yml"
+    annotations = "".join(
+        f"  a{index}:\n    span:\n      start: {index}\n      end: {index + 1}\n"
+        f"    language: {'bo' if index % 2 else 'en'}\n    confidence: 1\n"
+        for index in range(10)
+    )
+    yaml_file_path.write_text(
+        f"id: layer1\nannotation_type: Language\nrevision: '00001'\n"
+        f"annotations:\n{annotations}",
+        encoding="utf-8",
+    )
+
+    for strict in [True, False]:
+        stam = opf_to_stam_pipeline(
+            "P000001",
+            yaml_file_path,
+            base_file_path,
+            AnnotationGroupEnum.structure_type,
+            strict=strict,
+        )
+        [dataset] = stam.datasets()
+        data_values = sorted(
+            (data.key().id(), str(data.value())) for data in dataset.data()
+        )
+        """one data per distinct value, shared by the 10 annotations"""
+        assert data_values == [
+            ("Structure Type", "Language"),
+            ("confidence", "1"),
+            ("language", "bo"),
+            ("language", "en"),
+        ]
+        assert all(data.id() for data in dataset.data())
+        """both paths give the data the id derived from its key and value"""
+        assert dataset.annotationdata(
+            get_annotation_data_id("Structure Type", "Language")
+        )
+        annotation = stam.annotation("a3")
+        assert sorted(str(data.value()) for data in annotation) == [
+            "1",
+            "Language",
+            "bo",
+        ]
+
+
+def test_deterministic_ids_are_the_same_in_both_modes(tmp_path):
+    base_file_path = tmp_path / "v001.txt"
+    base_file_path.write_text("ཀ" * 20000, encoding="utf-8")
+
+    stams = [
+        opf_to_stam_pipeline(
+            "P000001",
+            DATA_DIR / "opf_author.yml",
+            base_file_path,
+            AnnotationGroupEnum.structure_type,
+            strict=strict,
+            deterministic_ids=True,
+        )
+        for strict in [True, False, False]
+    ]
+    summaries = [get_annotations_summary(stam) for stam in stams]
+    assert summaries[0] == summaries[1] == summaries[2]
+    assert stams[0].id() == stams[1].id() == stams[2].id()
@@ -0,0 +1,99 @@
+import json
+import os
+
+from stam import AnnotationStore
+
+from stam_annotator.stam_fetcher.pecha import Pecha
+from stam_annotator.utility import get_binary_stam_file_path, save_annotation_store
+
+
+def test_pecha_loads_volumes_lazily_in_lru_cache(tmp_path, make_pecha):
+    make_pecha(tmp_path, "P000001", ["v001", "v002", "v003"])
+    pecha = Pecha("P000001", tmp_path, max_volumes=2)
+
+    assert sorted(pecha.get_pecha_volume_names()) == ["v001", "v002", "v003"]
+    assert pecha.get_cache_stats()["loaded_volumes"] == 0
+
+    assert pecha.get_annotation("v001_segment", "v001")[0] == "v001"
+    pecha.get_annotation("v002_segment", "v002")
+    pecha.get_annotation("v001_segment", "v001")
+    """v002 is the least recently used volume, so it is evicted"""
+    pecha.get_annotation("v003_segment", "v003")
+
+    stats = pecha.get_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 3, 1)
+    assert list(pecha.pecha_volumes.loaded_volumes) == ["v001", "v003"]
+
+
+def test_export_annotations_to_jsonl_streams_every_volume(tmp_path, make_pecha):
+    make_pecha(tmp_path, "P000001", ["v001", "v002"])
+    pecha = Pecha("P000001", tmp_path, max_volumes=1)
+    output_file_path = tmp_path / "annotations.jsonl"
+
+    assert pecha.export_annotations_to_jsonl(output_file_path) == 2
+
+    records = [
+        json.loads(line)
+        for line in output_file_path.read_text(encoding="utf-8").splitlines()
+    ]
+    annotations = pecha.get_annotations()
+    for record in records:
+        volume_name, id_ = record.pop("volume"), record.pop("id")
+        assert annotations[volume_name][id_] == record
+    assert sorted(record["text"] for record in records) == ["v001", "v002"]
+
+
+def test_iterating_annotations_holds_one_volume_at_a_time(tmp_path, make_pecha):
+    make_pecha(tmp_path, "P000001", ["v001", "v002", "v003"])
+    pecha = Pecha("P000001", tmp_path)
+    pecha.get_annotation("v002_segment", "v002")
+
+    loaded_volumes = {}
+    for volume_name, _, _ in pecha.iter_annotations():
+        loaded_volumes[volume_name] = sorted(pecha.pecha_volumes.loaded_volumes)
+
+    """volumes loaded by the pass are dropped, v002 was cached before and stays"""
+    assert loaded_volumes == {
+        "v001": ["v001", "v002"],
+        "v002": ["v002"],
+        "v003": ["v002", "v003"],
+    }
+    assert list(pecha.pecha_volumes.loaded_volumes) == ["v002"]
+    pecha.get_annotations_at(0, "v002")
+    pecha.export_annotations_to_jsonl(tmp_path / "annotations.jsonl")
+    assert list(pecha.pecha_volumes.loaded_volumes) == ["v002"]
+    assert list(pecha.interval_indexes) == ["v002"]
+
+
+def test_interval_index_is_evicted_with_its_volume(tmp_path, make_pecha):
+    make_pecha(tmp_path, "P000001", ["v001", "v002"])
+    pecha = Pecha("P000001", tmp_path, max_volumes=1)
+
+    assert pecha.get_annotations_at(2, "v001") == ["v001_segment"]
+    assert pecha.get_overlapping_annotations(4, 8, "v001") == []
+    interval_index = pecha.get_interval_index("v001")
+    assert pecha.get_interval_index("v001") is interval_index
+
+    """loading v002 evicts v001 and its index, which is rebuilt on the next query"""
+    assert pecha.get_containing_annotations(1, 3, "v002") == ["v002_segment"]
+    assert list(pecha.interval_indexes) == ["v002"]
+    assert pecha.get_contained_annotations(0, 4, "v001") == ["v001_segment"]
+    assert pecha.get_interval_index("v001") is not interval_index
+
+
+def test_pecha_prefers_binary_stam_when_not_older_than_json(tmp_path, make_pecha):
+    make_pecha(tmp_path, "P000001", ["v001"])
+    json_file = tmp_path / "P000001.opf" / "layers" / "v001.opf.json"
+    save_annotation_store(AnnotationStore(file=str(json_file)), json_file, binary=True)
+    binary_file = get_binary_stam_file_path(json_file)
+    assert binary_file.name == "v001.opf.store.stam.cbor"
+
+    pecha = Pecha("P000001", tmp_path)
+    assert pecha.pecha_volumes.volume_files["v001"] == binary_file
+    assert pecha.get_annotation("v001_segment", "v001")[0] == "v001"
+
+    """a json file written after the cbor one is newer, so it wins"""
+    stat = binary_file.stat()
+    os.utime(json_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    pecha = Pecha("P000001", tmp_path)
+    assert pecha.pecha_volumes.volume_files["v001"] == json_file
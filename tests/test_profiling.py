@@ -0,0 +1,39 @@
+import json
+
+from stam_annotator.profiling import write_profile_report
+from stam_annotator.volume_converter import convert_volumes_to_stam
+
+
+def test_profiled_conversion_dumps_volume_profiles_and_report(
+    tmp_path, make_volume_jobs
+):
+    profile_dir = tmp_path / "profiles"
+    jobs = [job._replace(profile_dir=profile_dir) for job in make_volume_jobs("output")]
+    results = convert_volumes_to_stam(jobs, workers=2)
+
+    for result in results:
+        profile_path = profile_dir / f"P000001-{result.volume_name}.prof"
+        assert profile_path.exists()
+        profile_data = json.loads(
+            profile_path.with_suffix(".prof.json").read_text(encoding="utf-8")
+        )
+        assert profile_data["annotations"] == result.annotations_count
+        assert sorted(layer["layer"] for layer in profile_data["layers"]) == [
+            "opf_author.yml",
+            "opf_quotations.yml",
+        ]
+        assert (
+            sum(layer["annotations"] for layer in profile_data["layers"])
+            == result.annotations_count
+        )
+
+    report_path = write_profile_report(profile_dir, top=5)
+    report = report_path.read_text(encoding="utf-8")
+    assert "slowest volumes of 3" in report
+    assert "slowest layers of 6" in report
+    assert "cumulative" in report
+    assert "convert_volume_to_stam" in report
+
+
+def test_profile_report_without_profiles(tmp_path):
+    assert write_profile_report(tmp_path) is None
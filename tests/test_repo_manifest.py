@@ -0,0 +1,39 @@
+from stam_annotator.repo_manifest import RepoManifest
+
+
+def test_repo_manifest_indexes_base_and_layer_files(tmp_path):
+    pecha_path = tmp_path / "P000001.opf"
+    for volume_name in ["v001", "v002"]:
+        (pecha_path / "base").mkdir(parents=True, exist_ok=True)
+        (pecha_path / "base" / f"{volume_name}.txt").write_text("ཀ")
+        (pecha_path / "layers" / volume_name).mkdir(parents=True)
+        (pecha_path / "layers" / volume_name / "Author-0001.yml").write_text("")
+    (pecha_path / "meta.yml").write_text("")
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "HEAD").write_text("")
+
+    manifest = RepoManifest.from_path(tmp_path)
+
+    assert manifest.get_base_file("v001") == pecha_path / "base" / "v001.txt"
+    assert manifest.layer_files == {
+        "v001": [pecha_path / "layers" / "v001" / "Author-0001.yml"],
+        "v002": [pecha_path / "layers" / "v002" / "Author-0001.yml"],
+    }
+    assert ("meta.yml", "file") in manifest.folder_structure[pecha_path]
+    assert ("layers", "folder") in manifest.folder_structure[pecha_path]
+    assert all(".git" not in path.parts for path in manifest.folder_structure)
+
+
+def test_repo_manifest_lists_files_in_sorted_order(tmp_path):
+    layer_names = [f"Layer-{index:04d}.yml" for index in range(20)]
+    volume_dir = tmp_path / "P000001.opf" / "layers" / "v001"
+    volume_dir.mkdir(parents=True)
+    for layer_name in reversed(layer_names):
+        (volume_dir / layer_name).write_text("")
+
+    manifest = RepoManifest.from_path(tmp_path)
+
+    assert manifest.layer_files["v001"] == [
+        volume_dir / layer_name for layer_name in layer_names
+    ]
+    assert [name for name, _ in manifest.folder_structure[volume_dir]] == layer_names
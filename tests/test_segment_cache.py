@@ -0,0 +1,58 @@
+import json
+import os
+
+from stam_annotator.stam_fetcher import alignment as alignment_module
+from stam_annotator.stam_fetcher.alignment import Alignment
+from stam_annotator.stam_fetcher.pecha import Pecha
+
+
+def make_alignment(base_path, monkeypatch, make_pecha):
+    make_pecha(base_path, "P000001", ["v001"])
+    make_pecha(base_path, "P000002", ["v002"])
+    opa_path = base_path / "A000001" / "A000001.opa"
+    opa_path.mkdir(parents=True)
+    alignment_data = {
+        "segment_sources": {
+            "P000001": {"lang": "bo", "base": "v001"},
+            "P000002": {"lang": "en", "base": "v002"},
+        },
+        "segment_pairs": {
+            "pair1": {"P000001": "v001_segment", "P000002": "v002_segment"}
+        },
+    }
+    (opa_path / "alignment.json").write_text(json.dumps(alignment_data))
+    monkeypatch.setattr(
+        alignment_module.Pecha,
+        "from_id",
+        lambda id_, *args, **kwargs: Pecha(id_, base_path),
+    )
+
+
+def test_segment_cache_gives_same_pairs_without_loading_volumes(
+    tmp_path, monkeypatch, make_pecha
+):
+    make_alignment(tmp_path, monkeypatch, make_pecha)
+    alignment_path = tmp_path / "A000001"
+    expected_pairs = list(Alignment("A000001", "", alignment_path).get_segment_pairs())
+
+    """first run builds the cache from the pechas"""
+    alignment = Alignment("A000001", "", alignment_path, use_segment_cache=True)
+    assert list(alignment.get_segment_pairs()) == expected_pairs
+    assert alignment.segment_cache_fn.exists()
+    """the volumes read to build the cache are not kept"""
+    for pecha in alignment.pechas.values():
+        assert pecha.get_cache_stats()["loaded_volumes"] == 0
+
+    """second run reads the cache only"""
+    alignment = Alignment("A000001", "", alignment_path, use_segment_cache=True)
+    assert list(alignment.get_segment_pairs()) == expected_pairs
+    for pecha in alignment.pechas.values():
+        assert pecha.get_cache_stats()["misses"] == 0
+
+    """a changed volume file invalidates the cache"""
+    volume_file = tmp_path / "P000001.opf" / "layers" / "v001.opf.json"
+    stat = volume_file.stat()
+    os.utime(volume_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    alignment = Alignment("A000001", "", alignment_path, use_segment_cache=True)
+    assert list(alignment.get_segment_pairs()) == expected_pairs
+    assert alignment.pechas["P000001"].get_cache_stats()["misses"] == 1
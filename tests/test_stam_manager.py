@@ -0,0 +1,54 @@
+from stam_annotator.opa_loader import OpaAnnotation
+from stam_annotator.stam_manager import (
+    build_annotation_index,
+    combine_stams,
+    get_alignment_annotations,
+)
+
+
+def test_combine_stams_keeps_all_annotation_data(make_store):
+    stam1 = make_store("stam1", "annotation1", {"lang": "bo"})
+    stam2 = make_store("stam2", "annotation2", {"lang": "en", "confidence": 0.9})
+    stam3 = make_store("stam3", "annotation3", {})
+
+    combined_stam = combine_stams([stam1, stam2, stam3])
+
+    assert [resource.id() for resource in combined_stam.resources()] == ["v001"]
+    assert [data_set.id() for data_set in combined_stam.datasets()] == ["stam1_set"]
+    annotation2 = combined_stam.annotation("annotation2")
+    assert sorted((data.key().id(), data.value().get()) for data in annotation2) == [
+        ("Structure Type", "Segment"),
+        ("confidence", 0.9),
+        ("lang", "en"),
+    ]
+    assert str(combined_stam.annotation("annotation3")) == "ཀཁགང"
+
+
+def test_get_alignment_annotations_with_shared_index(make_store):
+    bo_stam = make_store("bo_stam", "bo_segment", {})
+    en_stam = make_store("en_stam", "en_segment", {})
+    opa_alignment = OpaAnnotation(
+        segment_sources={
+            "I0001": {
+                "type": "origin",
+                "relation": "source",
+                "lang": "bo",
+                "base": "v001",
+            },
+            "I0002": {
+                "type": "translation",
+                "relation": "target",
+                "lang": "en",
+                "base": "v001",
+            },
+        },
+        segment_pairs={"pair1": {"I0001": "bo_segment", "I0002": "en_segment"}},
+    )
+
+    annotation_index = build_annotation_index([bo_stam, en_stam])
+    assert annotation_index["en_segment"][0] is en_stam
+
+    alignment_annotations = get_alignment_annotations(
+        opa_alignment, [bo_stam, en_stam], annotation_index
+    )
+    assert alignment_annotations == {"pair1": {"bo": "ཀཁགང", "en": "ཀཁགང"}}
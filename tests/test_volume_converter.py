@@ -0,0 +1,140 @@
+from pathlib import Path
+
+import pytest
+from stam import AnnotationStore
+
+from stam_annotator.exceptions import VolumeConversionError
+from stam_annotator.volume_converter import convert_volumes_to_stam
+
+
+def get_offsets(file_path: Path):
+    store = AnnotationStore(file=str(file_path))
+    return sorted(
+        (annotation.offset().begin().value(), annotation.offset().end().value())
+        for annotation in store.annotations()
+    )
+
+
+def test_parallel_conversion_matches_serial_conversion(tmp_path, make_volume_jobs):
+    outputs = {}
+    for output_dir_name, workers in [("serial", 1), ("parallel", 2)]:
+        jobs = [
+            job._replace(deterministic_ids=True)
+            for job in make_volume_jobs(output_dir_name)
+        ]
+        outputs[output_dir_name] = convert_volumes_to_stam(jobs, workers=workers)
+
+    assert [result.volume_name for result in outputs["parallel"]] == [
+        result.volume_name for result in outputs["serial"]
+    ]
+    for serial_output, parallel_output in zip(outputs["serial"], outputs["parallel"]):
+        assert parallel_output.output_file_path.read_bytes() == (
+            serial_output.output_file_path.read_bytes()
+        )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_conversion_error_has_pecha_and_volume(tmp_path, workers, make_volume_jobs):
+    jobs = make_volume_jobs("output")
+    bad_layer = jobs[1].layer_file_paths[0]
+    bad_layer.write_text(
+        bad_layer.read_text(encoding="utf-8").replace("end: 83", "end: 10"),
+        encoding="utf-8",
+    )
+
+    with pytest.raises(VolumeConversionError) as error:
+        convert_volumes_to_stam(jobs, workers=workers)
+    assert error.value.pecha_id == "P000001"
+    assert error.value.volume_name == "v002"
+    assert len(error.value.error.annotation_ids) == 1
+
+
+def test_single_store_conversion_matches_combined_conversion(
+    tmp_path, make_volume_jobs
+):
+    combined_outputs = convert_volumes_to_stam(
+        make_volume_jobs("combined", single_store=False)
+    )
+    single_store_outputs = convert_volumes_to_stam(make_volume_jobs("single_store"))
+
+    for combined_output, single_store_output in zip(
+        combined_outputs, single_store_outputs
+    ):
+        assert get_offsets(single_store_output.output_file_path) == get_offsets(
+            combined_output.output_file_path
+        )
+        assert (
+            single_store_output.annotations_count == combined_output.annotations_count
+        )
+        store = AnnotationStore(file=str(single_store_output.output_file_path))
+        assert [resource.id() for resource in store.resources()] == [
+            single_store_output.volume_name
+        ]
+        assert len(list(store.datasets())) == 1
+
+
+def test_standoff_conversion_references_base_text(tmp_path, make_volume_jobs):
+    for single_store in [True, False]:
+        output_dir_name = f"standoff_{single_store}"
+        embedded_outputs = convert_volumes_to_stam(
+            make_volume_jobs(f"embedded_{single_store}", single_store=single_store)
+        )
+        standoff_outputs = convert_volumes_to_stam(
+            make_volume_jobs(output_dir_name, single_store=single_store, standoff=True)
+        )
+
+        for embedded_output, standoff_output in zip(embedded_outputs, standoff_outputs):
+            standoff_json = standoff_output.output_file_path.read_text(encoding="utf-8")
+            assert f'"@include": "../base/{standoff_output.volume_name}.txt"' in (
+                standoff_json
+            )
+            assert "ཀཀཀ" not in standoff_json
+            assert (
+                standoff_output.output_file_path.stat().st_size
+                < embedded_output.output_file_path.stat().st_size
+            )
+
+            embedded_store = AnnotationStore(file=str(embedded_output.output_file_path))
+            standoff_store = AnnotationStore(file=str(standoff_output.output_file_path))
+            assert sorted(
+                (annotation.offset().begin().value(), str(annotation))
+                for annotation in standoff_store.annotations()
+            ) == sorted(
+                (annotation.offset().begin().value(), str(annotation))
+                for annotation in embedded_store.annotations()
+            )
+
+
+def test_standoff_can_not_be_saved_as_binary(tmp_path, make_volume_jobs):
+    jobs = [
+        job._replace(binary=True) for job in make_volume_jobs("standoff", standoff=True)
+    ]
+    with pytest.raises(ValueError):
+        convert_volumes_to_stam(jobs)
+    assert not (tmp_path / "standoff" / "v001.opf.json").exists()
+
+
+@pytest.mark.parametrize("single_store", [True, False])
+def test_deterministic_ids_give_byte_identical_stams(
+    tmp_path, single_store, make_volume_jobs
+):
+    outputs = []
+    for output_dir_name in ["first", "second"]:
+        jobs = [
+            job._replace(deterministic_ids=True)
+            for job in make_volume_jobs(output_dir_name, single_store=single_store)
+        ]
+        outputs.append(convert_volumes_to_stam(jobs))
+
+    for first_output, second_output in zip(*outputs):
+        assert first_output.output_file_path.read_bytes() == (
+            second_output.output_file_path.read_bytes()
+        )
+    """the uuids of the list form layer and the store differ between runs"""
+    outputs = [
+        convert_volumes_to_stam(make_volume_jobs(name, single_store=single_store))
+        for name in ["third", "fourth"]
+    ]
+    assert outputs[0][0].output_file_path.read_bytes() != (
+        outputs[1][0].output_file_path.read_bytes()
+    )